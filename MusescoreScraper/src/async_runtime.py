@@ -0,0 +1,47 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Optional
+
+from global_vars import *
+
+
+class AsyncLoopThread:
+    """
+    Event loop asyncio di lunga durata eseguito in un thread dedicato.
+    Le risorse legate al loop (browser Playwright, client HTTP, lock asyncio) restano
+    valide tra un job e l'altro, invece di essere ricreate da ogni asyncio.run().
+    """
+
+    def __init__(self, name: str = "async-loop"):
+        self.__loop = asyncio.new_event_loop()
+        self.__ready = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__thread.start()
+        self.__ready.wait()
+
+    def __run(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.call_soon(self.__ready.set)
+        self.__loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self.__loop
+
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self.__thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Pianifica la coroutine sul loop e restituisce un Future thread-safe."""
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Esegue la coroutine sul loop e ne attende il risultato (da un thread diverso dal loop)."""
+        assert not self.in_loop_thread(), "run() non può essere chiamato dal thread del loop"
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        if self.__loop.is_running():
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join(timeout=5)
@@ -0,0 +1,289 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+from global_vars import *
+from resource_filter import ResourceFilter, RouteStats
+
+
+STEALTH_INIT_SCRIPT: Final[str] = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    })
+"""
+
+
+@dataclass
+class PooledContext:
+    """Contesto del browser con il proxy associato e i dati per il riciclo."""
+    context: BrowserContext
+    browser: Browser
+    proxy_key: str
+    proxy: Dict[str, str] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    route_stats: Optional[RouteStats] = None   # richieste del job che sta usando il contesto
+
+    def expired(self, max_age_s: float, max_uses: int) -> bool:
+        return self.uses >= max_uses or time.monotonic() - self.created_at >= max_age_s
+
+
+class BrowserPool:
+    """
+    Pool di contesti Playwright su un unico Chromium di lunga durata.
+    Ogni proxy ha i suoi contesti (il proxy è impostato a livello di contesto), quindi un
+    job paga solo la creazione del contesto e non l'avvio del browser. I contesti vengono
+    riusati fino a `max_uses` utilizzi o `max_age_s` secondi, per ogni proxy usato di recente
+    restano pronti `warm_spares` contesti e il totale è limitato dal budget di memoria.
+    Tutti i metodi vanno chiamati dallo stesso event loop.
+    """
+
+    def __init__(
+        self,
+        headless: bool = True,
+        memory_budget_mb: int = BROWSER_POOL_MEMORY_BUDGET_MB,
+        max_uses: int = BROWSER_CONTEXT_MAX_USES,
+        max_age_s: float = BROWSER_CONTEXT_MAX_AGE_SECONDS,
+        warm_spares: int = BROWSER_POOL_WARM_SPARES,
+        health_interval_s: float = BROWSER_POOL_HEALTH_INTERVAL_SECONDS,
+        resource_filter: Optional[ResourceFilter] = None,
+    ):
+        self.__headless = headless
+        self.__resource_filter = resource_filter
+        self.__max_uses = max_uses
+        self.__max_age_s = max_age_s
+        self.__warm_spares = warm_spares
+        self.__health_interval_s = health_interval_s
+        self.__max_contexts = max(1, (memory_budget_mb - BROWSER_BASE_MEMORY_MB) // BROWSER_CONTEXT_MEMORY_MB)
+
+        self.__playwright: Optional[Playwright] = None
+        self.__browser: Optional[Browser] = None
+        self.__launch_lock: Optional[asyncio.Lock] = None
+        self.__slots: Optional[asyncio.Semaphore] = None
+        self.__idle: Dict[str, List[PooledContext]] = {}
+        self.__open_contexts: int = 0
+        self.__health_task: Optional[asyncio.Task] = None
+        self.__spare_tasks: set = set()
+        self.__pending_spares: Dict[str, int] = {}
+        self.__stats = {"browser_launches": 0, "contexts_created": 0, "contexts_reused": 0, "contexts_recycled": 0}
+
+    @staticmethod
+    def _proxy_key(proxy: Dict[str, str]) -> str:
+        return proxy["server"]
+
+    #===================================================================================#
+    # BROWSER                                                                           #
+    #===================================================================================#
+
+    async def _ensure_browser(self) -> Browser:
+        if self.__launch_lock is None:
+            self.__launch_lock = asyncio.Lock()
+            self.__slots = asyncio.Semaphore(self.__max_contexts)
+
+        async with self.__launch_lock:
+            if self.__browser is not None and self.__browser.is_connected():
+                return self.__browser
+
+            if self.__browser is not None:
+                logging.warning("[BrowserPool] Browser disconnesso, riavvio in corso.")
+                await self._drop_all_idle()
+
+            if self.__playwright is None:
+                self.__playwright = await async_playwright().start()
+
+            self.__browser = await self.__playwright.chromium.launch(
+                headless=self.__headless,
+                # Necessario su alcune piattaforme per poter impostare il proxy per contesto:
+                # un contesto senza proxy passerebbe da questo indirizzo fittizio (vedi acquire)
+                proxy={"server": "http://per-context"},
+                args=[
+                    "--disable-gpu",
+                    "--no-sandbox",
+                ]
+            )
+            self.__stats["browser_launches"] += 1
+            logging.info(f"[BrowserPool] Chromium avviato (max {self.__max_contexts} contesti).")
+
+            if self.__health_task is None or self.__health_task.done():
+                self.__health_task = asyncio.create_task(self._health_loop())
+            return self.__browser
+
+    async def _health_loop(self):
+        """Verifica periodicamente il browser e chiude i contesti inattivi scaduti."""
+        while True:
+            await asyncio.sleep(self.__health_interval_s)
+            try:
+                if self.__browser is None:
+                    continue
+                if not self.__browser.is_connected():
+                    await self._ensure_browser()
+                    continue
+
+                for key in list(self.__idle.keys()):
+                    for pooled in list(self.__idle.get(key, [])):
+                        if pooled.expired(self.__max_age_s, self.__max_uses):
+                            self.__idle[key].remove(pooled)
+                            await self._close_context(pooled)
+                            self.__stats["contexts_recycled"] += 1
+            except Exception as e:
+                logging.error(f"[BrowserPool] Errore health check: {e}")
+
+    #===================================================================================#
+    # CONTESTI                                                                          #
+    #===================================================================================#
+
+    async def _reserve_slot(self):
+        """Attende un posto libero nel budget, liberando i contesti inattivi più vecchi se serve."""
+        assert self.__slots is not None
+        while self.__slots.locked():
+            oldest = None
+            for contexts in self.__idle.values():
+                for pooled in contexts:
+                    if oldest is None or pooled.created_at < oldest.created_at:
+                        oldest = pooled
+            if oldest is None:
+                break
+            self.__idle[oldest.proxy_key].remove(oldest)
+            await self._close_context(oldest)
+        await self.__slots.acquire()
+
+    async def _create_context(self, proxy: Dict[str, str]) -> PooledContext:
+        browser = await self._ensure_browser()
+        await self._reserve_slot()
+        try:
+            context = await browser.new_context(proxy=proxy)
+            await context.add_init_script(STEALTH_INIT_SCRIPT)
+            pooled = PooledContext(context=context, browser=browser, proxy_key=self._proxy_key(proxy), proxy=proxy)
+            if self.__resource_filter is not None:
+                # Le regole restano sul contesto: le statistiche vanno al job che lo sta usando
+                resource_filter = self.__resource_filter
+                await context.route("**/*", lambda route: resource_filter.handle(route, pooled.route_stats))
+                context.on("response", lambda response: resource_filter.on_response(response, pooled.route_stats))
+        except Exception:
+            self.__slots.release()
+            raise
+
+        self.__open_contexts += 1
+        self.__stats["contexts_created"] += 1
+        return pooled
+
+    async def _close_context(self, pooled: PooledContext):
+        try:
+            await pooled.context.close()
+        except Exception:
+            pass
+        self.__open_contexts -= 1
+        self.__slots.release()
+
+    async def _drop_all_idle(self):
+        for contexts in self.__idle.values():
+            for pooled in contexts:
+                await self._close_context(pooled)
+        self.__idle.clear()
+
+    async def _create_spare(self, proxy: Dict[str, str]):
+        key = self._proxy_key(proxy)
+        try:
+            # Uno spare non deve mai far attendere un job: solo se c'è posto libero
+            if self.__slots is not None and self.__slots.locked():
+                return
+            pooled = await self._create_context(proxy)
+            self.__idle.setdefault(key, []).append(pooled)
+        except Exception as e:
+            logging.debug(f"[BrowserPool] Creazione contesto di riserva per {key} fallita: {e}")
+        finally:
+            self.__pending_spares[key] -= 1
+
+    def _schedule_spares(self, proxy: Dict[str, str]):
+        key = self._proxy_key(proxy)
+        missing = self.__warm_spares - len(self.__idle.get(key, [])) - self.__pending_spares.get(key, 0)
+        for _ in range(max(0, missing)):
+            self.__pending_spares[key] = self.__pending_spares.get(key, 0) + 1
+            task = asyncio.create_task(self._create_spare(proxy))
+            self.__spare_tasks.add(task)
+            task.add_done_callback(self.__spare_tasks.discard)
+
+    async def acquire(self, proxy: Dict[str, str]) -> PooledContext:
+        """
+        Restituisce un contesto pronto per il proxy indicato (riusato o nuovo).
+        Il proxy è obbligatorio: il browser è avviato con un proxy fittizio che un contesto
+        senza proxy erediterebbe, quindi le connessioni dirette non sono supportate.
+        """
+        if not proxy or not proxy.get("server"):
+            raise ValueError("BrowserPool richiede un proxy per ogni contesto")
+        await self._ensure_browser()
+        key = self._proxy_key(proxy)
+
+        pooled = None
+        idle = self.__idle.get(key, [])
+        while idle:
+            candidate = idle.pop()
+            if candidate.browser is self.__browser and not candidate.expired(self.__max_age_s, self.__max_uses):
+                pooled = candidate
+                self.__stats["contexts_reused"] += 1
+                break
+            await self._close_context(candidate)
+            self.__stats["contexts_recycled"] += 1
+
+        if pooled is None:
+            pooled = await self._create_context(proxy)
+        pooled.route_stats = RouteStats()
+        return pooled
+
+    async def release(self, pooled: PooledContext, healthy: bool = True):
+        """
+        Restituisce il contesto al pool; i contesti non sani o scaduti vengono chiusi.
+        Solo i proxy che hanno funzionato ricevono contesti di riserva.
+        """
+        pooled.uses += 1
+        if not healthy or pooled.browser is not self.__browser or pooled.expired(self.__max_age_s, self.__max_uses):
+            await self._close_context(pooled)
+            self.__stats["contexts_recycled"] += 1
+            if healthy:
+                self._schedule_spares(pooled.proxy)
+            return
+
+        # Le pagine aperte dal job non devono restare nel contesto riusato
+        try:
+            for page in list(pooled.context.pages):
+                await page.close()
+        except Exception:
+            await self._close_context(pooled)
+            return
+        self.__idle.setdefault(pooled.proxy_key, []).append(pooled)
+        self._schedule_spares(pooled.proxy)
+
+    @asynccontextmanager
+    async def lease(self, proxy: Dict[str, str]):
+        """Contesto del pool per la durata del blocco; se il blocco fallisce il contesto viene scartato."""
+        pooled = await self.acquire(proxy)
+        healthy = False
+        try:
+            yield pooled
+            healthy = True
+        finally:
+            await self.release(pooled, healthy=healthy)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.__stats,
+            "open_contexts": self.__open_contexts,
+            "idle_contexts": sum(len(c) for c in self.__idle.values()),
+            "max_contexts": self.__max_contexts,
+            "browser_connected": bool(self.__browser and self.__browser.is_connected()),
+        }
+
+    async def close(self):
+        if self.__health_task is not None:
+            self.__health_task.cancel()
+        await self._drop_all_idle()
+        if self.__browser is not None:
+            await self.__browser.close()
+            self.__browser = None
+        if self.__playwright is not None:
+            await self.__playwright.stop()
+            self.__playwright = None
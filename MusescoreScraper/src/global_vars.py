@@ -31,10 +31,96 @@ HTTP_TEST_URL = "http://httpbin.org/ip"
 HTTPS_TEST_URL = "https://www.google.com"
 
 # Parametri di concorrenza
-MAX_PING_CONCURRENCY = 140  # Ping è leggero, possiamo farne tanti
+PROBE_MAX_CONCURRENCY = 2000  # Probe TCP in-process: limitate solo dai file descriptor
+PROBE_RESERVED_FDS = 256      # File descriptor lasciati al resto del processo
+PROBE_ICMP = os.environ.get("PROBE_ICMP", "0") == "1"  # Misura anche il ping ICMP (socket non privilegiati)
 MAX_HTTP_CONCURRENCY = 80   # HTTP è pesante, limitiamo per evitare blocchi o saturazione banda
-PING_TIMEOUT = 6            # Secondi timeout per il ping
+PROBE_TIMEOUT = 3.0           # Secondi timeout per ogni probe
 
 # Intervallo per la cache dei proxy (10 minuti)
 PROXY_CACHE_TIME_SECONDS: Final[int] = 600
 PROXY_CACHE_FILE = os.path.join(ROOT_DIR, "proxy_cache.json")
+
+# Pool dei browser Playwright
+BROWSER_POOL_MEMORY_BUDGET_MB: Final[int] = int(os.environ.get("BROWSER_POOL_MEMORY_BUDGET_MB", 1536))
+BROWSER_BASE_MEMORY_MB: Final[int] = 300        # stima memoria del processo Chromium senza contesti
+BROWSER_CONTEXT_MEMORY_MB: Final[int] = 150     # stima memoria di un contesto con la pagina dello spartito
+BROWSER_CONTEXT_MAX_USES: Final[int] = 20       # job per contesto prima del riciclo
+BROWSER_CONTEXT_MAX_AGE_SECONDS: Final[int] = 900
+BROWSER_POOL_WARM_SPARES: Final[int] = 1        # contesti pronti per ogni proxy funzionante
+BROWSER_POOL_HEALTH_INTERVAL_SECONDS: Final[int] = 30
+
+# Filtro delle richieste del browser (context.route): niente pubblicità, analytics, font e media
+RESOURCE_FILTER_ENABLED: Final[bool] = os.environ.get("RESOURCE_FILTER", "1") == "1"
+RESOURCE_FILTER_BLOCKED_TYPES: Final[tuple] = tuple(filter(None, os.environ.get(
+    "RESOURCE_FILTER_BLOCKED_TYPES",
+    "image,media,font,texttrack,manifest,websocket,eventsource"   # le immagini delle pagine passano sempre
+).split(",")))
+RESOURCE_FILTER_BLOCKED_DOMAINS: Final[tuple] = tuple(filter(None, os.environ.get(
+    "RESOURCE_FILTER_BLOCKED_DOMAINS",
+    "googletagmanager.com,google-analytics.com,doubleclick.net,googlesyndication.com,googleadservices.com,"
+    "adservice.google.com,amazon-adsystem.com,adnxs.com,pubmatic.com,rubiconproject.com,criteo.com,criteo.net,"
+    "taboola.com,outbrain.com,scorecardresearch.com,quantserve.com,hotjar.com,facebook.net,facebook.com,"
+    "connect.facebook.net,youtube.com,ytimg.com,googlevideo.com,vimeo.com,fonts.googleapis.com,fonts.gstatic.com"
+).split(",")))
+RESOURCE_FILTER_ALLOWED_DOMAINS: Final[tuple] = tuple(filter(None, os.environ.get(
+    "RESOURCE_FILTER_ALLOWED_DOMAINS",
+    "challenges.cloudflare.com"   # verifica anti-robot: bloccarla lascerebbe la pagina senza scroller
+).split(",")))
+RESOURCE_FILTER_ESTIMATED_BYTES: Final[dict] = {   # dimensioni tipiche per stimare i byte risparmiati
+    "image": 40 * 1024,
+    "media": 500 * 1024,
+    "font": 60 * 1024,
+    "script": 80 * 1024,
+    "xhr": 5 * 1024,
+    "fetch": 5 * 1024,
+    "other": 10 * 1024,
+}
+
+# Acquisizione delle pagine dello spartito
+# "network": le immagini vengono salvate dalle risposte mentre la pagina le carica
+# "scroll": vecchio metodo, scansione degli <img> durante lo scroll e secondo download
+SCRAPE_CAPTURE_MODE: Final[str] = os.environ.get("SCRAPE_CAPTURE_MODE", "network")
+SCORE_CAPTURE_WAIT_SECONDS: Final[float] = 3.0  # attesa massima di nuove pagine dopo ogni scroll
+SCORE_CAPTURE_MAX_STEPS: Final[int] = 200
+
+# Download HTTP delle immagini delle pagine
+PAGE_DOWNLOAD_PER_HOST_CONCURRENCY: Final[int] = 6   # richieste contemporanee verso lo stesso host
+PAGE_DOWNLOAD_TIMEOUT_SECONDS: Final[float] = 30.0
+PAGE_DOWNLOAD_MAX_CLIENTS: Final[int] = 8            # client (uno per proxy) tenuti aperti
+PAGE_DOWNLOAD_WORKERS: Final[int] = int(os.environ.get("PAGE_DOWNLOAD_WORKERS", 6))   # download e conversione in parallelo allo scroll
+
+# Coda dei job di scraping
+SCRAPE_MAX_CONCURRENT_JOBS: Final[int] = int(os.environ.get("SCRAPE_MAX_CONCURRENT_JOBS", 2))
+SCRAPE_MAX_QUEUED_JOBS: Final[int] = int(os.environ.get("SCRAPE_MAX_QUEUED_JOBS", 20))
+SCRAPE_JOB_STATUS_TTL_SECONDS: Final[int] = 3600   # stato dei job terminati consultabile per un'ora
+SCRAPE_QUEUE_RETRY_AFTER_SECONDS: Final[int] = 30
+
+# Conversione delle pagine in PDF (0 = un processo per core disponibile meno uno)
+PAGE_CONVERT_WORKERS: Final[int] = int(os.environ.get("PAGE_CONVERT_WORKERS", 0))
+PAGE_SPOOL_MAX_MEMORY_BYTES: Final[int] = 64 * 1024 * 1024   # oltre questa soglia le pagine passano su file temporaneo
+PAGE_BUFFER_MAX_MEMORY_BYTES: Final[int] = 8 * 1024 * 1024   # immagine scaricata tenuta in memoria prima del file temporaneo
+
+# Cache delle immagini originali delle pagine (condivisa tra impostazioni di resa diverse)
+PAGE_CACHE_DIR: Final[str] = os.path.join(ROOT_DIR, "page_cache")
+PAGE_CACHE_TTL_SECONDS: Final[int] = 6 * 3600
+PAGE_CACHE_MAX_BYTES: Final[int] = int(os.environ.get("PAGE_CACHE_MAX_MB", 512)) * 1024 * 1024
+
+# Pool dei proxy: punteggio = percentuale di successo / latenza EWMA
+PROXY_EWMA_ALPHA: Final[float] = 0.3
+PROXY_DEFAULT_LATENCY_SECONDS: Final[float] = 5.0        # latenza ipotizzata per un proxy mai misurato
+PROXY_QUARANTINE_BASE_SECONDS: Final[int] = 60           # raddoppia a ogni fallimento consecutivo
+PROXY_QUARANTINE_MAX_SECONDS: Final[int] = 6 * 3600
+PROXY_QUARANTINE_FALLBACK: Final[int] = 5                # proxy provati comunque se sono tutti in quarantena
+PROXY_STATS_SAVE_INTERVAL_SECONDS: Final[int] = 30       # intervallo minimo tra due salvataggi delle statistiche
+
+# Tentativi in parallelo (hedging): vince il primo proxy che raggiunge lo scroller
+PROXY_HEDGE_K: Final[int] = int(os.environ.get("PROXY_HEDGE_K", 2))                               # tentativi contemporanei, 1 = sequenziale
+PROXY_HEDGE_DELAY_SECONDS: Final[float] = float(os.environ.get("PROXY_HEDGE_DELAY_SECONDS", -1))   # < 0: dal percentile delle latenze, 0: K tentativi subito
+PROXY_HEDGE_PERCENTILE: Final[float] = 0.75
+PROXY_HEDGE_MIN_DELAY_SECONDS: Final[float] = 2.0
+
+# Aggiornamento in background della cache dei proxy
+PROXY_REFRESH_AHEAD_RATIO: Final[float] = 0.8        # nuova scansione all'80% della validità della cache
+PROXY_REFRESH_RETRY_SECONDS: Final[int] = 60
+PROXY_FIRST_SCAN_TIMEOUT_SECONDS: Final[int] = 120   # attesa massima dei primi proxy con cache vuota
@@ -0,0 +1,96 @@
+import asyncio
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from global_vars import *
+
+
+class PageDownloader:
+    """
+    Download delle immagini delle pagine con client httpx condivisi (HTTP/2 e keep-alive).
+    Ogni proxy ha il suo client, riusato tra i job, e le richieste verso lo stesso host
+    sono limitate da un semaforo. I corpi vengono scritti a blocchi nel file di destinazione.
+    Tutti i metodi vanno chiamati dallo stesso event loop.
+    """
+
+    CHUNK_SIZE: Final[int] = 64 * 1024
+
+    def __init__(
+        self,
+        per_host_concurrency: int = PAGE_DOWNLOAD_PER_HOST_CONCURRENCY,
+        timeout_s: float = PAGE_DOWNLOAD_TIMEOUT_SECONDS,
+        max_clients: int = PAGE_DOWNLOAD_MAX_CLIENTS,
+    ):
+        self.__per_host_concurrency = per_host_concurrency
+        self.__timeout_s = timeout_s
+        self.__max_clients = max_clients
+        self.__clients: "OrderedDict[str, httpx.AsyncClient]" = OrderedDict()
+        self.__host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.__stats = {"requests": 0, "failures": 0, "bytes": 0}
+
+    async def _client(self, proxy: Optional[Dict[str, str]]) -> httpx.AsyncClient:
+        key = proxy["server"] if proxy else "direct"
+        client = self.__clients.get(key)
+        if client is not None:
+            self.__clients.move_to_end(key)
+            return client
+
+        # Oltre il limite si chiude il client usato meno di recente
+        while len(self.__clients) >= self.__max_clients:
+            _, old = self.__clients.popitem(last=False)
+            await old.aclose()
+
+        limits = httpx.Limits(
+            max_connections=self.__per_host_concurrency * 4,
+            max_keepalive_connections=self.__per_host_concurrency
+        )
+        if proxy:
+            client = httpx.AsyncClient(http2=True, proxies={"all://": proxy["server"]}, limits=limits, timeout=self.__timeout_s, verify=False, follow_redirects=True)
+        else:
+            client = httpx.AsyncClient(http2=True, limits=limits, timeout=self.__timeout_s, follow_redirects=True)
+        self.__clients[key] = client
+        return client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self.__host_slots:
+            self.__host_slots[host] = asyncio.Semaphore(self.__per_host_concurrency)
+        return self.__host_slots[host]
+
+    @staticmethod
+    def cookie_header(cookies: List[dict]) -> str:
+        """Header Cookie dai cookie di un contesto Playwright (già filtrati per URL)."""
+        return "; ".join(f"{c['name']}={c['value']}" for c in cookies)
+
+    async def download(self, url: str, dest: BinaryIO, proxy: Optional[Dict[str, str]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Scarica `url` nel file `dest` e restituisce gli header della risposta.
+        `dest` può essere uno SpooledTemporaryFile, così le pagine piccole restano in memoria.
+        Solleva httpx.HTTPError per errori di rete o stato diverso da 200.
+        """
+        client = await self._client(proxy)
+        async with self._host_slot(url):
+            self.__stats["requests"] += 1
+            try:
+                async with client.stream("GET", url, headers=headers) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(self.CHUNK_SIZE):
+                        dest.write(chunk)
+                        self.__stats["bytes"] += len(chunk)
+                    return dict(response.headers)
+            except Exception:
+                self.__stats["failures"] += 1
+                dest.seek(0)
+                dest.truncate()
+                raise
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.__stats, "clients": len(self.__clients)}
+
+    async def close(self):
+        while self.__clients:
+            _, client = self.__clients.popitem()
+            await client.aclose()
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from global_vars import *
+from async_runtime import AsyncLoopThread
+
+
+# Nome dei file prodotti dai job: spartito_<task_id>.pdf
+SCORE_FILE_PREFIX: Final[str] = "spartito_"
+SCORE_FILE_EXTENSION: Final[str] = ".pdf"
+
+
+@dataclass
+class ScrapeJob:
+    task_id: str
+    url: str
+    scale: float = 2
+    sharpen_count: int = 1
+    status: str = "queued"          # queued, running, completed, error
+    queue_position: int = 0         # 1 = prossimo a partire, 0 se non in coda
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def file_stem(self) -> str:
+        """Nome del PDF senza estensione, usato anche per la entry nel database durante il job."""
+        return f"{SCORE_FILE_PREFIX}{self.task_id}"
+
+    @staticmethod
+    def pdf_name(task_id: str) -> str:
+        return f"{SCORE_FILE_PREFIX}{task_id}{SCORE_FILE_EXTENSION}"
+
+    @staticmethod
+    def task_id_from_file(file_name: str) -> Optional[str]:
+        """task_id del job che ha prodotto `file_name`, None se il nome non è quello di un job."""
+        stem, extension = os.path.splitext(file_name)
+        if extension != SCORE_FILE_EXTENSION or not stem.startswith(SCORE_FILE_PREFIX):
+            return None
+        return stem[len(SCORE_FILE_PREFIX):] or None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "url": self.url,
+            "status": self.status,
+            "queue_position": self.queue_position,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ScrapeJobExecutor:
+    """
+    Coda limitata dei job di scraping eseguiti sul loop asyncio dello scraper.
+    Al massimo `max_concurrent` job sono in esecuzione (quindi altrettanti contesti del
+    browser) e al massimo `max_queued` attendono; oltre il limite `submit` rifiuta i job
+    e il server risponde 429. Lo stato di ogni job viene scritto in `status_table`.
+    """
+
+    def __init__(
+        self,
+        runtime: AsyncLoopThread,
+        handler: Callable[[ScrapeJob], Awaitable[None]],
+        status_table: Dict[str, Dict],
+        max_concurrent: int = SCRAPE_MAX_CONCURRENT_JOBS,
+        max_queued: int = SCRAPE_MAX_QUEUED_JOBS,
+        status_ttl_s: float = SCRAPE_JOB_STATUS_TTL_SECONDS,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.__runtime = runtime
+        self.__handler = handler
+        self.__status_table = status_table
+        self.__max_concurrent = max(1, max_concurrent)
+        self.__max_queued = max(0, max_queued)
+        self.__status_ttl_s = status_ttl_s
+        self.__on_change = on_change
+
+        self.__lock = threading.Lock()
+        self.__pending: Deque[ScrapeJob] = deque()
+        self.__jobs: Dict[str, ScrapeJob] = {}
+        self.__running: int = 0
+
+    #===================================================================================#
+    # STATO                                                                             #
+    #===================================================================================#
+
+    def _publish_unsafe(self):
+        """Aggiorna le posizioni in coda e la tabella di stato (con il lock acquisito)."""
+        for position, job in enumerate(self.__pending, start=1):
+            job.queue_position = position
+
+        now = time.time()
+        for task_id, job in list(self.__jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > self.__status_ttl_s:
+                del self.__jobs[task_id]
+                self.__status_table.pop(task_id, None)
+            else:
+                self.__status_table[task_id] = job.to_dict()
+
+    def _notify(self):
+        if self.__on_change is None:
+            return
+        try:
+            self.__on_change()
+        except Exception as e:
+            logging.error(f"[JobExecutor] Errore notifica: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {
+                "running": self.__running,
+                "queued": len(self.__pending),
+                "max_concurrent": self.__max_concurrent,
+                "max_queued": self.__max_queued,
+            }
+
+    #===================================================================================#
+    # CODA                                                                              #
+    #===================================================================================#
+
+    def submit(self, jobs: List[ScrapeJob]) -> bool:
+        """
+        Accoda i job (tutti o nessuno). Restituisce False se la coda non ha posto.
+        Può essere chiamato da qualsiasi thread.
+        """
+        with self.__lock:
+            free_slots = self.__max_concurrent - self.__running
+            waiting = len(self.__pending) + len(jobs) - max(0, free_slots)
+            if waiting > self.__max_queued:
+                return False
+
+            for job in jobs:
+                job.status = "queued"
+                self.__jobs[job.task_id] = job
+                self.__pending.append(job)
+            self._publish_unsafe()
+
+        self.__runtime.loop.call_soon_threadsafe(self._dispatch)
+        return True
+
+    def _dispatch(self):
+        """Avvia i job in coda finché ci sono posti liberi (eseguito nel loop)."""
+        started = False
+        with self.__lock:
+            while self.__pending and self.__running < self.__max_concurrent:
+                job = self.__pending.popleft()
+                job.status = "running"
+                job.queue_position = 0
+                job.started_at = time.time()
+                self.__running += 1
+                asyncio.ensure_future(self._run(job))
+                started = True
+            if started:
+                self._publish_unsafe()
+
+    async def _run(self, job: ScrapeJob):
+        logging.info(f"[JobExecutor] Avvio job {job.task_id}: {job.url}")
+        try:
+            await self.__handler(job)
+            job.status = "completed"
+        except Exception as e:
+            logging.error(f"[JobExecutor] Job {job.task_id} fallito: {e}")
+            job.status = "error"
+            job.error = str(e)
+        finally:
+            with self.__lock:
+                job.finished_at = time.time()
+                self.__running -= 1
+                self._publish_unsafe()
+            self._dispatch()
+            # on_change può leggere il database: fuori dal loop condiviso con lo scraper
+            await asyncio.to_thread(self._notify)
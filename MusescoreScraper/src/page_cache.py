@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from global_vars import *
+from result_cache import ScoreResultCache
+
+
+class RawPageCache:
+    """
+    Cache su disco delle immagini originali delle pagine, indicizzata dall'URL canonico
+    (senza `@0` e senza query). Per ogni spartito un manifest elenca gli URL delle pagine,
+    così una nuova resa con scale/filter diversi non richiede né browser né proxy.
+    Le voci scadono dopo `ttl_s` secondi dalla scrittura e lo spazio totale è limitato a
+    `max_bytes`: oltre il budget vengono rimosse le pagine lette meno di recente (l'ultimo
+    accesso è registrato nell'atime del file, la scrittura resta nell'mtime).
+    """
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR, ttl_s: float = PAGE_CACHE_TTL_SECONDS, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.__pages_dir = os.path.join(cache_dir, "pages")
+        self.__manifests_dir = os.path.join(cache_dir, "manifests")
+        self.__ttl_s = ttl_s
+        self.__max_bytes = max_bytes
+        self.__lock = threading.Lock()
+        self.__stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+        os.makedirs(self.__pages_dir, exist_ok=True)
+        os.makedirs(self.__manifests_dir, exist_ok=True)
+
+        # Spazio occupato aggiornato a ogni scrittura: la cartella viene letta solo per liberare spazio
+        self.__total_bytes = 0
+        with self.__lock:
+            self._evict_unsafe()
+
+    @staticmethod
+    def canonical_url(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}{parts.path.replace('@0', '')}"
+
+    @staticmethod
+    def _digest(value: str) -> str:
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+    def _page_path(self, url: str) -> str:
+        return os.path.join(self.__pages_dir, self._digest(self.canonical_url(url)))
+
+    def _manifest_path(self, score_url: str) -> str:
+        return os.path.join(self.__manifests_dir, self._digest(ScoreResultCache.normalize_url(score_url)) + ".json")
+
+    def _expired(self, path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) > self.__ttl_s
+        except OSError:
+            return True
+
+    #===================================================================================#
+    # PAGINE                                                                            #
+    #===================================================================================#
+
+    def get(self, url: str) -> Optional[bytes]:
+        path = self._page_path(url)
+        with self.__lock:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.__stats["misses"] += 1
+                return None
+            if time.time() - stat.st_mtime > self.__ttl_s:
+                self._remove_unsafe(path, stat.st_size)
+                self.__stats["misses"] += 1
+                return None
+            with open(path, "rb") as f:
+                content = f.read()
+            # Ultimo accesso per l'ordine LRU; l'mtime (scadenza) non cambia
+            os.utime(path, (time.time(), stat.st_mtime))
+            self.__stats["hits"] += 1
+            return content
+
+    def put(self, url: str, content: bytes):
+        path = self._page_path(url)
+        with self.__lock:
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+            self.__total_bytes += len(content) - previous
+            self.__stats["stored"] += 1
+            if self.__total_bytes > self.__max_bytes:
+                self._evict_unsafe()
+
+    def _remove_unsafe(self, path: str, size: int):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        self.__total_bytes -= size
+        self.__stats["evicted"] += 1
+
+    def _evict_unsafe(self):
+        """Ricalcola lo spazio occupato, rimuove le pagine scadute e, oltre il budget, le meno usate."""
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.__pages_dir):
+            path = os.path.join(self.__pages_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.__ttl_s:
+                try:
+                    os.remove(path)
+                    self.__stats["evicted"] += 1
+                except OSError:
+                    pass
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+
+        self.__total_bytes = total
+        entries.sort()
+        while self.__total_bytes > self.__max_bytes and entries:
+            _, size, path = entries.pop(0)
+            self._remove_unsafe(path, size)
+
+    #===================================================================================#
+    # MANIFEST                                                                          #
+    #===================================================================================#
+
+    def save_manifest(self, score_url: str, pages: Dict[int, str]):
+        """Salva gli URL delle pagine dello spartito (indice pagina -> URL canonico)."""
+        path = self._manifest_path(score_url)
+        data = {"score_url": score_url, "pages": {str(i): self.canonical_url(u) for i, u in pages.items()}}
+        with self.__lock:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+
+    def get_manifest(self, score_url: str) -> Optional[Dict[int, str]]:
+        path = self._manifest_path(score_url)
+        with self.__lock:
+            if not os.path.exists(path) or self._expired(path):
+                return None
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return None
+        return {int(i): u for i, u in data["pages"].items()}
+
+    def get_pages(self, score_url: str) -> Optional[Dict[int, Tuple[str, bytes]]]:
+        """Tutte le pagine dello spartito (indice -> (URL, contenuto)), None se ne manca anche una."""
+        manifest = self.get_manifest(score_url)
+        if not manifest:
+            return None
+        pages = {}
+        for index, url in manifest.items():
+            content = self.get(url)
+            if content is None:
+                return None
+            pages[index] = (url, content)
+        return pages
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return dict(self.__stats)
@@ -0,0 +1,160 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from svglib.svglib import svg2rlg
+from reportlab.graphics import renderPDF
+from PIL import Image, ImageFilter
+from PyPDF2 import PdfMerger
+
+try:
+    import img2pdf
+except ImportError:
+    img2pdf = None
+
+from global_vars import *
+
+
+def render_page(content: bytes, score_type: str, scale: float = 2, sharpen_count: int = 1) -> Optional[bytes]:
+    """
+    Converte l'immagine di una pagina (SVG o PNG) in un PDF di una pagina, tutto in memoria.
+    Senza resize né sharpen il PNG viene incorporato senza ricodifica (img2pdf, se installato).
+    Funzione di modulo: viene eseguita nei processi del pool di conversione.
+    """
+    try:
+        if score_type == 'svg':
+            drawing = svg2rlg(io.BytesIO(content))
+            return renderPDF.drawToString(drawing)
+
+        lossless = scale == 1 and sharpen_count == 0
+        if lossless and img2pdf is not None:
+            try:
+                return img2pdf.convert(content)
+            except Exception as e:
+                # PNG con canale alpha, interlacciati, ecc.: conversione con ricodifica
+                logging.debug(f"img2pdf non supporta la pagina, uso PIL: {e}")
+
+        with Image.open(io.BytesIO(content)) as im:
+            im = im.convert('RGB')
+            if scale != 1:
+                w, h = im.size
+                # Resize ad alta qualità
+                im = im.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+
+            for _ in range(sharpen_count):
+                im = im.filter(ImageFilter.SHARPEN)
+
+            out = io.BytesIO()
+            im.save(out, "PDF", resolution=100.0)
+            return out.getvalue()
+
+    except Exception as e:
+        logging.error(f"Errore conversione pagina ({score_type}): {e}")
+        return None
+
+
+class PageSpool:
+    """
+    Pagine PDF convertite di uno spartito, tenute in memoria fino a `max_memory` byte
+    e poi riversate su un unico file temporaneo. Il PDF finale viene scritto una sola volta.
+    """
+
+    def __init__(self, max_memory: int = PAGE_SPOOL_MAX_MEMORY_BYTES):
+        self.__file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self.__pages: Dict[int, Tuple[int, int]] = {}   # indice pagina -> (offset, lunghezza)
+        self.__sources: Dict[int, str] = {}             # indice pagina -> URL dell'immagine
+        self.__closed = False
+
+    def __len__(self) -> int:
+        return len(self.__pages)
+
+    def add(self, index: int, data: bytes, source: Optional[str] = None):
+        if self.__closed:
+            return
+        self.__file.seek(0, os.SEEK_END)
+        self.__pages[index] = (self.__file.tell(), len(data))
+        self.__file.write(data)
+        if source is not None:
+            self.__sources[index] = source
+
+    def sources(self) -> Dict[int, str]:
+        return dict(self.__sources)
+
+    def write_pdf(self, out_path: str) -> str:
+        """Unisce le pagine in ordine di indice e scrive `out_path`."""
+        merger = PdfMerger()
+        for index in sorted(self.__pages):
+            offset, length = self.__pages[index]
+            self.__file.seek(offset)
+            merger.append(io.BytesIO(self.__file.read(length)))
+
+        tmp_path = out_path + ".tmp"
+        merger.write(tmp_path)
+        merger.close()
+        os.replace(tmp_path, out_path)
+        return out_path
+
+    def close(self):
+        if not self.__closed:
+            self.__closed = True
+            self.__file.close()
+
+
+class PageConverter:
+    """
+    Pool di processi per la conversione delle pagine.
+    Resize, sharpen e codifica PDF sono CPU-bound: eseguiti nel loop asyncio lo
+    bloccherebbero (fermando anche i download) e userebbero un solo core.
+    """
+
+    def __init__(self, workers: int = PAGE_CONVERT_WORKERS):
+        self.__workers = workers if workers > 0 else self.default_workers()
+        self.__executor: Optional[ProcessPoolExecutor] = None
+        self.__stats = {"pages": 0, "failures": 0}
+
+    @staticmethod
+    def default_workers() -> int:
+        """Un processo per core disponibile, lasciandone uno al loop e al browser."""
+        try:
+            cpus = len(os.sched_getaffinity(0))
+        except AttributeError:
+            cpus = os.cpu_count() or 1
+        return max(1, cpus - 1)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor(
+                max_workers=self.__workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logging.info(f"[PageConverter] Pool di conversione avviato con {self.__workers} processi.")
+        return self.__executor
+
+    async def render(self, content: bytes, score_type: str, scale: float = 2, sharpen_count: int = 1) -> Optional[bytes]:
+        """PDF della pagina calcolato in un processo del pool, None in caso di errore."""
+        loop = asyncio.get_running_loop()
+        try:
+            pdf = await loop.run_in_executor(self._get_executor(), render_page, content, score_type, scale, sharpen_count)
+        except BrokenProcessPool:
+            # Un processo è terminato in modo anomalo: il pool viene ricreato al prossimo uso
+            logging.error("[PageConverter] Pool di conversione interrotto, verrà ricreato.")
+            self.__executor = None
+            pdf = None
+
+        self.__stats["pages"] += 1
+        if pdf is None:
+            self.__stats["failures"] += 1
+        return pdf
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.__stats, "workers": self.__workers}
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True, cancel_futures=True)
+            self.__executor = None
@@ -1,62 +1,99 @@
 import asyncio
 import json
 import os
-import platform
+import socket
+import struct
 import threading
 import time
 import httpx
 from bs4 import BeautifulSoup
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 
 from global_vars import *
+from proxy_pool import ProxyPool
 
 _cached_http: List[Dict[str, str]] = []
 _cached_https: List[Dict[str, str]] = []
 _last_scan_time: float = 0
+_last_save_time: float = 0     # time.monotonic() dell'ultimo salvataggio su file
+_stats_dirty: bool = False     # esiti registrati e non ancora salvati
+_refresh_task: Optional[asyncio.Task] = None
+_proxies_ready: Optional[asyncio.Event] = None
 
 _scan_lock = threading.Lock()  # Lock per evitare scansioni concorrenti
+_file_lock = threading.Lock()  # Lock per le scritture del file di cache
+proxy_pool = ProxyPool()       # Statistiche dei proxy dagli scraping reali
 _async_scan_lock = asyncio.Lock()
 
-def get_os_ping_command(ip: str) -> List[str]:
+def _probe_concurrency() -> int:
+    """Probe contemporanee: ognuna usa un file descriptor, quindi si resta sotto RLIMIT_NOFILE."""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            return max(16, min(PROBE_MAX_CONCURRENCY, soft - PROBE_RESERVED_FDS))
+    except (ImportError, ValueError, OSError):
+        pass
+    return PROBE_MAX_CONCURRENCY
+
+async def probe_tcp(ip: str, port: int, timeout: float = PROBE_TIMEOUT) -> Optional[float]:
     """
-    Restituisce il comando di ping corretto per il sistema operativo corrente.
-    Windows: ping -n 1 -w 2000 (1 pacchetto, 2000ms wait)
-    Linux/Mac: ping -c 1 -W 2 (1 pacchetto, 2s wait)
+    Connessione TCP a ip:port senza inviare dati.
+    Ritorna la latenza di connessione in secondi, None se la porta non risponde.
     """
-    system = platform.system().lower()
-    
-    if system == "windows":
-        # -n count, -w timeout in milliseconds
-        return ["ping", "-n", "1", "-w", str(PING_TIMEOUT * 1000), ip]
-    else:
-        # -c count, -W timeout in seconds (Linux/Mac standard)
-        return ["ping", "-c", "1", "-W", str(PING_TIMEOUT), ip]
-
-async def ping_ip(ip: str) -> bool:
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, int(port)), timeout=timeout)
+    except (OSError, asyncio.TimeoutError, ValueError):
+        return None
+    latency = time.perf_counter() - start
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return latency
+
+_icmp_supported: bool = True
+
+def _icmp_echo_packet(sequence: int) -> bytes:
+    """Echo request ICMP; con i socket datagram l'identificatore viene impostato dal kernel."""
+    header = struct.pack("!BBHHH", 8, 0, 0, 0, sequence)
+    payload = b"proxyprobe"
+    data = header + payload
+    if len(data) % 2:
+        data += b"\0"
+    checksum = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    checksum = (checksum >> 16) + (checksum & 0xFFFF)
+    checksum = ~(checksum + (checksum >> 16)) & 0xFFFF
+    return struct.pack("!BBHHH", 8, 0, checksum, 0, sequence) + payload
+
+async def probe_icmp(ip: str, timeout: float = PROBE_TIMEOUT) -> Optional[float]:
     """
-    Esegue un ping di sistema asincrono.
-    Ritorna True se l'host è raggiungibile, False altrimenti.
+    Ping con socket ICMP datagram non privilegiato (Linux con net.ipv4.ping_group_range).
+    Se il sistema non lo consente la probe ICMP viene disattivata e ritorna sempre None.
     """
-    cmd = get_os_ping_command(ip)
-    
+    global _icmp_supported
+    if not _icmp_supported:
+        return None
     try:
-        # Esegue il processo senza bloccare l'event loop
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.DEVNULL,
-            stderr=asyncio.subprocess.DEVNULL
-        )
-        
-        # Attende che il processo termini
-        returncode = await proc.wait()
-        
-        # Return code 0 indica successo (standard POSIX e Windows)
-        return returncode == 0
-        
-    except Exception as e:
-        # Errori di permesso o esecuzione comando
-        # print(f"Errore ping per {ip}: {e}") # Decommentare per debug
-        return False
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except (PermissionError, OSError):
+        _icmp_supported = False
+        logging.info("ℹ️ Socket ICMP non privilegiati non disponibili, uso solo la probe TCP.")
+        return None
+
+    loop = asyncio.get_running_loop()
+    sock.setblocking(False)
+    try:
+        start = time.perf_counter()
+        await loop.sock_sendto(sock, _icmp_echo_packet(1), (ip, 0))
+        await asyncio.wait_for(loop.sock_recv(sock, 1024), timeout=timeout)
+        return time.perf_counter() - start
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        sock.close()
 
 async def get_proxies_async() -> List[Dict]:
     """Scarica la pagina e parsa i proxy in modo asincrono."""
@@ -106,24 +143,31 @@ def filter_proxies(proxies: List[Dict]) -> List[Dict]:
         if p["anonymity"] in ("elite proxy", "anonymous")
     ]
 
-async def filter_by_ping(proxies: List[Dict]) -> List[Dict]:
+async def filter_by_probe(proxies: List[Dict]) -> List[Dict]:
     """
-    Esegue il ping su tutti i proxy in parallelo e ritorna solo quelli vivi.
+    Verifica in parallelo che la porta di ogni proxy accetti connessioni TCP
+    (e, se abilitato, misura anche il ping ICMP). Ritorna i proxy vivi ordinati per latenza di
+    connessione, salvata in "connect_latency" come primo punteggio.
     """
-    semaphore = asyncio.Semaphore(MAX_PING_CONCURRENCY)
+    semaphore = asyncio.Semaphore(_probe_concurrency())
 
-    async def limited_ping(proxy):
+    async def limited_probe(proxy):
         async with semaphore:
-            is_alive = await ping_ip(proxy['ip'])
-            return proxy if is_alive else None
-
-    logging.info(f"🌐 Verifica Ping di {len(proxies)} IP...")
+            latency = await probe_tcp(proxy['ip'], proxy['port'])
+            if latency is None:
+                return None
+            result = {**proxy, "connect_latency": latency}
+            if PROBE_ICMP:
+                # Solo informativo: molti proxy scartano l'ICMP pur avendo la porta aperta
+                result["icmp_latency"] = await probe_icmp(proxy['ip'])
+            return result
+
+    logging.info(f"🌐 Verifica TCP di {len(proxies)} proxy...")
     
-    tasks = [limited_ping(p) for p in proxies]
-    results = await asyncio.gather(*tasks)
+    results = await asyncio.gather(*(limited_probe(p) for p in proxies))
     
-    alive_proxies = [p for p in results if p is not None]
-    logging.info(f"✅ IP rispondenti al ping: {len(alive_proxies)} / {len(proxies)}")
+    alive_proxies = sorted((p for p in results if p is not None), key=lambda p: p["connect_latency"])
+    logging.info(f"✅ Proxy con porta raggiungibile: {len(alive_proxies)} / {len(proxies)}")
     
     return alive_proxies
 
@@ -168,8 +212,11 @@ async def test_proxy_http(proxy_dict: Dict, timeout: float = 5.0) -> Optional[Di
         
     return result
 
-async def test_all_proxies(proxies: List[Dict]) -> List[Dict]:
-    """Testa tutti i proxy passati con concorrenza limitata."""
+async def test_all_proxies(proxies: List[Dict], on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """
+    Testa tutti i proxy passati con concorrenza limitata.
+    `on_result` viene chiamata per ogni proxy funzionante appena il suo test termina.
+    """
     semaphore = asyncio.Semaphore(MAX_HTTP_CONCURRENCY)
 
     async def sem_task(p):
@@ -178,10 +225,16 @@ async def test_all_proxies(proxies: List[Dict]) -> List[Dict]:
 
     logging.info(f"🚀 Test HTTP/HTTPS su {len(proxies)} proxy...")
     
-    tasks = [sem_task(p) for p in proxies]
-    results = await asyncio.gather(*tasks)
+    results = []
+    for task in asyncio.as_completed([sem_task(p) for p in proxies]):
+        result = await task
+        if result is None:
+            continue
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
     
-    return [r for r in results if r is not None]
+    return results
 
 def sort_and_print_results(results: List[Dict]):
     """Ordina e stampa i risultati."""
@@ -213,16 +266,45 @@ def sort_and_print_results(results: List[Dict]):
     return https_proxies, http_proxies
 
 
+def _split_scan_results(results: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """Proxy HTTPS e HTTP funzionanti, con la latenza misurata nel test."""
+    https = [{"ip": p["proxy"]["ip"], "port": p["proxy"]["port"], "latency": p["https_latency"]} for p in results if p["working_https"]]
+    http = [{"ip": p["proxy"]["ip"], "port": p["proxy"]["port"], "latency": p["http_latency"]} for p in results if p["working_http"]]
+    return https, http
+
+def save_proxy_cache(flush: bool = False):
+    """
+    Salva proxy e statistiche (da chiamare dopo aver registrato gli esiti degli scraping).
+    Al massimo un salvataggio ogni PROXY_STATS_SAVE_INTERVAL_SECONDS: gli esiti intermedi
+    finiscono nel salvataggio successivo. Con `flush` salva subito quelli rimasti in sospeso.
+    """
+    global _stats_dirty
+    if flush:
+        if _stats_dirty:
+            _save_cache_to_file()
+        return
+    if time.monotonic() - _last_save_time < PROXY_STATS_SAVE_INTERVAL_SECONDS:
+        _stats_dirty = True
+        return
+    _save_cache_to_file()
+
 def _save_cache_to_file():
-    """Salva i dati correnti su file JSON."""
+    """Salva i dati correnti su file JSON (file temporaneo e rename, mai un file a metà)."""
+    global _last_save_time, _stats_dirty
     data = {
         "last_scan_time": _last_scan_time,
         "https": _cached_https,
-        "http": _cached_http
+        "http": _cached_http,
+        "stats": proxy_pool.to_dict()
     }
     try:
-        with open(PROXY_CACHE_FILE, "w") as f:
-            json.dump(data, f)
+        with _file_lock:
+            _last_save_time = time.monotonic()
+            _stats_dirty = False
+            tmp_path = PROXY_CACHE_FILE + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, PROXY_CACHE_FILE)
     except Exception as e:
         logging.error(f"⚠️ Errore salvataggio cache su file: {e}")
 
@@ -236,6 +318,7 @@ def _load_cache_from_file():
                 _last_scan_time = data.get("last_scan_time", 0)
                 _cached_https = data.get("https", [])
                 _cached_http = data.get("http", [])
+                proxy_pool.load(data.get("stats", {}))
                 logging.info("💾 Cache caricata da file.")
         except Exception as e:
             logging.error(f"⚠️ Errore caricamento cache: {e}")
@@ -243,28 +326,76 @@ def _load_cache_from_file():
 # Inizializzazione immediata al caricamento del modulo
 _load_cache_from_file()
 
-async def get_valid_proxies_async() -> Tuple[List[Dict], List[Dict]]:
+def _merge_scan_result(result: Dict):
+    """Aggiunge subito un proxy appena verificato all'insieme servito."""
+    https, http = _split_scan_results([result])
+    for target, found in ((_cached_https, https), (_cached_http, http)):
+        for proxy in found:
+            if not any(p["ip"] == proxy["ip"] and p["port"] == proxy["port"] for p in target):
+                target.append(proxy)
+    if _proxies_ready is not None and (_cached_https or _cached_http):
+        _proxies_ready.set()
+
+async def _refresh_proxies():
+    """Scansione completa: i proxy validi entrano nella cache man mano che superano il test."""
     global _cached_http, _cached_https, _last_scan_time
     
     async with _async_scan_lock:
-        current_time = time.time()
-        
-        if current_time - _last_scan_time > PROXY_CACHE_TIME_SECONDS:
-            logging.info(f"🔄 Cache scaduta o assente. Avvio scansione asincrona...")
-            try:
-                results = await _perform_full_scan()
-                _cached_https = [{"ip": p["proxy"]["ip"], "port": p["proxy"]["port"]} for p in results if p["working_https"]]
-                _cached_http = [{"ip": p["proxy"]["ip"], "port": p["proxy"]["port"]} for p in results if p["working_http"]]
+        logging.info(f"🔄 Aggiornamento dei proxy in background...")
+        try:
+            results = await _perform_full_scan(on_result=_merge_scan_result)
+            if results:
+                # A scansione finita l'insieme servito contiene solo i proxy appena verificati
+                _cached_https, _cached_http = _split_scan_results(results)
                 _last_scan_time = time.time()
-                
                 _save_cache_to_file() # Salvataggio su disco
-                logging.info(f"✅ Scansione completata e salvata su file.")
-            except Exception as e:
-                logging.error(f"❌ Errore durante la scansione: {e}")
-        else:
-            logging.info(f"📦 Utilizzo cache valida caricata da file/memoria.")
+                logging.info(f"✅ Scansione completata e salvata su file ({len(_cached_https)} HTTPS, {len(_cached_http)} HTTP).")
+            else:
+                logging.warning("⚠️ Scansione senza risultati, mantengo i proxy precedenti.")
+        except Exception as e:
+            logging.error(f"❌ Errore durante la scansione: {e}")
+        finally:
+            if _proxies_ready is not None:
+                _proxies_ready.set()
+
+async def _refresher_loop():
+    """Riesegue la scansione prima della scadenza della cache (stale-while-revalidate)."""
+    while True:
+        refresh_at = _last_scan_time + PROXY_CACHE_TIME_SECONDS * PROXY_REFRESH_AHEAD_RATIO
+        delay = refresh_at - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            continue
+        await _refresh_proxies()
+        if time.time() - _last_scan_time > PROXY_CACHE_TIME_SECONDS:
+            # Scansione fallita: nuovo tentativo dopo una pausa
+            await asyncio.sleep(PROXY_REFRESH_RETRY_SECONDS)
+
+def _ensure_refresher():
+    global _refresh_task, _proxies_ready
+    if _proxies_ready is None:
+        _proxies_ready = asyncio.Event()
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_refresher_loop())
 
-        return _cached_https, _cached_http
+async def get_valid_proxies_async() -> Tuple[List[Dict], List[Dict]]:
+    """
+    Restituisce subito gli ultimi proxy validi; l'aggiornamento avviene in background.
+    Solo senza alcun proxy in cache si attende, fino ai primi proxy verificati.
+    """
+    _ensure_refresher()
+    
+    if not _cached_https and not _cached_http:
+        logging.info(f"⏳ Nessun proxy in cache, attendo i primi risultati della scansione...")
+        _proxies_ready.clear()
+        try:
+            await asyncio.wait_for(_proxies_ready.wait(), timeout=PROXY_FIRST_SCAN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logging.warning("⚠️ Nessun proxy disponibile entro il tempo limite.")
+    elif time.time() - _last_scan_time > PROXY_CACHE_TIME_SECONDS:
+        logging.info(f"📦 Cache scaduta, uso i proxy precedenti durante l'aggiornamento.")
+    
+    return list(_cached_https), list(_cached_http)
 
 def get_valid_proxies() -> Tuple[List[Dict], List[Dict]]:
     global _cached_http, _cached_https, _last_scan_time
@@ -277,8 +408,7 @@ def get_valid_proxies() -> Tuple[List[Dict], List[Dict]]:
             try:
                 # Esegue asyncio.run per il bridge sincrono
                 results = asyncio.run(_perform_full_scan())
-                _cached_https = [{"ip": p["proxy"]["ip"], "port": p["proxy"]["port"]} for p in results if p["working_https"]]
-                _cached_http = [{"ip": p["proxy"]["ip"], "port": p["proxy"]["port"]} for p in results if p["working_http"]]
+                _cached_https, _cached_http = _split_scan_results(results)
                 _last_scan_time = time.time()
                 
                 _save_cache_to_file() # Salvataggio su disco
@@ -291,7 +421,7 @@ def get_valid_proxies() -> Tuple[List[Dict], List[Dict]]:
         return _cached_https, _cached_http
     
     
-async def _perform_full_scan():
+async def _perform_full_scan(on_result: Optional[Callable[[Dict], None]] = None):
     """Versione ridotta della logica main() per gestire la scansione interna."""
     all_proxies = await get_proxies_async()
     if not all_proxies:
@@ -299,13 +429,13 @@ async def _perform_full_scan():
 
     filtered = filter_proxies(all_proxies)
     
-    # Eseguiamo il ping (opzionale, come da tuo codice originale)
-    alive = await filter_by_ping(filtered)
+    # Verifica rapida della porta: i proxy più veloci vengono testati per primi
+    alive = await filter_by_probe(filtered)
     if not alive:
         alive = filtered
 
     # Test effettivo HTTP/HTTPS
-    return await test_all_proxies(alive)
+    return await test_all_proxies(alive, on_result)
 
 
 if __name__ == "__main__":
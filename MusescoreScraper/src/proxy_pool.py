@@ -0,0 +1,159 @@
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from global_vars import *
+
+
+class ProxyFailure:
+    """Tipi di errore registrati per ogni proxy."""
+    NAVIGATION_TIMEOUT: Final[str] = "navigation_timeout"
+    CONNECTION: Final[str] = "connection"
+    CLOUDFLARE: Final[str] = "cloudflare"
+    IMAGES: Final[str] = "images"
+    OTHER: Final[str] = "other"
+
+
+@dataclass
+class ProxyStats:
+    latency_ewma: Optional[float] = None    # secondi, media mobile esponenziale
+    attempts: int = 0
+    successes: int = 0
+    consecutive_failures: int = 0
+    quarantined_until: float = 0.0          # time.time() fino a cui il proxy non viene proposto
+    failures: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def success_ratio(self) -> float:
+        # Stima con smoothing di Laplace: un proxy mai provato vale 0.5
+        return (self.successes + 1) / (self.attempts + 2)
+
+
+class ProxyPool:
+    """
+    Statistiche dei proxy raccolte dagli scraping reali: latenza EWMA, percentuale di
+    successo ed errori per tipo. I candidati vengono ordinati per punteggio e i proxy che
+    falliscono restano in quarantena con backoff esponenziale.
+    """
+
+    def __init__(
+        self,
+        ewma_alpha: float = PROXY_EWMA_ALPHA,
+        quarantine_base_s: float = PROXY_QUARANTINE_BASE_SECONDS,
+        quarantine_max_s: float = PROXY_QUARANTINE_MAX_SECONDS,
+    ):
+        self.__alpha = ewma_alpha
+        self.__quarantine_base_s = quarantine_base_s
+        self.__quarantine_max_s = quarantine_max_s
+        self.__lock = threading.Lock()
+        self.__stats: Dict[str, ProxyStats] = {}
+
+    @staticmethod
+    def key(proxy: Dict) -> str:
+        return f"{proxy['ip']}:{proxy['port']}"
+
+    def _get_unsafe(self, proxy: Dict) -> ProxyStats:
+        key = self.key(proxy)
+        if key not in self.__stats:
+            self.__stats[key] = ProxyStats()
+        return self.__stats[key]
+
+    def _score_unsafe(self, proxy: Dict) -> float:
+        stats = self.__stats.get(self.key(proxy))
+        latency = None
+        if stats is not None:
+            latency = stats.latency_ewma
+        if latency is None:
+            # Latenza misurata dal test della scansione, se disponibile
+            latency = proxy.get("latency") or PROXY_DEFAULT_LATENCY_SECONDS
+        ratio = stats.success_ratio if stats is not None else 0.5
+        return ratio / max(latency, 0.05)
+
+    #===================================================================================#
+    # SELEZIONE                                                                         #
+    #===================================================================================#
+
+    def rank(self, proxies: List[Dict]) -> List[Dict]:
+        """
+        Candidati ordinati per punteggio, esclusi quelli in quarantena.
+        Se sono tutti in quarantena restituisce quelli con la quarantena più vicina alla fine.
+        """
+        now = time.time()
+        # Un proxy funzionante sia in HTTP che in HTTPS compare due volte
+        unique: Dict[str, Dict] = {}
+        for proxy in proxies:
+            unique.setdefault(self.key(proxy), proxy)
+        proxies = list(unique.values())
+
+        with self.__lock:
+            available = [p for p in proxies if self._get_unsafe(p).quarantined_until <= now]
+            if not available and proxies:
+                logging.warning("[ProxyPool] Tutti i proxy sono in quarantena, uso quelli in scadenza.")
+                return sorted(proxies, key=lambda p: self._get_unsafe(p).quarantined_until)[:PROXY_QUARANTINE_FALLBACK]
+            return sorted(available, key=self._score_unsafe, reverse=True)
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        """Percentile `q` (0-1) delle latenze EWMA dei proxy misurati, None se non ce ne sono."""
+        with self.__lock:
+            latencies = sorted(s.latency_ewma for s in self.__stats.values() if s.latency_ewma is not None)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * (len(latencies) - 1) + 0.5))]
+
+    #===================================================================================#
+    # ESITI                                                                             #
+    #===================================================================================#
+
+    def record_success(self, proxy: Dict, latency_s: Optional[float] = None):
+        with self.__lock:
+            stats = self._get_unsafe(proxy)
+            stats.attempts += 1
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            stats.quarantined_until = 0.0
+            if latency_s is not None:
+                self._update_latency_unsafe(stats, latency_s)
+
+    def record_failure(self, proxy: Dict, kind: str, latency_s: Optional[float] = None):
+        with self.__lock:
+            stats = self._get_unsafe(proxy)
+            stats.attempts += 1
+            stats.consecutive_failures += 1
+            stats.failures[kind] = stats.failures.get(kind, 0) + 1
+            if latency_s is not None:
+                self._update_latency_unsafe(stats, latency_s)
+
+            backoff = min(self.__quarantine_max_s, self.__quarantine_base_s * 2 ** (stats.consecutive_failures - 1))
+            stats.quarantined_until = time.time() + backoff
+            logging.info(f"[ProxyPool] {self.key(proxy)} in quarantena per {backoff:.0f}s ({kind})")
+
+    def _update_latency_unsafe(self, stats: ProxyStats, latency_s: float):
+        if stats.latency_ewma is None:
+            stats.latency_ewma = latency_s
+        else:
+            stats.latency_ewma = self.__alpha * latency_s + (1 - self.__alpha) * stats.latency_ewma
+
+    #===================================================================================#
+    # PERSISTENZA                                                                       #
+    #===================================================================================#
+
+    def to_dict(self) -> Dict[str, dict]:
+        with self.__lock:
+            return {key: asdict(stats) for key, stats in self.__stats.items()}
+
+    def load(self, data: Dict[str, dict]):
+        with self.__lock:
+            for key, values in data.items():
+                try:
+                    self.__stats[key] = ProxyStats(**values)
+                except TypeError:
+                    continue
+
+    def summary(self) -> Dict[str, int]:
+        now = time.time()
+        with self.__lock:
+            return {
+                "known": len(self.__stats),
+                "quarantined": sum(1 for s in self.__stats.values() if s.quarantined_until > now),
+            }
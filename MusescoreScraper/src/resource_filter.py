@@ -0,0 +1,116 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+from global_vars import *
+
+
+# Immagini delle pagine: .../score_0.svg, .../score_3.png@0?... (non vanno mai bloccate)
+SCORE_PAGE_URL_RE: Final = re.compile(r"/score_(\d+)\.(svg|png)(?:@\d+)?$", re.IGNORECASE)
+
+
+@dataclass
+class RouteStats:
+    """Richieste di un singolo tentativo di scraping (un contesto in uso da un job)."""
+    allowed: int = 0
+    blocked: int = 0
+    bytes_loaded: int = 0           # dai Content-Length delle risposte ricevute
+    bytes_saved_estimate: int = 0   # dimensioni tipiche delle risorse bloccate
+    blocked_by_type: Dict[str, int] = field(default_factory=dict)
+
+
+class ResourceFilter:
+    """
+    Regole per `context.route`: interrompe le richieste verso domini di terze parti noti
+    (pubblicità, analytics, video) e i tipi di risorsa non necessari al visualizzatore
+    (font, media, immagini diverse dalle pagine), lasciando passare il documento, gli script,
+    la verifica Cloudflare e le immagini dello spartito.
+    """
+
+    def __init__(
+        self,
+        blocked_types: Iterable[str] = RESOURCE_FILTER_BLOCKED_TYPES,
+        blocked_domains: Iterable[str] = RESOURCE_FILTER_BLOCKED_DOMAINS,
+        allowed_domains: Iterable[str] = RESOURCE_FILTER_ALLOWED_DOMAINS,
+    ):
+        self.__blocked_types = frozenset(blocked_types)
+        self.__blocked_domains = tuple(blocked_domains)
+        self.__allowed_domains = tuple(allowed_domains)
+        self.__stats = {"jobs": 0, "allowed": 0, "blocked": 0, "bytes_loaded": 0, "bytes_saved_estimate": 0, "navigation_seconds": 0.0}
+
+    @staticmethod
+    def _matches(host: str, domains: Iterable[str]) -> bool:
+        return any(host == d or host.endswith("." + d) for d in domains)
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        host = urlsplit(url).hostname or ""
+        if self._matches(host, self.__allowed_domains):
+            return False
+        if self._matches(host, self.__blocked_domains):
+            return True
+        if resource_type == "image" and SCORE_PAGE_URL_RE.search(urlsplit(url).path):
+            return False
+        return resource_type in self.__blocked_types
+
+    #===================================================================================#
+    # HANDLER PLAYWRIGHT                                                                #
+    #===================================================================================#
+
+    async def handle(self, route, stats: Optional[RouteStats]):
+        """Handler di `context.route("**/*", ...)`; `stats` è quello del job che usa il contesto."""
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            if stats is not None:
+                stats.blocked += 1
+                stats.blocked_by_type[request.resource_type] = stats.blocked_by_type.get(request.resource_type, 0) + 1
+                stats.bytes_saved_estimate += RESOURCE_FILTER_ESTIMATED_BYTES.get(request.resource_type, RESOURCE_FILTER_ESTIMATED_BYTES["other"])
+            try:
+                await route.abort("blockedbyclient")
+            except Exception:
+                pass
+            return
+
+        if stats is not None:
+            stats.allowed += 1
+        try:
+            await route.continue_()
+        except Exception:
+            # La pagina è stata chiusa mentre la richiesta era in attesa
+            pass
+
+    @staticmethod
+    def on_response(response, stats: Optional[RouteStats]):
+        if stats is None:
+            return
+        try:
+            stats.bytes_loaded += int(response.headers.get("content-length", 0))
+        except ValueError:
+            pass
+
+    #===================================================================================#
+    # STATISTICHE                                                                       #
+    #===================================================================================#
+
+    def finish(self, stats: RouteStats, navigation_s: Optional[float]):
+        """Registra e stampa il risultato del filtro per un tentativo arrivato allo scroller."""
+        self.__stats["jobs"] += 1
+        self.__stats["allowed"] += stats.allowed
+        self.__stats["blocked"] += stats.blocked
+        self.__stats["bytes_loaded"] += stats.bytes_loaded
+        self.__stats["bytes_saved_estimate"] += stats.bytes_saved_estimate
+        if navigation_s is not None:
+            self.__stats["navigation_seconds"] += navigation_s
+
+        logging.info(
+            f"[ResourceFilter] Navigazione {navigation_s or 0:.1f}s: {stats.allowed} richieste, "
+            f"{stats.bytes_loaded / 1024:.0f} KB caricati, {stats.blocked} bloccate "
+            f"(~{stats.bytes_saved_estimate / 1024:.0f} KB risparmiati) {stats.blocked_by_type}"
+        )
+
+    def stats(self) -> Dict:
+        jobs = self.__stats["jobs"]
+        return {
+            **self.__stats,
+            "avg_navigation_seconds": self.__stats["navigation_seconds"] / jobs if jobs else 0.0,
+        }
@@ -0,0 +1,108 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from global_vars import *
+from data_manager import DataBaseManager, DownloadStatus, FileRecord
+from job_executor import ScrapeJob
+
+
+CacheKey = Tuple[str, float, int]   # (URL normalizzato, scale, filter)
+
+
+class ScoreResultCache:
+    """
+    Cache dei risultati per (URL dello spartito, scale, filter) che punta al PDF di un
+    FileRecord ancora presente. Le richieste identiche a un job in corso vengono agganciate
+    a quel job (single-flight) invece di avviare un nuovo ciclo proxy + browser.
+    """
+
+    def __init__(self, db_manager: DataBaseManager, download_path: str = DOWNLOAD_PATH):
+        self.__db_manager = db_manager
+        self.__download_path = download_path
+        self.__lock = threading.Lock()
+        self.__results: Dict[CacheKey, Tuple[str, str]] = {}   # chiave -> (nome del file PDF, task_id)
+        self.__inflight: Dict[CacheKey, str] = {}   # chiave -> task_id del job in corso
+        self.__stats = {"hits": 0, "misses": 0, "joined": 0}
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """URL senza query, frammento, 'www.' e slash finale (stesso spartito -> stessa stringa)."""
+        parts = urlsplit(url.strip())
+        host = parts.netloc.lower()
+        if host.startswith("www."):
+            host = host[4:]
+        return f"{host}{parts.path.rstrip('/')}"
+
+    @classmethod
+    def make_key(cls, url: str, scale: float, sharpen_count: int) -> CacheKey:
+        return (cls.normalize_url(url), float(scale), int(sharpen_count))
+
+    def _is_alive(self, record: Optional[FileRecord]) -> bool:
+        return (
+            record is not None
+            and record.status == DownloadStatus.COMPLETED
+            and os.path.exists(os.path.join(self.__download_path, record.file_name))
+        )
+
+    def _lookup_unsafe(self, key: CacheKey) -> Optional[str]:
+        """task_id del job che ha prodotto il PDF per la chiave, None se non disponibile."""
+        cached = self.__results.get(key)
+        if cached is not None:
+            file_name, task_id = cached
+            if self._is_alive(self.__db_manager.get_file(file_name)):
+                return task_id
+            # Il file è stato eliminato o rimosso dal garbage collector
+            del self.__results[key]
+
+        # Dopo un riavvio la cache in memoria è vuota: si cerca tra i file del database
+        for record in self.__db_manager.get_all_files():
+            task_id = ScrapeJob.task_id_from_file(record.file_name)
+            if task_id is None or self.make_key(record.source_url, record.scale, record.filter) != key:
+                continue
+            if self._is_alive(record):
+                self.__results[key] = (record.file_name, task_id)
+                return task_id
+        return None
+
+    def acquire(self, key: CacheKey, task_id: str) -> Tuple[str, Optional[str]]:
+        """
+        Restituisce ("hit", task_id) con il job che ha prodotto il PDF se esiste già,
+        ("joined", task_id) se un job identico è in corso, altrimenti ("miss", None) e
+        registra `task_id` come job in corso.
+        """
+        with self.__lock:
+            cached_task_id = self._lookup_unsafe(key)
+            if cached_task_id is not None:
+                self.__stats["hits"] += 1
+                return ("hit", cached_task_id)
+
+            running = self.__inflight.get(key)
+            if running is not None:
+                self.__stats["joined"] += 1
+                return ("joined", running)
+
+            self.__stats["misses"] += 1
+            self.__inflight[key] = task_id
+            return ("miss", None)
+
+    def release(self, key: CacheKey, task_id: str, file_name: Optional[str] = None):
+        """Chiude il job in corso per la chiave; se è terminato con successo ne memorizza il PDF."""
+        with self.__lock:
+            if self.__inflight.get(key) == task_id:
+                del self.__inflight[key]
+            if file_name is not None:
+                self.__results[key] = (file_name, task_id)
+
+    def stats(self) -> Dict:
+        with self.__lock:
+            requests = self.__stats["hits"] + self.__stats["joined"] + self.__stats["misses"]
+            return {
+                **self.__stats,
+                "requests": requests,
+                # Le richieste agganciate a un job in corso non avviano lo scraping: contano come hit
+                "hit_rate": (self.__stats["hits"] + self.__stats["joined"]) / requests if requests else 0.0,
+                "cached": len(self.__results),
+                "inflight": len(self.__inflight),
+            }
@@ -0,0 +1,100 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from global_vars import *
+from resource_filter import SCORE_PAGE_URL_RE
+
+
+SCORE_ID_RE: Final = re.compile(r"/scores/(\d+)")
+
+# Parametri di URL firmati: cambiano per ogni pagina, quindi l'URL non si può costruire
+SIGNED_QUERY_KEYS: Final = ("signature", "x-amz-signature", "expires", "token", "policy", "key-pair-id")
+
+# Legge dal documento i dati usati da parse_metadata()
+METADATA_SCRIPT: Final[str] = """() => {
+    const store = document.querySelector('.js-store');
+    const meta = name => {
+        const el = document.querySelector(`meta[property="${name}"]`);
+        return el ? el.getAttribute('content') : null;
+    };
+    const img = document.querySelector('img.MHaWn');
+    return {
+        store: store ? store.getAttribute('data-content') : null,
+        og_url: meta('og:url'),
+        og_image: meta('og:image'),
+        first_img: img ? img.src : null,
+    };
+}"""
+
+
+@dataclass
+class ScoreMetadata:
+    """Dati dello spartito letti dalla pagina prima dello scroll."""
+    score_id: Optional[str] = None
+    pages_count: Optional[int] = None
+    first_page_url: Optional[str] = None
+
+
+def parse_metadata(raw: Dict) -> ScoreMetadata:
+    """
+    Metadati dai dati di METADATA_SCRIPT: stato JSON (.js-store), poi tag `og:` e infine
+    l'URL della prima immagine. Il numero di pagine viene solo dallo stato JSON: il visualizzatore
+    crea i segnaposto <img> man mano che si scorre, quindi contarli lo sottostima.
+    """
+    meta = ScoreMetadata()
+
+    try:
+        score = json.loads(raw.get("store") or "null")["store"]["page"]["data"]["score"]
+        if score.get("id"):
+            meta.score_id = str(score["id"])
+        if score.get("pages_count"):
+            meta.pages_count = int(score["pages_count"])
+    except (TypeError, KeyError, ValueError):
+        pass
+
+    if meta.score_id is None and raw.get("og_url"):
+        match = SCORE_ID_RE.search(raw["og_url"])
+        if match:
+            meta.score_id = match.group(1)
+
+    for url in (raw.get("first_img"), raw.get("og_image")):
+        if url and SCORE_PAGE_URL_RE.search(urlsplit(url).path):
+            meta.first_page_url = url
+            break
+
+    return meta
+
+
+def page_url_template(url: str) -> Optional[str]:
+    """URL con l'indice della pagina sostituito da `{}`, None se non è un URL di pagina o è firmato."""
+    parts = urlsplit(url)
+    match = SCORE_PAGE_URL_RE.search(parts.path)
+    if match is None:
+        return None
+    if any(key.lower() in SIGNED_QUERY_KEYS for key, _ in parse_qsl(parts.query)):
+        return None
+    start, end = match.span(1)
+    template = parts.path[:start].replace("{", "{{").replace("}", "}}") + "{}" + parts.path[end:].replace("{", "{{").replace("}", "}}")
+    query = "?" + parts.query.replace("{", "{{").replace("}", "}}") if parts.query else ""
+    return f"{parts.scheme}://{parts.netloc}{template}{query}"
+
+
+def synthesize_page_urls(known: Dict[int, str], pages_count: Optional[int], skip: Iterable[int] = ()) -> Dict[int, str]:
+    """
+    URL delle pagine mancanti (indice -> URL) costruiti dagli URL già noti.
+    Il modello è considerato prevedibile solo se almeno due pagine note lo confermano;
+    altrimenti (o senza numero di pagine) restituisce un dizionario vuoto.
+    """
+    if not pages_count or len(known) < 2:
+        return {}
+
+    templates = {page_url_template(url) for url in known.values()}
+    if len(templates) != 1 or None in templates:
+        return {}
+    template = templates.pop()
+
+    skip = set(skip) | set(known)
+    return {index: template.format(index) for index in range(pages_count) if index not in skip}
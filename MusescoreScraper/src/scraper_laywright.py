@@ -1,26 +1,28 @@
 import os
-import random
 import sys
-import threading
 import time
 import logging
-from typing import Dict, List, Optional, Tuple
+import tempfile
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
-# Import Playwright
 import asyncio
-from playwright.async_api import async_playwright
-from playwright_stealth import Stealth
-
-from svglib.svglib import svg2rlg
-from reportlab.graphics import renderPDF
-from PIL import Image, ImageFilter
-from PyPDF2 import PdfMerger
-import requests
 import subprocess
-import platform
 
 from global_vars import *
-from proxyFinder import get_valid_proxies, get_valid_proxies_async
+from proxyFinder import get_valid_proxies, get_valid_proxies_async, proxy_pool, save_proxy_cache
+from proxy_pool import ProxyFailure, ProxyPool
+from async_runtime import AsyncLoopThread
+from browser_pool import BrowserPool
+from http_downloader import PageDownloader
+from page_converter import PageConverter, PageSpool
+from page_cache import RawPageCache
+from resource_filter import SCORE_PAGE_URL_RE, ResourceFilter
+from score_metadata import METADATA_SCRIPT, ScoreMetadata, parse_metadata, synthesize_page_urls
+
+
+class _HedgeLost(Exception):
+    """Un altro tentativo in parallelo ha raggiunto lo scroller per primo."""
 
 
 class MuseScoreScraper:
@@ -66,6 +68,7 @@ class MuseScoreScraper:
         # Parametro mantenuto per compatibilità ma non più strettamente necessario 
         # poiché Playwright gestisce automaticamente le versioni dei browser.
         automatically_detect_version_and_download: bool = True, 
+        capture_mode: str = SCRAPE_CAPTURE_MODE,
     ):
         """
         Inizializza lo scraper con Playwright.
@@ -74,13 +77,39 @@ class MuseScoreScraper:
         :param use_remote: Se True, tenta di connettersi a un endpoint CDP remoto.
         :param remote_url: L'URL dell'endpoint CDP (es. http://localhost:9222).
         :param base_folder: Cartella base per il salvataggio dei file.
+        :param capture_mode: "network" salva le pagine dalle risposte, "scroll" usa la scansione degli <img>.
         """
         self.__headless = headless
+        self.capture_mode = capture_mode
         self.use_remote = use_remote
         self.remote_url = remote_url
         self.base_folder = base_folder
         
+        # Loop asyncio e browser di lunga durata condivisi da tutti i job
+        self._runtime = AsyncLoopThread("scraper-loop")
+        self._resource_filter = ResourceFilter() if RESOURCE_FILTER_ENABLED else None
+        self._pool = BrowserPool(headless=headless, resource_filter=self._resource_filter)
+        self._downloader = PageDownloader()
+        self._converter = PageConverter()
+        self._page_cache = RawPageCache()
         
+    @property
+    def runtime(self) -> AsyncLoopThread:
+        return self._runtime
+
+    def get_pool_stats(self) -> Dict:
+        stats = {**self._pool.stats(), "http": self._downloader.stats(), "convert": self._converter.stats(), "page_cache": self._page_cache.stats(), "proxies": proxy_pool.summary()}
+        if self._resource_filter is not None:
+            stats["resource_filter"] = self._resource_filter.stats()
+        return stats
+    
+    def close(self):
+        """Chiude i client HTTP, il browser, i contesti del pool e i processi di conversione."""
+        self._runtime.run(self._downloader.close())
+        self._runtime.run(self._pool.close())
+        self._converter.close()
+        # Esiti dei proxy registrati dopo l'ultimo salvataggio
+        save_proxy_cache(flush=True)
             
 
     @staticmethod
@@ -101,11 +130,48 @@ class MuseScoreScraper:
         return None
 
 
-    async def download_FromMuseScore(self, context, browser, src: str, save_name: str, score_num: int, scale: int = 2, sharpen_count: int = 1) -> Tuple[bool, Optional[str]]:
+    @staticmethod
+    def _score_page_index(url: str) -> Optional[int]:
+        """Indice della pagina dall'URL dell'immagine (score_N.svg/png), None se non è una pagina."""
+        match = SCORE_PAGE_URL_RE.search(urlsplit(url).path)
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    async def _score_metadata(page) -> ScoreMetadata:
+        """Id dello spartito, numero di pagine e URL della prima pagina letti dal documento."""
+        try:
+            return parse_metadata(await page.evaluate(METADATA_SCRIPT))
+        except Exception as e:
+            logging.debug(f"Metadati dello spartito non disponibili: {e}")
+            return ScoreMetadata()
+
+    async def _capture_pages(self, scroller, captured: Dict[int, asyncio.Future], page_event: asyncio.Event, declared: Optional[int]):
         """
-        Scarica e converte lo spartito usando il contesto di Playwright esistente.
+        Scorre lo spartito finché le risposte di rete non contengono tutte le pagine dichiarate.
+        Invece di pause fisse attende l'arrivo di una nuova pagina (al massimo SCORE_CAPTURE_WAIT_SECONDS).
         """
-        os.makedirs(DOWNLOAD_PATH, exist_ok=True)
+        for _ in range(SCORE_CAPTURE_MAX_STEPS):
+            if declared and len(captured) >= declared:
+                break
+
+            state = await scroller.evaluate("el => ({top: el.scrollTop, height: el.scrollHeight, view: el.clientHeight})")
+            at_bottom = state["top"] + state["view"] >= state["height"] - 1
+            before = len(captured)
+
+            page_event.clear()
+            if not at_bottom:
+                await scroller.evaluate(f"el => el.scrollTop = {state['top'] + max(300, state['view'])}")
+            try:
+                await asyncio.wait_for(page_event.wait(), timeout=SCORE_CAPTURE_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+            # In fondo e nessuna pagina nuova: non arriverà altro
+            if at_bottom and len(captured) == before:
+                break
+
+    async def _fetch_with_tab(self, context, src: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """Scarica l'immagine aprendo un tab nel contesto (metodo lento, usato come fallback)."""
         new_tab = None
         try:
             # 1. Crea un nuovo tab (page) nel contesto esistente
@@ -118,7 +184,7 @@ class MuseScoreScraper:
             if not response or response.status != 200:
                 logging.warning(f"Tab: Errore risposta {response.status if response else 'Null'} per {src}")
                 await new_tab.close()
-                return (False, None)
+                return None
 
             # 3. Ottieni il buffer binario direttamente dal corpo della risposta del tab
             content = await response.body()
@@ -126,273 +192,511 @@ class MuseScoreScraper:
             
             # Chiudiamo il tab immediatamente per risparmiare risorse
             await new_tab.close()
-            new_tab = None
+            return (content, res_headers)
 
         except Exception as e:
             logging.error(f"Errore durante l'apertura del tab per {src}: {e}")
             if new_tab:
                 await new_tab.close()
-            return (False, None)
+            return None
+
+    async def download_FromMuseScore(self, context, browser, src: str, spool: PageSpool, score_num: int, scale: int = 2, sharpen_count: int = 1, proxy: Optional[Dict[str, str]] = None, user_agent: Optional[str] = None, referer: Optional[str] = None, tab_fallback: bool = True) -> bool:
+        """
+        Scarica e converte lo spartito con il client HTTP condiviso, usando proxy, cookie e
+        user agent del contesto Playwright. Se la richiesta fallisce usa un tab del browser,
+        a meno di `tab_fallback=False` (URL costruiti che potrebbero non esistere).
+        """
+        try:
+            headers = {"Cookie": PageDownloader.cookie_header(await context.cookies(src))}
+            if user_agent:
+                headers["User-Agent"] = user_agent
+            if referer:
+                headers["Referer"] = referer
+            with tempfile.SpooledTemporaryFile(max_size=PAGE_BUFFER_MAX_MEMORY_BYTES) as buffer:
+                res_headers = await self._downloader.download(src, buffer, proxy, headers)
+                buffer.seek(0)
+                content = buffer.read()
+        except Exception as e:
+            if not tab_fallback:
+                logging.warning(f"Download HTTP fallito per {src}: {e}.")
+                return False
+            logging.warning(f"Download HTTP fallito per {src}: {e}. Uso un tab del browser.")
+            fetched = await self._fetch_with_tab(context, src)
+            if fetched is None:
+                return False
+            content, res_headers = fetched
+
+        return await self.convert_page(content, src, res_headers, spool, score_num, scale, sharpen_count)
+
+    async def convert_page(self, content: bytes, src: str, headers: Dict[str, str], spool: PageSpool, score_num: int, scale: int = 2, sharpen_count: int = 1, cache: bool = True) -> bool:
+        """Converte in PDF il contenuto (SVG o PNG) di una pagina già scaricata e lo aggiunge allo spool."""
+        if cache:
+            # L'originale serve per rese future con altre impostazioni
+            try:
+                await asyncio.to_thread(self._page_cache.put, src, content)
+            except OSError as e:
+                logging.warning(f"Impossibile salvare in cache la pagina {src}: {e}")
 
         # Riconoscimento tipo file
-        score_type = self._detect_score_type_from_url_or_header(src, res_headers)
+        score_type = self._detect_score_type_from_url_or_header(src, headers)
         if score_type is None:
             # Controllo rapido nel contenuto se l'header fallisce
             score_type = 'svg' if b'<svg' in content[:100].lower() else 'png'
 
-        base_name = f"{save_name}_{score_num:03d}" # 001, 002... per ordinamento corretto
-        ext = '.svg' if score_type == 'svg' else '.png'
-        raw_path = os.path.join(DOWNLOAD_PATH, base_name + ext)
-        pdf_path = os.path.join(DOWNLOAD_PATH, base_name + '.pdf')
+        # Conversione in PDF nel pool di processi, senza bloccare il loop
+        pdf = await self._converter.render(content, score_type, scale, sharpen_count)
+        if pdf is None:
+            return False
 
-        # Scrittura file temporaneo
-        with open(raw_path, 'wb') as f:
-            f.write(content)
-
-        # Conversione in PDF
-        try:
-            if score_type == 'svg':
-                drawing = svg2rlg(raw_path)
-                renderPDF.drawToFile(drawing, pdf_path)
-            else:
-                with Image.open(raw_path) as im:
-                    im = im.convert('RGB')
-                    w, h = im.size
-                    # Resize ad alta qualità
-                    im = im.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
-                    
-                    for _ in range(sharpen_count):
-                        im = im.filter(ImageFilter.SHARPEN)
-                    
-                    im.save(pdf_path, "PDF", resolution=100.0)
-            
-            # Pulizia: rimuove il file originale (PNG/SVG) dopo la conversione
-            if os.path.exists(raw_path):
-                os.remove(raw_path)
-                
-        except Exception as e:
-            logging.error(f"Errore conversione {raw_path}: {e}")
-            if os.path.exists(raw_path):
-                try:
-                    os.remove(raw_path)
-                except Exception as cleanup_e:
-                    logging.error(f"Errore durante la pulizia del file {raw_path}: {cleanup_e}")
-        
-            return (False, None)
-
-        logging.info(f"Completato: {pdf_path}")
-        return (True, pdf_path)
+        spool.add(score_num, pdf, source=src)
+        logging.info(f"Pagina {score_num} convertita ({len(pdf)} byte)")
+        return True
         
-    def merge_pages(self, save_name: str, files: List[str]) -> str:
-        merger = PdfMerger()
-        for f in files:
-            if os.path.isfile(f):
-                merger.append(f)
-            else:
-                logging.warning(f"Pagina mancante: {f}")
+    def merge_pages(self, save_name: str, spool: PageSpool) -> str:
+        """Scrive il PDF finale con tutte le pagine dello spool (unica scrittura su disco)."""
+        os.makedirs(DOWNLOAD_PATH, exist_ok=True)
         out_path = os.path.join(DOWNLOAD_PATH, f"{save_name}.pdf")
-        merger.write(out_path)
-        merger.close()
-        
-        for f in files:
-            if os.path.isfile(f):
-                os.remove(f)
+        try:
+            spool.write_pdf(out_path)
+        finally:
+            spool.close()
                 
         logging.info(f"PDF finale creato: {out_path}")
         return out_path
     
     def scrape_musicSheet(self, url:str, save_name: str, scale: int = 2, sharpen_count: int = 1) -> Tuple[bool, Optional[str]]:
+        return self._runtime.run(self.scrape_musicSheet_async(url, save_name, scale=scale, sharpen_count=sharpen_count))
+
+    async def scrape_musicSheet_async(self, url:str, save_name: str, scale: int = 2, sharpen_count: int = 1) -> Tuple[bool, Optional[str]]:
+        """Versione asincrona di scrape_musicSheet, da eseguire sul loop dello scraper."""
         try:
-            result = asyncio.run(self.scrape_musescore(url, save_name, scale=scale, sharpen_count=sharpen_count))
+            result = await self.scrape_musescore(url, save_name, scale=scale, sharpen_count=sharpen_count)
             
             if not result or len(result) == 0:
                 logging.warning("Nessuna immagine trovata durante lo scraping.")
+                if result is not None:
+                    result.close()
                 return (False, None)
 
-            return (True, self.merge_pages(save_name, result))
+            # L'unione dei PDF è bloccante: non deve fermare gli altri job sul loop
+            return (True, await asyncio.to_thread(self.merge_pages, save_name, result))
             
         except Exception as e:
             logging.error(f"Errore durante lo scraping: {e}")
             return (False, None)
         
     
-    async def scrape_musescore(self, url: str, save_name: str, scale: int = 2, sharpen_count: int = 1, step_pixels: int = 450, step_delay: float = 0.8, end_pause: float = 2.5) -> List[str]:
+    @staticmethod
+    def _classify_failure(error: Exception) -> str:
+        """Tipo di errore di un tentativo, per le statistiche del proxy."""
+        message = str(error)
+        if "Scroller non trovato" in message:
+            # Pagina di verifica Cloudflare o IP bloccato
+            return ProxyFailure.CLOUDFLARE
+        if "Download incompleto" in message or "Conversione incompleta" in message or "Nessuna immagine" in message:
+            return ProxyFailure.IMAGES
+        if "Timeout" in type(error).__name__ or "Timeout" in message:
+            return ProxyFailure.NAVIGATION_TIMEOUT
+        if "net::ERR" in message or isinstance(error, OSError):
+            return ProxyFailure.CONNECTION
+        return ProxyFailure.OTHER
+
+    async def _record_proxy_outcome(self, proxy_info: Dict, failure: Optional[str], latency_s: Optional[float]):
+        """Registra l'esito del tentativo nel pool dei proxy e salva le statistiche."""
+        if failure is None:
+            proxy_pool.record_success(proxy_info, latency_s)
+        else:
+            proxy_pool.record_failure(proxy_info, failure, latency_s)
+        try:
+            await asyncio.to_thread(save_proxy_cache)
+        except Exception as e:
+            logging.warning(f"Impossibile salvare le statistiche dei proxy: {e}")
+
+    async def _render_from_cache(self, url: str, scale: int, sharpen_count: int) -> Optional[PageSpool]:
+        """Rende lo spartito dalle immagini in cache (nessun browser né proxy), None se incomplete."""
+        pages = await asyncio.to_thread(self._page_cache.get_pages, url)
+        if not pages:
+            return None
+
+        logging.info(f"Spartito {url} in cache: conversione locale di {len(pages)} pagine.")
+        spool = PageSpool()
+        results = await asyncio.gather(*(
+            self.convert_page(content, src, {}, spool, index, scale, sharpen_count, cache=False)
+            for index, (src, content) in pages.items()
+        ))
+        if not all(results):
+            spool.close()
+            return None
+        return spool
+
+    def _hedge_delay(self) -> float:
+        """Attesa prima di avviare un tentativo in parallelo: fissa o dal percentile delle latenze note."""
+        if PROXY_HEDGE_DELAY_SECONDS >= 0:
+            return PROXY_HEDGE_DELAY_SECONDS
+        latency = proxy_pool.latency_percentile(PROXY_HEDGE_PERCENTILE)
+        if latency is None:
+            latency = PROXY_DEFAULT_LATENCY_SECONDS
+        return max(PROXY_HEDGE_MIN_DELAY_SECONDS, latency)
+
+    async def _run_hedged(self, candidates: List[Dict], attempt: Callable[[Dict, Callable[[], bool]], Awaitable[PageSpool]]) -> PageSpool:
+        """
+        Prova i proxy in ordine con al massimo PROXY_HEDGE_K tentativi contemporanei.
+        Un nuovo tentativo parte dopo il ritardo di hedging o appena uno fallisce; il primo
+        che raggiunge lo scroller (claim) prosegue con lo scraping e gli altri vengono annullati.
+        """
+        pending = list(candidates)
+        running: Dict[asyncio.Task, Dict] = {}
+        state = {"winner": None}
+        claimed = asyncio.Event()
+        last_exception: Optional[BaseException] = None
+        delay = self._hedge_delay()
+
+        def start():
+            proxy_info = pending.pop(0)
+            task = None
+
+            def claim() -> bool:
+                if state["winner"] is None:
+                    state["winner"] = task
+                    claimed.set()
+                return state["winner"] is task
+
+            task = asyncio.ensure_future(attempt(proxy_info, claim))
+            running[task] = proxy_info
+
+        try:
+            while running or pending:
+                if not running:
+                    start()
+
+                winner = state["winner"]
+                can_hedge = winner is None and pending and len(running) < PROXY_HEDGE_K
+                waiters = set(running)
+                claim_waiter = None
+                if winner is None:
+                    claim_waiter = asyncio.ensure_future(claimed.wait())
+                    waiters.add(claim_waiter)
+
+                done, _ = await asyncio.wait(waiters, timeout=delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED)
+                if claim_waiter is not None and not claim_waiter.done():
+                    claim_waiter.cancel()
+
+                if not done:
+                    # Il tentativo in corso è lento: si avvia il proxy successivo in parallelo
+                    logging.info(f"Nessuno scroller dopo {delay:.1f}s, avvio un tentativo in parallelo.")
+                    start()
+                    continue
+
+                winner = state["winner"]
+                if winner is not None:
+                    # Lo scraping prosegue solo con il vincitore
+                    for task in running:
+                        if task is not winner and not task.done():
+                            task.cancel()
+
+                for task in done:
+                    if task not in running:
+                        continue
+                    proxy_info = running.pop(task)
+                    if task.cancelled():
+                        continue
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    if not isinstance(error, _HedgeLost):
+                        last_exception = error
+                    if task is winner:
+                        # Il vincitore è fallito dopo lo scroller: si riprende con i proxy rimasti
+                        logging.warning(f"Proxy {ProxyPool.key(proxy_info)} fallito dopo lo scroller, si riprende con i successivi.")
+                        state["winner"] = None
+                        claimed.clear()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        raise Exception(f"Impossibile completare lo scraping. Ultimo errore: {last_exception}")
+
+    async def scrape_musescore(self, url: str, save_name: str, scale: int = 2, sharpen_count: int = 1, step_pixels: int = 450, step_delay: float = 0.8, end_pause: float = 2.5) -> Optional[PageSpool]:
         """
         Esegue lo scraping utilizzando Playwright.
+        Restituisce le pagine già convertite in PDF, da scrivere con merge_pages().
         """
-        
-        async def cloudfare_test_click1():
-            await page.frame_locator("iframe").first.locator("input[type='checkbox']").click(timeout=3000)
-            
-        async def cloudfare_test_click2():
-            await page.get_by_text("Stiamo verificando che tu non sia un robot").click(timeout=2000)    
-            
-        async def cloudfare_test_click3():
-            await page.frame_locator("iframe").first.locator("label.cb-lb").click(timeout=2000)
-        
-        function_test_cick_cloudfare = [cloudfare_test_click1, cloudfare_test_click2, cloudfare_test_click3]
-            
-        
-        imgs_urls = set()
+        # Pagine già scaricate per questo spartito (anche con altre impostazioni): solo conversione locale
+        cached_spool = await self._render_from_cache(url, scale, sharpen_count)
+        if cached_spool is not None:
+            return cached_spool
         
         https_proxies, http_proxies = await get_valid_proxies_async()
         
         print(f"Proxy HTTPS validi: {len(https_proxies)}")
         print(f"Proxy HTTP validi: {len(http_proxies)}")
         
-        available_proxies = https_proxies + http_proxies
-        random.shuffle(available_proxies)
+        # Prima i proxy con il punteggio migliore; quelli falliti di recente sono in quarantena
+        available_proxies = proxy_pool.rank(https_proxies + http_proxies)
         
         if not available_proxies:
             logging.error("Nessun proxy valido disponibile.")
-            return []
+            return None
 
-        last_exception = None
+        async def attempt(proxy_info: Dict, claim: Callable[[], bool]) -> PageSpool:
+            return await self._scrape_with_proxy(url, scale, sharpen_count, proxy_info, claim)
 
-        # --- INIZIO CICLO SUI PROXY ---
-        for proxy_info in available_proxies:
-            proxy_ip = proxy_info['ip']
-            proxy_port = proxy_info['port']
-            proxy_settings = {
-                "server": f"http://{proxy_ip}:{proxy_port}",
-            }
-            
-            logging.info(f"Tentativo con Proxy: {proxy_ip}:{proxy_port}")
-            
-            # Variabili per il tracciamento delle immagini resettate ad ogni tentativo
-            imgs_urls = set()
-            
-            try:
-                async with async_playwright() as p:
-                    browser = await p.chromium.launch(
-                        headless=self.__headless,
-                        proxy=proxy_settings,
-                        args=[
-                            "--disable-gpu",
-                            "--no-sandbox",
-                            #"--disable-blink-features=AutomationControlled",
-                            #"--disable-features=IsolateOrigins,site-per-process"
-                        ]
-                    )
-                    
-                    context = await browser.new_context()
-                    page = await context.new_page()
-                    
-                    # Imposta un timeout globale più alto per navigazioni lente con proxy
-                    page.set_default_timeout(60000) 
-
-                    await page.add_init_script("""
-                        Object.defineProperty(navigator, 'webdriver', {
-                            get: () => undefined
-                        })
-                    """)
+        try:
+            return await self._run_hedged(available_proxies, attempt)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Tutti i tentativi sono terminati senza risultato
+            logging.error("Tutti i proxy disponibili hanno fallito.")
+            raise
+
+    async def _scrape_with_proxy(self, url: str, scale: int, sharpen_count: int, proxy_info: Dict, claim: Callable[[], bool]) -> PageSpool:
+        """
+        Un tentativo di scraping attraverso un proxy. Raggiunto lo scroller chiama `claim()`:
+        se un altro tentativo è arrivato prima si interrompe senza penalizzare il proxy.
+        """
+        proxy_ip = proxy_info['ip']
+        proxy_port = proxy_info['port']
+        proxy_settings = {
+            "server": f"http://{proxy_ip}:{proxy_port}",
+        }
+        
+        logging.info(f"Tentativo con Proxy: {proxy_ip}:{proxy_port}")
+        
+        spool = PageSpool()
+        nav_latency = None
+
+        # Le pagine vengono salvate mentre il browser le scarica (nessun secondo download)
+        # e la conversione di ognuna parte appena arriva: indice pagina -> conversione
+        captured: Dict[int, asyncio.Future] = {}
+        page_event = asyncio.Event()
+        
+        try:
+            # Contesto dal pool: nessun avvio di Chromium per tentativo (lo script anti-webdriver è nel contesto)
+            async with self._pool.lease(proxy_settings) as pooled:
+                browser = pooled.browser
+                context = pooled.context
+                page = await context.new_page()
+                
+                # Imposta un timeout globale più alto per navigazioni lente con proxy
+                page.set_default_timeout(60000) 
+
+                async def cloudfare_test_click1():
+                    await page.frame_locator("iframe").first.locator("input[type='checkbox']").click(timeout=3000)
                     
-                    logging.info(f"Navigazione verso: {url}")
+                async def cloudfare_test_click2():
+                    await page.get_by_text("Stiamo verificando che tu non sia un robot").click(timeout=2000)    
                     
-                    # Tenta di caricare la pagina
-                    try:
-                        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
-                    except Exception as nav_err:
-                        logging.warning(f"Timeout o errore di navigazione con proxy {proxy_ip}: {nav_err}")
-                        raise nav_err # Solleva l'errore per passare al prossimo proxya
+                async def cloudfare_test_click3():
+                    await page.frame_locator("iframe").first.locator("label.cb-lb").click(timeout=2000)
+                
+                function_test_cick_cloudfare = [cloudfare_test_click1, cloudfare_test_click2, cloudfare_test_click3]
 
-                    # --- Risoluzione Cloudflare / Robot Check ---
-                    # Tentativo 1: Checkbox standard dentro iframe
-                    
+                async def on_response(response):
+                    index = self._score_page_index(response.url)
+                    if index is None or index in captured or response.status != 200:
+                        return
+                    try:
+                        content = await response.body()
+                    except Exception as e:
+                        logging.debug(f"Corpo della pagina {index} non disponibile: {e}")
+                        return
+                    if index not in captured:
+                        captured[index] = asyncio.ensure_future(self.convert_page(content, response.url, response.headers, spool, index, scale, sharpen_count))
+                        page_event.set()
+
+                if self.capture_mode == "network":
+                    page.on("response", on_response)
+                
+                logging.info(f"Navigazione verso: {url}")
+                
+                # Tenta di caricare la pagina
+                try:
+                    nav_started = time.perf_counter()
+                    await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+                    nav_latency = time.perf_counter() - nav_started
+                except Exception as nav_err:
+                    logging.warning(f"Timeout o errore di navigazione con proxy {proxy_ip}: {nav_err}")
+                    raise nav_err # Solleva l'errore per passare al prossimo proxya
+
+                # --- Risoluzione Cloudflare / Robot Check ---
+                # Tentativo 1: Checkbox standard dentro iframe
+                
+                
+                laoded = False
+                clicked = False
+                for _ in range(5):
                     
-                    laoded = False
-                    clicked = False
-                    for _ in range(5):
-                        
-                        if laoded:
-                            break
-    
-                        for test_func in function_test_cick_cloudfare:
-                            try:
-                                await test_func()
-                                clicked = True
-                                break
-                            except Exception:
-                                continue
-                        
-                        if clicked:
+                    if laoded:
+                        break
+
+                    for test_func in function_test_cick_cloudfare:
+                        try:
+                            await test_func()
+                            clicked = True
                             break
-                            
-                        count = 0
-                        while count <= 10:
-                            try:
-                                scroller = page.locator("#jmuse-scroller-component")
-                                await scroller.wait_for(timeout=1000)
-                                logging.info("Scroller trovato.")
-                                laoded = True
-                            except Exception:
-                                logging.error(f"Scroller non trovato con proxy {proxy_ip}. Il sito potrebbe aver bloccato l'IP o la struttura è cambiata.")
-                                raise Exception("Scroller non trovato")
-                            count += 1
+                        except Exception:
+                            continue
                     
-                    try:
-                        await page.goto(url, wait_until="domcontentloaded", timeout=30000)
-                    except Exception as nav_err:
-                        logging.warning(f"Timeout o errore di navigazione con proxy {proxy_ip}: {nav_err}")
-                        raise nav_err # Solleva l'errore per passare al prossimo proxy
+                    if clicked:
+                        break
+                        
+                    count = 0
+                    while count <= 10:
+                        try:
+                            scroller = page.locator("#jmuse-scroller-component")
+                            await scroller.wait_for(timeout=1000)
+                            logging.info("Scroller trovato.")
+                            laoded = True
+                        except Exception:
+                            logging.error(f"Scroller non trovato con proxy {proxy_ip}. Il sito potrebbe aver bloccato l'IP o la struttura è cambiata.")
+                            raise Exception("Scroller non trovato")
+                        count += 1
+                
+                try:
+                    await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+                except Exception as nav_err:
+                    logging.warning(f"Timeout o errore di navigazione con proxy {proxy_ip}: {nav_err}")
+                    raise nav_err # Solleva l'errore per passare al prossimo proxy
 
 
-                    # --- Gestione Cookie ---
-                    try:
-                        accept_btn = page.locator("#accept-btn")
-                        await accept_btn.click(timeout=8000)
-                        logging.info("Cookie accettati.")
-                    except Exception:
-                        pass # Il banner potrebbe non esserci
+                # --- Gestione Cookie ---
+                try:
+                    accept_btn = page.locator("#accept-btn")
+                    await accept_btn.click(timeout=8000)
+                    logging.info("Cookie accettati.")
+                except Exception:
+                    pass # Il banner potrebbe non esserci
 
-                    # --- Trova lo scroller ---
+                # --- Trova lo scroller ---
+                try:
+                    scroller = page.locator("#jmuse-scroller-component")
+                    await scroller.wait_for(timeout=5000)
+                    logging.info("Scroller trovato.")
+                    
+                    # Click per focus (opzionale)
                     try:
-                        scroller = page.locator("#jmuse-scroller-component")
-                        await scroller.wait_for(timeout=5000)
-                        logging.info("Scroller trovato.")
-                        
-                        # Click per focus (opzionale)
-                        try:
-                            await scroller.click(timeout=2000)
-                        except:
-                            pass
-                    except Exception:
-                        logging.error(f"Scroller non trovato con proxy {proxy_ip}. Il sito potrebbe aver bloccato l'IP o la struttura è cambiata.")
-                        raise Exception("Scroller non trovato")
-
-                    # --- Funzioni Helper Scroll ---
-                    async def get_scroll_state():
-                        return await scroller.evaluate("""el => {
-                            return {
-                                height: el.scrollHeight,
-                                top: el.scrollTop
-                            };
-                        }""")
-
-                    async def do_scroll(pos):
-                        await scroller.evaluate(f"el => el.scrollTop = {pos}")
-                        await asyncio.sleep(0.5) # step_delay ottimizzato
-
-                    async def find_score_imgs():
-                        return await scroller.evaluate("""el => {
-                            const imgs = el.querySelectorAll('img.MHaWn');
-                            const sources = [];
-                            imgs.forEach(im => {
-                                let src = im.src;
-                                if (src) {
-                                    const srcLower = src.toLowerCase();
-                                    if (srcLower.includes(".png?") || srcLower.includes(".png@0?") || 
-                                        srcLower.includes(".svg?") || srcLower.includes(".svg@0?") || 
-                                        srcLower.includes(".jpg?")) {
-                                        let cleanSrc = src.replace("@0", "");
-                                        sources.push(cleanSrc);
-                                    }
+                        await scroller.click(timeout=2000)
+                    except:
+                        pass
+                except Exception:
+                    logging.error(f"Scroller non trovato con proxy {proxy_ip}. Il sito potrebbe aver bloccato l'IP o la struttura è cambiata.")
+                    raise Exception("Scroller non trovato")
+
+                # Tempo fino allo scroller (verifica Cloudflare e seconda navigazione comprese)
+                if self._resource_filter is not None:
+                    self._resource_filter.finish(pooled.route_stats, time.perf_counter() - nav_started)
+
+                # Solo il primo tentativo che arriva allo scroller prosegue
+                if not claim():
+                    raise _HedgeLost()
+
+                # Numero di pagine e URL della prima: lo scroll si ferma appena le pagine sono tutte note
+                meta = await self._score_metadata(page)
+                declared = meta.pages_count
+                logging.info(f"Spartito {meta.score_id or '?'}: pagine dichiarate {declared if declared else 'sconosciute'}, già acquisite: {len(captured)}")
+
+                # --- Acquisizione dalle risposte di rete ---
+                if self.capture_mode == "network":
+                    await self._capture_pages(scroller, captured, page_event, declared)
+                    # Senza numero di pagine non si può sapere se la cattura è completa: decide la scansione
+                    if declared and len(captured) >= declared:
+                        logging.info(f"Acquisite {len(captured)} pagine dalla rete.")
+                        results = await asyncio.gather(*captured.values())
+                        if not all(results):
+                            raise Exception("Conversione incompleta.")
+                        await asyncio.to_thread(self._page_cache.save_manifest, url, spool.sources())
+                        await self._record_proxy_outcome(proxy_info, None, nav_latency)
+                        return spool
+
+                    # Pagine mancanti: si completa con la scansione, riusando quelle già acquisite
+                    logging.warning(f"Acquisite {len(captured)}/{declared or '?'} pagine dalla rete, completamento con la scansione.")
+
+                # --- Funzioni Helper Scroll ---
+                async def get_scroll_state():
+                    return await scroller.evaluate("""el => {
+                        return {
+                            height: el.scrollHeight,
+                            top: el.scrollTop
+                        };
+                    }""")
+
+                async def do_scroll(pos):
+                    await scroller.evaluate(f"el => el.scrollTop = {pos}")
+                    await asyncio.sleep(0.5) # step_delay ottimizzato
+
+                async def find_score_imgs():
+                    return await scroller.evaluate("""el => {
+                        const imgs = el.querySelectorAll('img.MHaWn');
+                        const sources = [];
+                        imgs.forEach(im => {
+                            let src = im.src;
+                            if (src) {
+                                const srcLower = src.toLowerCase();
+                                if (srcLower.includes(".png?") || srcLower.includes(".png@0?") || 
+                                    srcLower.includes(".svg?") || srcLower.includes(".svg@0?") || 
+                                    srcLower.includes(".jpg?")) {
+                                    let cleanSrc = src.replace("@0", "");
+                                    sources.push(cleanSrc);
                                 }
-                            });
-                            return sources;
-                        }""")
-
-                    # --- Ciclo di Scrolling ---
+                            }
+                        });
+                        return sources;
+                    }""")
+
+                # --- Ciclo di Scrolling ---
+                # Ogni URL scoperto entra subito nella coda: download e conversione procedono durante lo scroll
+                # e l'ordine delle pagine viene ricostruito dallo spool al momento dell'unione
+                found: Dict[int, str] = {}          # indice pagina -> URL
+                unindexed: List[str] = []           # immagini senza indice nel nome
+                synthesized: Dict[int, str] = {}    # URL costruiti dal modello delle pagine note
+                results: Dict[int, bool] = {}       # indice pagina -> esito di download e conversione
+                queued = set()
+                queue: asyncio.Queue = asyncio.Queue()
+
+                user_agent = await page.evaluate("navigator.userAgent")
+
+                async def get_page(index: int, src: str) -> bool:
+                    # Le pagine già acquisite dalla rete non vengono riscaricate
+                    if index in captured:
+                        return await captured[index]
+                    # Un URL costruito sbagliato non merita il tab (fino a 25s): lo corregge la scansione
+                    tab_fallback = synthesized.get(index) != src
+                    return await self.download_FromMuseScore(context, browser, src, spool=spool, score_num=index, scale=scale, sharpen_count=sharpen_count, proxy=pooled.proxy, user_agent=user_agent, referer=url, tab_fallback=tab_fallback)
+
+                async def page_worker():
+                    while True:
+                        index, src = await queue.get()
+                        try:
+                            results[index] = await get_page(index, src)
+                        except Exception as e:
+                            logging.error(f"Pagina {index} non scaricata: {e}")
+                            results[index] = False
+                        finally:
+                            queue.task_done()
+
+                def enqueue(index: int, src: str):
+                    if index not in queued:
+                        queued.add(index)
+                        queue.put_nowait((index, src))
+
+                def collect(sources):
+                    for src in sources:
+                        index = self._score_page_index(src)
+                        if index is None:
+                            if src not in unindexed:
+                                unindexed.append(src)
+                        elif index not in found:
+                            found[index] = src
+                            enqueue(index, src)
+
+                def all_known() -> bool:
+                    return bool(declared) and len(found.keys() | captured.keys()) >= declared
+
+                async def scan(synthesize: bool):
+                    """Scorre finché tutte le pagine sono note (o costruibili), in fondo o bloccato."""
                     state = await get_scroll_state()
                     total_height = state['height']
                     cur_top = state['top']
@@ -413,9 +717,20 @@ class MuseScoreScraper:
                         await do_scroll(cur_top)
                         
                         # Raccogli immagini
-                        score_imgs = await find_score_imgs()
-                        for src in score_imgs:
-                            imgs_urls.add(src)
+                        collect(await find_score_imgs())
+
+                        if all_known():
+                            logging.info(f"Tutte le {declared} pagine individuate dopo {iteration} passi di scroll.")
+                            return
+
+                        if synthesize:
+                            guessed = synthesize_page_urls(found, declared, skip=captured.keys())
+                            if guessed:
+                                logging.info(f"URL delle pagine prevedibili: {len(guessed)} pagine costruite dopo {iteration} passi di scroll.")
+                                synthesized.update(guessed)
+                                for index, src in guessed.items():
+                                    enqueue(index, src)
+                                return
                         
                         # Controllo aggiornamento altezza e blocco
                         new_state = await get_scroll_state()
@@ -435,53 +750,79 @@ class MuseScoreScraper:
 
                     # Scroll finale e raccolta ultima parte
                     await do_scroll(total_height)
-                    final_imgs = await find_score_imgs()
-                    for src in final_imgs:
-                        imgs_urls.add(src)
+                    collect(await find_score_imgs())
 
-                    # --- Download ---
-                    imgs_urls_list = list(imgs_urls)
-                    logging.info(f"Trovate {len(imgs_urls_list)} immagini con questo proxy.")
+                workers = [asyncio.ensure_future(page_worker()) for _ in range(PAGE_DOWNLOAD_WORKERS)]
+                try:
+                    if meta.first_page_url:
+                        collect([meta.first_page_url.replace("@0", "")])
+
+                    await scan(synthesize=True)
+                    await queue.join()
+
+                    wrong = [index for index in synthesized if not results.get(index)]
+                    if wrong:
+                        # Modello sbagliato: gli URL reali delle pagine mancanti vengono dalla scansione
+                        logging.warning(f"{len(wrong)} URL costruiti non validi, riprendo la scansione.")
+                        for index in wrong:
+                            queued.discard(index)
+                            results.pop(index, None)
+                        await scan(synthesize=False)
+                        for index in wrong:
+                            if index not in queued:
+                                # Pagina mai comparsa nello scroller: lo spartito resterebbe incompleto
+                                results[index] = False
+
+                    # Immagini senza indice nel nome: in coda dopo tutte le pagine numerate, così
+                    # non prendono l'indice (nello spool) di una pagina reale
+                    if unindexed:
+                        imgs_urls_list = list(unindexed)
+                        try:
+                            imgs_urls_list.sort(key=lambda x: int(''.join(filter(str.isdigit, x.split('/')[-1])) or 0))
+                        except Exception:
+                            pass
+                        first = max(found.keys() | captured.keys() | synthesized.keys(), default=-1) + 1
+                        for i, src in enumerate(imgs_urls_list):
+                            enqueue(first + i, src)
 
-                    if not imgs_urls_list:
-                        raise Exception("Nessuna immagine trovata nella pagina.")
+                    await queue.join()
+                finally:
+                    for worker in workers:
+                        worker.cancel()
 
-                    try:
-                        imgs_urls_list.sort(key=lambda x: int(''.join(filter(str.isdigit, x.split('/')[-1])) or 0))
-                    except Exception:
-                        pass
+                logging.info(f"Trovate {len(queued)} immagini con questo proxy.")
 
-                    # Esecuzione download in parallelo
-                    pages = [self.download_FromMuseScore(context, browser, url, save_name=save_name, score_num=i, scale=scale, sharpen_count=sharpen_count) for i, url in enumerate(imgs_urls_list)]
-                    results_paths = await asyncio.gather(*pages)
-                    
-                    downlaod_statuses = [res[0] for res in results_paths]
-                    downloaded_files = [res[1] for res in results_paths]
-
-                    # Verifica download
-                    if not all(downlaod_statuses):
-                        logging.warning("Alcuni download sono falliti con questo proxy.")
-                        # Pulizia file parziali
-                        for idx, status in enumerate(downlaod_statuses):
-                            if status and downloaded_files[idx] and os.path.exists(downloaded_files[idx]):
-                                try:
-                                    os.remove(downloaded_files[idx])
-                                except:
-                                    pass
-                        raise Exception("Download incompleto.")
-                    
-                    # Se tutto ha successo, chiudi il browser e ritorna i risultati
-                    await browser.close()
-                    return [f for f in downloaded_files if f is not None]
-
-            except Exception as e:
-                logging.error(f"Proxy {proxy_ip} fallito: {e}")
-                last_exception = e
-                # Il ciclo continua al prossimo proxy
-        
-        # Se il ciclo finisce senza ritornare nulla, tutti i proxy sono falliti
-        logging.error("Tutti i proxy disponibili hanno fallito.")
-        raise Exception(f"Impossibile completare lo scraping. Ultimo errore: {last_exception}")
+                if not queued and not captured:
+                    raise Exception("Nessuna immagine trovata nella pagina.")
+
+                # Pagine arrivate dalla rete ma non (ancora) visibili nello scroller
+                extra = await asyncio.gather(*(future for index, future in captured.items() if index not in queued))
+                downlaod_statuses = list(results.values()) + list(extra)
+
+                # Verifica download
+                if not all(downlaod_statuses):
+                    logging.warning("Alcuni download sono falliti con questo proxy.")
+                    raise Exception("Download incompleto.")
+                
+                # Se tutto ha successo il contesto torna al pool e ritorna le pagine
+                await asyncio.to_thread(self._page_cache.save_manifest, url, spool.sources())
+                await self._record_proxy_outcome(proxy_info, None, nav_latency)
+                return spool
+
+        except (asyncio.CancelledError, _HedgeLost):
+            # Un altro tentativo ha vinto: nessuna penalità per il proxy
+            for future in captured.values():
+                future.cancel()
+            spool.close()
+            raise
+        except Exception as e:
+            # Le pagine parziali restano solo in memoria (o nel file temporaneo dello spool)
+            for future in captured.values():
+                future.cancel()
+            spool.close()
+            await self._record_proxy_outcome(proxy_info, self._classify_failure(e), nav_latency)
+            logging.error(f"Proxy {proxy_ip} fallito: {e}")
+            raise
 
         
 
@@ -495,6 +836,6 @@ if __name__ == "__main__":
     
     # Nota: Con Playwright non serve specificare automatic version download
     s = MuseScoreScraper(headless=False, use_remote=False)
-    urls = s.scrape_musescore(test_url, task_id)
+    ok, path = s.scrape_musicSheet(test_url, task_id)
     
-    print(f"Trovate {len(urls)} URL.")
\ No newline at end of file
+    print(f"Risultato: {ok}, {path}")
\ No newline at end of file
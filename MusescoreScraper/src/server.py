@@ -1,3 +1,4 @@
+import asyncio
 import json
 import queue
 import re
@@ -14,6 +15,8 @@ import threading
 from scraper_laywright import MuseScoreScraper
 from global_vars import *
 from data_manager import DataBaseManager, DownloadStatus, FileRecord, GarbageCollector
+from job_executor import ScrapeJob, ScrapeJobExecutor
+from result_cache import ScoreResultCache
 
 
 # --- Gestione SSE (Server-Sent Events) ---
@@ -61,10 +64,23 @@ class FlaskServer:
         # Stato dei download (in memoria per il tracking immediato)
         self.download_status: Dict[str, Dict] = {}
         
+        # Risultati già pronti e job in corso per (URL, scale, filter)
+        self.cache = ScoreResultCache(self.db_manager)
+        
+        # Job eseguiti sul loop dello scraper, con coda limitata
+        self.executor = ScrapeJobExecutor(
+            runtime=self.scraper.runtime,
+            handler=self._run_job,
+            status_table=self.download_status,
+            on_change=self._broadcast_update
+        )
+        
         """Registra le rotte Flask associandole ai metodi della classe."""
         self.app.add_url_rule('/', 'index', self.index)
         self.app.add_url_rule('/download', 'download', self.download, methods=['POST'])
         self.app.add_url_rule('/status/<task_id>', 'status', self.status)
+        self.app.add_url_rule('/queue', 'queue_status', self.queue_status)
+        self.app.add_url_rule('/cache/stats', 'cache_stats', self.cache_stats)
         self.app.add_url_rule('/download_file/<file_id>', 'download_file', self.download_file)
         self.app.add_url_rule('/records', 'get_database_records', self.get_database_records)
         self.app.add_url_rule('/delete/<file_id>', 'delete_file', self.delete_file, methods=['POST'])
@@ -101,31 +117,69 @@ class FlaskServer:
         urls = [url.strip() for url in re.split(r'\s*,\s*', url) if url.strip()]
         print(f"Richiesta di download ricevuta per URL: {urls} con scale={scale} e sharpen_count={sharpen_count}")
         
-        ids = [str(uuid.uuid4()) for _ in urls]
+        # Richieste già servite o in corso non avviano un nuovo scraping
+        task_ids = []
+        jobs = []
+        for u in urls:
+            job = ScrapeJob(task_id=str(uuid.uuid4()), url=u, scale=scale, sharpen_count=sharpen_count)
+            outcome, value = self.cache.acquire(self._cache_key(job), job.task_id)
+            if outcome in ("hit", "joined"):
+                # Il job che ha prodotto il PDF in cache o quello identico in corso
+                task_ids.append(value)
+            else:
+                task_ids.append(job.task_id)
+                jobs.append(job)
         
-        threads = [threading.Thread(target=self._background_task, args=(url, ids[i], scale, sharpen_count)) for i, url in enumerate(urls)]
+        # Le entry vanno create prima dell'avvio: un job può terminare prima del ritorno di submit()
+        for job in jobs:
+            self.db_manager.insert_file(FileRecord(
+                file_name=job.file_stem,
+                size=0,
+                created_at=datetime.now().isoformat(),
+                scale=float(scale),
+                filter=sharpen_count,
+                source_url=job.url,
+                status=DownloadStatus.PENDING
+            ))
         
-        # Avvia il thread di background passando 'self' per accedere ai metodi e attributi
-        for thread in threads:
-            thread.daemon = True
-            thread.start()
+        if jobs and not self.executor.submit(jobs):
+            for job in jobs:
+                self.cache.release(self._cache_key(job), job.task_id)
+                self.db_manager.remove_file(job.file_stem)
+            response = jsonify({"error": "Troppi download in coda, riprova più tardi"})
+            response.headers["Retry-After"] = str(SCRAPE_QUEUE_RETRY_AFTER_SECONDS)
+            return response, 429
         
         self._broadcast_update()
         
-        return jsonify({"task_ids": ids})
+        return jsonify({"task_ids": task_ids})
 
     def status(self, task_id):
         if task_id in self.download_status:
             return jsonify(self.download_status[task_id])
-        else:
-            return jsonify({"status": "not_found"}), 404
+        
+        # Risultato servito dalla cache: il task_id corrisponde al file esistente
+        record = self.db_manager.get_file(ScrapeJob.pdf_name(task_id))
+        if record is not None and record.status == DownloadStatus.COMPLETED:
+            return jsonify({"task_id": task_id, "status": "completed", "cached": True})
+        return jsonify({"status": "not_found"}), 404
+
+    def queue_status(self):
+        return jsonify(self.executor.stats())
+
+    def cache_stats(self):
+        return jsonify(self.cache.stats())
+
+    @staticmethod
+    def _cache_key(job: ScrapeJob):
+        return ScoreResultCache.make_key(job.url, job.scale, job.sharpen_count)
 
     def download_file(self, file_id):
         try:
-            file_path = os.path.join(self.app.config['UPLOAD_FOLDER'], f"spartito_{file_id}.pdf")
+            file_path = os.path.join(self.app.config['UPLOAD_FOLDER'], ScrapeJob.pdf_name(file_id))
             
             if os.path.exists(file_path):
-                return send_file(file_path, as_attachment=True, download_name=f"spartito_{file_id}.pdf")
+                return send_file(file_path, as_attachment=True, download_name=ScrapeJob.pdf_name(file_id))
             else:
                 logging.warning(f"Tentativo di download per un file non esistente: {file_path}")
                 return jsonify({"error": "File non trovato"}), 404
@@ -192,7 +246,7 @@ class FlaskServer:
 
     def delete_file(self, file_id) -> Tuple[Response, int]:
         """Elimina un file dal database e dal filesystem."""
-        file_name = f"spartito_{file_id}.pdf"
+        file_name = ScrapeJob.pdf_name(file_id)
         
         logging.info(f"Richiesta di eliminazione per file: {file_name}")
         
@@ -222,26 +276,20 @@ class FlaskServer:
 
     # --- Logica Background ---
 
-    def _background_task(self, url: str, task_id: str, scale: float, sharpen_count: int):
-        """Metodo eseguito nel thread separato per elaborare il download."""
+    async def _run_job(self, job: ScrapeJob):
+        """
+        Elabora un download; eseguito dall'executor sul loop dello scraper.
+        Le chiamate sqlite sono sincrone e vanno in un thread per non fermare il loop.
+        """
         
-        file_name = f"spartito_{task_id}"
+        file_name = job.file_stem
+        result_file = None
         
         try:
-            #realizzo la entry nel database
-            record = FileRecord(
-                file_name=file_name,
-                size=0,  # Sarà aggiornato dopo la creazione del file
-                created_at=datetime.now().isoformat(),
-                scale=float(scale), # Cast a int come definito nella dataclass
-                filter=sharpen_count,
-                source_url=url,
-                status=DownloadStatus.PROCESSING
-            )
+            await asyncio.to_thread(self.db_manager.update_status, file_name, DownloadStatus.PROCESSING)
+            await asyncio.to_thread(self._broadcast_update)
             
-            
-            self.db_manager.insert_file(record)
-            result, file = self.scraper.scrape_musicSheet(url,file_name, scale=int(scale), sharpen_count=sharpen_count)
+            result, file = await self.scraper.scrape_musicSheet_async(job.url, file_name, scale=int(job.scale), sharpen_count=job.sharpen_count)
             
             if not result:
                 raise Exception("Scraping fallito: nessun file generato.")
@@ -250,19 +298,26 @@ class FlaskServer:
             if not (file and os.path.exists(file)):
                 raise Exception("File generato non trovato dopo lo scraping.")    
             
-            record.file_name = file_name + ".pdf"
-            record.size = os.path.getsize(file)
-            record.status = DownloadStatus.COMPLETED
-            self.db_manager.remove_file(file_name)  # Rimuove la vecchia entry se esiste
-            self.db_manager.insert_file(record)
-
+            record = FileRecord(
+                file_name=ScrapeJob.pdf_name(job.task_id),
+                size=os.path.getsize(file),
+                created_at=datetime.now().isoformat(),
+                scale=float(job.scale),
+                filter=job.sharpen_count,
+                source_url=job.url,
+                status=DownloadStatus.COMPLETED
+            )
+            await asyncio.to_thread(self.db_manager.remove_file, file_name)  # Rimuove la vecchia entry se esiste
+            await asyncio.to_thread(self.db_manager.insert_file, record)
+            result_file = record.file_name
               
         except Exception as e:
-            logging.error(f"Errore nel task background: {str(e)}", exc_info=True)
-            self.db_manager.update_status(file_name, DownloadStatus.ERROR)
-            
+            logging.error(f"Errore nel job {job.task_id}: {str(e)}", exc_info=True)
+            await asyncio.to_thread(self.db_manager.update_status, file_name, DownloadStatus.ERROR)
+            raise
+        
         finally:
-            self._broadcast_update()
+            self.cache.release(self._cache_key(job), job.task_id, result_file)
             
            
     def run(self):
@@ -0,0 +1,36 @@
+import io
+import unittest
+
+try:
+    from PIL import Image
+    from page_converter import render_page
+except ImportError:
+    render_page = None
+
+
+@unittest.skipIf(render_page is None, "dipendenze della conversione non installate")
+class TestPageConverter(unittest.TestCase):
+
+    @staticmethod
+    def _png(mode: str) -> bytes:
+        out = io.BytesIO()
+        Image.new(mode, (40, 60), (255, 255, 255, 128) if mode == "RGBA" else (255, 255, 255)).save(out, "PNG")
+        return out.getvalue()
+
+    def test_1_lossless_rgba_png(self):
+        print("--- Test 1: PNG con canale alpha senza ricodifica richiesta ---")
+        pdf = render_page(self._png("RGBA"), "png", scale=1, sharpen_count=0)
+        self.assertIsNotNone(pdf)
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        print(" OK: PDF generato con la conversione PIL.")
+
+    def test_2_resized_png(self):
+        print("--- Test 2: PNG ridimensionato e con sharpen ---")
+        pdf = render_page(self._png("RGB"), "png", scale=2, sharpen_count=1)
+        self.assertIsNotNone(pdf)
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        print(" OK: PDF generato.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+
+from global_vars import *
+from proxy_pool import ProxyFailure, ProxyPool
+
+
+def _proxy(n: int, latency: float = None) -> dict:
+    proxy = {"ip": f"10.0.0.{n}", "port": "8080"}
+    if latency is not None:
+        proxy["latency"] = latency
+    return proxy
+
+
+class TestProxyPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ProxyPool(ewma_alpha=0.5, quarantine_base_s=10, quarantine_max_s=60)
+
+    def test_1_rank_by_success_and_latency(self):
+        print("--- Test 1: Ordinamento per successo e latenza ---")
+        fast, slow, unknown = _proxy(1), _proxy(2), _proxy(3, latency=20.0)
+        self.pool.record_success(fast, 0.5)
+        self.pool.record_success(slow, 4.0)
+
+        # Un proxy presente due volte (HTTP e HTTPS) viene proposto una sola volta
+        ranked = self.pool.rank([unknown, slow, fast, dict(fast)])
+        self.assertEqual([self.pool.key(p) for p in ranked], [self.pool.key(p) for p in (fast, slow, unknown)])
+        print(" OK: Proxy veloci e affidabili in testa, nessun duplicato.")
+
+    def test_2_quarantine_excludes_failed_proxy(self):
+        print("--- Test 2: Quarantena dopo un fallimento ---")
+        good, bad = _proxy(1), _proxy(2)
+        with mock.patch("proxy_pool.time.time", return_value=1000.0):
+            self.pool.record_failure(bad, ProxyFailure.CONNECTION)
+            self.assertEqual(self.pool.rank([good, bad]), [good])
+            self.assertEqual(self.pool.summary(), {"known": 2, "quarantined": 1})
+
+        # Scaduta la quarantena il proxy torna tra i candidati
+        with mock.patch("proxy_pool.time.time", return_value=1011.0):
+            self.assertEqual(len(self.pool.rank([good, bad])), 2)
+        print(" OK: Proxy in quarantena esclusi fino alla scadenza.")
+
+    def test_3_all_quarantined_fallback(self):
+        print("--- Test 3: Tutti i proxy in quarantena ---")
+        proxies = [_proxy(n) for n in range(PROXY_QUARANTINE_FALLBACK + 2)]
+        with mock.patch("proxy_pool.time.time", return_value=1000.0):
+            # Più fallimenti = quarantena più lunga: l'ultimo proxy scade per primo
+            for failures, proxy in enumerate(reversed(proxies), start=1):
+                for _ in range(failures):
+                    self.pool.record_failure(proxy, ProxyFailure.NAVIGATION_TIMEOUT)
+            ranked = self.pool.rank(proxies)
+
+        self.assertEqual(len(ranked), PROXY_QUARANTINE_FALLBACK)
+        self.assertEqual(ranked[0], proxies[-1])
+        print(" OK: Proposti i proxy con la quarantena più vicina alla fine.")
+
+    def test_4_exponential_backoff_capped(self):
+        print("--- Test 4: Backoff esponenziale con limite ---")
+        proxy = _proxy(1)
+        key = self.pool.key(proxy)
+        durations = []
+        with mock.patch("proxy_pool.time.time", return_value=1000.0):
+            for _ in range(5):
+                self.pool.record_failure(proxy, ProxyFailure.CLOUDFLARE)
+                durations.append(self.pool.to_dict()[key]["quarantined_until"] - 1000.0)
+            self.assertEqual(durations, [10, 20, 40, 60, 60])
+
+            # Un successo azzera fallimenti consecutivi e quarantena
+            self.pool.record_success(proxy, 1.0)
+            stats = self.pool.to_dict()[key]
+            self.assertEqual(stats["consecutive_failures"], 0)
+            self.assertEqual(stats["quarantined_until"], 0.0)
+            self.assertEqual(stats["failures"], {ProxyFailure.CLOUDFLARE: 5})
+        print(" OK: Quarantena raddoppiata a ogni fallimento fino al massimo.")
+
+    def test_5_latency_ewma_and_percentile(self):
+        print("--- Test 5: Latenza EWMA e percentili ---")
+        self.assertIsNone(self.pool.latency_percentile(0.75))
+
+        self.pool.record_success(_proxy(1), 2.0)
+        self.pool.record_success(_proxy(1), 4.0)
+        self.assertEqual(self.pool.to_dict()[self.pool.key(_proxy(1))]["latency_ewma"], 3.0)
+
+        for n, latency in ((2, 1.0), (3, 5.0), (4, 7.0)):
+            self.pool.record_success(_proxy(n), latency)
+        self.assertEqual(self.pool.latency_percentile(0.0), 1.0)
+        self.assertEqual(self.pool.latency_percentile(0.5), 5.0)
+        self.assertEqual(self.pool.latency_percentile(1.0), 7.0)
+        print(" OK: Media mobile e percentili delle latenze misurate.")
+
+    def test_6_persistence_round_trip(self):
+        print("--- Test 6: Salvataggio e caricamento delle statistiche ---")
+        self.pool.record_success(_proxy(1), 1.5)
+        self.pool.record_failure(_proxy(2), ProxyFailure.IMAGES)
+
+        restored = ProxyPool()
+        restored.load({**self.pool.to_dict(), "broken": {"unknown_field": 1}})
+        self.assertEqual(restored.to_dict(), self.pool.to_dict())
+        print(" OK: Statistiche ripristinate, voci non valide ignorate.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from data_manager import DataBaseManager, DownloadStatus, FileRecord
+from job_executor import ScrapeJob
+from result_cache import ScoreResultCache
+
+
+URL = "https://musescore.com/user/1/scores/999"
+
+
+class TestScoreResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.download_dir = tempfile.mkdtemp()
+        self.db_manager = DataBaseManager(os.path.join(self.download_dir, "test_cache.db"))
+
+    def tearDown(self):
+        self.db_manager.close()
+        shutil.rmtree(self.download_dir, ignore_errors=True)
+
+    def _completed(self, file_name: str, url: str = URL):
+        open(os.path.join(self.download_dir, file_name), "wb").close()
+        self.db_manager.insert_file(FileRecord(
+            file_name=file_name, size=1, created_at="now", scale=2.0, filter=1,
+            source_url=url, status=DownloadStatus.COMPLETED
+        ))
+
+    def test_1_file_names(self):
+        print("--- Test 1: Nome dei file dei job ---")
+        job = ScrapeJob(task_id="abc-123", url=URL)
+        self.assertEqual(ScrapeJob.task_id_from_file(ScrapeJob.pdf_name(job.task_id)), "abc-123")
+        self.assertEqual(ScrapeJob.pdf_name(job.task_id), job.file_stem + ".pdf")
+        self.assertIsNone(ScrapeJob.task_id_from_file(job.file_stem))
+        self.assertIsNone(ScrapeJob.task_id_from_file("altro_abc.pdf"))
+        print(" OK: task_id ricavato solo dai PDF dei job.")
+
+    def test_2_hit_after_restart(self):
+        print("--- Test 2: Risultato trovato nel database dopo un riavvio ---")
+        self._completed("importato.pdf")
+        self._completed(ScrapeJob.pdf_name("abc-123"))
+        cache = ScoreResultCache(self.db_manager, download_path=self.download_dir)
+
+        key = ScoreResultCache.make_key("https://www.musescore.com/user/1/scores/999/?share=1", 2, 1)
+        self.assertEqual(cache.acquire(key, "nuovo"), ("hit", "abc-123"))
+        print(" OK: Il task_id del job originale viene restituito.")
+
+    def test_3_inflight_and_release(self):
+        print("--- Test 3: Job identici in corso ---")
+        cache = ScoreResultCache(self.db_manager, download_path=self.download_dir)
+        key = ScoreResultCache.make_key(URL, 2, 1)
+
+        self.assertEqual(cache.acquire(key, "primo"), ("miss", None))
+        self.assertEqual(cache.acquire(key, "secondo"), ("joined", "primo"))
+
+        self._completed(ScrapeJob.pdf_name("primo"))
+        cache.release(key, "primo", ScrapeJob.pdf_name("primo"))
+        self.assertEqual(cache.acquire(key, "terzo"), ("hit", "primo"))
+
+        # Il PDF eliminato non viene più servito
+        os.remove(os.path.join(self.download_dir, ScrapeJob.pdf_name("primo")))
+        self.assertEqual(cache.acquire(key, "quarto"), ("miss", None))
+        print(" OK: Richieste agganciate al job in corso e poi servite dalla cache.")
+
+
+if __name__ == "__main__":
+    unittest.main()
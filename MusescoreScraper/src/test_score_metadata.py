@@ -0,0 +1,87 @@
+import json
+import unittest
+
+from score_metadata import parse_metadata, page_url_template, synthesize_page_urls
+
+
+BASE = "https://musescore.com/static/musescore/scoredata/g/abc123"
+
+
+def _store(score: dict) -> str:
+    return json.dumps({"store": {"page": {"data": {"score": score}}}})
+
+
+class TestScoreMetadata(unittest.TestCase):
+
+    def test_1_page_url_template(self):
+        print("--- Test 1: Modello degli URL delle pagine ---")
+        self.assertEqual(page_url_template(f"{BASE}/score_3.svg"), f"{BASE}/score_{{}}.svg")
+        self.assertEqual(page_url_template(f"{BASE}/score_0.svg?no-cache=1"), f"{BASE}/score_{{}}.svg?no-cache=1")
+
+        # Il suffisso @0 delle immagini PNG resta nell'URL costruito
+        template = page_url_template(f"{BASE}/score_1.png@0")
+        self.assertEqual(template, f"{BASE}/score_{{}}.png@0")
+        self.assertEqual(template.format(4), f"{BASE}/score_4.png@0")
+
+        # Le graffe già presenti nell'URL non vengono interpretate da format()
+        self.assertEqual(page_url_template("https://cdn.example/{x}/score_2.svg").format(7), "https://cdn.example/{x}/score_7.svg")
+
+        self.assertIsNone(page_url_template(f"{BASE}/thumb.png"))
+        print(" OK: Indice sostituito, suffisso e query preservati.")
+
+    def test_2_signed_urls_not_synthesized(self):
+        print("--- Test 2: URL firmati ---")
+        signed = {
+            0: f"{BASE}/score_0.svg?X-Amz-Signature=aaa&X-Amz-Expires=300",
+            1: f"{BASE}/score_1.svg?X-Amz-Signature=bbb&X-Amz-Expires=300",
+        }
+        self.assertIsNone(page_url_template(signed[0]))
+        self.assertIsNone(page_url_template("https://s3.example/score_0.png@0?Expires=1&Signature=x&Key-Pair-Id=y"))
+        self.assertEqual(synthesize_page_urls(signed, 5), {})
+        print(" OK: Nessun URL costruito da URL firmati.")
+
+    def test_3_synthesize_requires_two_matching_pages(self):
+        print("--- Test 3: Pagine costruite dalle pagine note ---")
+        known = {0: f"{BASE}/score_0.svg", 2: f"{BASE}/score_2.svg"}
+        self.assertEqual(
+            synthesize_page_urls(known, 5, skip=[3]),
+            {1: f"{BASE}/score_1.svg", 4: f"{BASE}/score_4.svg"}
+        )
+
+        # Una sola pagina nota non conferma il modello
+        self.assertEqual(synthesize_page_urls({0: f"{BASE}/score_0.svg"}, 5), {})
+        # Pagine note con modelli diversi
+        self.assertEqual(synthesize_page_urls({0: f"{BASE}/score_0.svg", 1: f"{BASE}/score_1.png@0"}, 5), {})
+        # Numero di pagine sconosciuto
+        self.assertEqual(synthesize_page_urls(known, None), {})
+        print(" OK: Modello usato solo se confermato e con numero di pagine noto.")
+
+    def test_4_parse_metadata(self):
+        print("--- Test 4: Metadati dalla pagina ---")
+        meta = parse_metadata({
+            "store": _store({"id": 12345, "pages_count": 4}),
+            "og_url": "https://musescore.com/user/1/scores/999",
+            "first_img": f"{BASE}/score_0.svg?no-cache=1",
+        })
+        self.assertEqual((meta.score_id, meta.pages_count), ("12345", 4))
+        self.assertEqual(meta.first_page_url, f"{BASE}/score_0.svg?no-cache=1")
+
+        # Senza pages_count il numero di pagine resta sconosciuto, l'id viene da og:url
+        meta = parse_metadata({
+            "store": _store({"title": "Senza pagine"}),
+            "og_url": "https://musescore.com/user/1/scores/999",
+            "first_img": "https://musescore.com/static/logo.png",
+            "og_image": f"{BASE}/score_0.png@0",
+        })
+        self.assertEqual(meta.score_id, "999")
+        self.assertIsNone(meta.pages_count)
+        self.assertEqual(meta.first_page_url, f"{BASE}/score_0.png@0")
+
+        # Stato JSON non valido o assente
+        meta = parse_metadata({"store": "{non json", "og_url": None})
+        self.assertEqual((meta.score_id, meta.pages_count, meta.first_page_url), (None, None, None))
+        print(" OK: Id, numero di pagine e prima pagina letti con i fallback.")
+
+
+if __name__ == "__main__":
+    unittest.main()
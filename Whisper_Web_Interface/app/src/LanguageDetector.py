@@ -0,0 +1,85 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+import librosa
+from faster_whisper import WhisperModel
+
+from Setting import *
+from ModelStore import ModelStore
+from data.database import DatabaseManager
+
+
+@dataclass
+class DetectedLanguage:
+    language: str
+    probability: float
+    cached: bool = False
+
+
+class LanguageDetector:
+    """
+    Rilevamento veloce della lingua eseguito una sola volta per hash audio.
+    Usa sempre un modello piccolo sui primi secondi di audio, indipendentemente
+    dal modello scelto per la trascrizione, e salva il risultato nel database.
+    """
+
+    def __init__(self, model_store: ModelStore, database: Optional[DatabaseManager] = None, model_name: str = LANGUAGE_DETECTION_MODEL, device: str = "cpu"):
+        self._model_store = model_store
+        self._db = database
+        self._model_name = model_name
+        self._device = device
+        self._lock = threading.Lock()
+        self._model: Optional[WhisperModel] = None
+        self._memory_cache: Dict[str, DetectedLanguage] = {}
+
+    def _get_model(self) -> WhisperModel:
+        if self._model is None:
+            self._model = WhisperModel(
+                model_size_or_path=self._model_store.ensure(self._model_name),
+                device=self._device,
+                compute_type="int8" if self._device == "cpu" else "default",
+                cpu_threads=2
+            )
+        return self._model
+
+    def get_cached(self, audio_hash: str) -> Optional[DetectedLanguage]:
+        if audio_hash in self._memory_cache:
+            return self._memory_cache[audio_hash]
+
+        if self._db is not None:
+            row = self._db.get_cached_language(audio_hash)
+            if row is not None:
+                result = DetectedLanguage(language=row['language'], probability=row['probability'], cached=True)
+                self._memory_cache[audio_hash] = result
+                return result
+        return None
+
+    def detect(self, file_path: str, audio_hash: str) -> Optional[DetectedLanguage]:
+        """Restituisce la lingua del file (dalla cache se già rilevata)."""
+        cached = self.get_cached(audio_hash)
+        if cached is not None:
+            return DetectedLanguage(language=cached.language, probability=cached.probability, cached=True)
+
+        try:
+            # Legge solo i primi secondi: non serve decodificare l'intero file
+            audio, _ = librosa.load(file_path, sr=16000, mono=True, duration=LANGUAGE_DETECTION_SECONDS)
+
+            with self._lock:
+                # La rilevazione della lingua avviene subito, i segmenti restituiti non vengono consumati
+                _, info = self._get_model().transcribe(audio, beam_size=1, without_timestamps=True)
+        except Exception as e:
+            logger.error(f"Errore rilevamento lingua per {file_path}: {e}")
+            return None
+
+        result = DetectedLanguage(language=info.language, probability=float(info.language_probability))
+        self._memory_cache[audio_hash] = result
+        logger.info(f"Lingua rilevata per {audio_hash[:12]}: {result.language} ({result.probability:.2f})")
+
+        if self._db is not None:
+            self._db.save_cached_language(
+                audio_hash, result.language, result.probability, self._model_name,
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            )
+        return result
@@ -0,0 +1,110 @@
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from Setting import *
+
+
+@dataclass
+class Lease:
+    lease_id: str
+    item_id: str
+    worker_id: str
+    expires_at: float
+    stop_requested: bool = False
+    next_segment: int = 0               # indice del prossimo segmento atteso dal worker
+    sink: Optional[Any] = None          # SegmentSink con i segmenti ricevuti
+    closed: bool = False                # completato, fallito o scaduto: il sink non accetta più segmenti
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)   # protegge next_segment, sink e closed
+
+
+class LeaseManager:
+    """
+    Gestisce i lease con cui i worker remoti prendono in carico gli elementi della coda.
+    Un lease scade se il worker non invia heartbeat entro `ttl` secondi, così l'elemento
+    può essere riassegnato.
+    """
+
+    def __init__(self, ttl: float = WORKER_LEASE_TTL_SECONDS):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._leases: Dict[str, Lease] = {}
+        self._last_seen: Dict[str, float] = {}     # worker_id -> ultimo contatto
+
+    def get_ttl(self) -> float:
+        return self._ttl
+
+    def acquire(self, item_id: str, worker_id: str) -> Lease:
+        now = time.time()
+        lease = Lease(lease_id=str(uuid.uuid4()), item_id=item_id, worker_id=worker_id, expires_at=now + self._ttl)
+        with self._lock:
+            self._leases[lease.lease_id] = lease
+            self._last_seen[worker_id] = now
+        return lease
+
+    def touch_worker(self, worker_id: str):
+        """Registra il contatto di un worker anche quando non riceve lavoro."""
+        with self._lock:
+            self._last_seen[worker_id] = time.time()
+
+    def get(self, lease_id: str) -> Optional[Lease]:
+        """Restituisce il lease se ancora valido."""
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None or lease.expires_at < time.time():
+                return None
+            return lease
+
+    def heartbeat(self, lease_id: str) -> Optional[Lease]:
+        """Rinnova il lease. Restituisce None se il lease è sconosciuto o già scaduto."""
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None or lease.expires_at < now:
+                return None
+            lease.expires_at = now + self._ttl
+            self._last_seen[lease.worker_id] = now
+            return lease
+
+    def release(self, lease_id: str) -> Optional[Lease]:
+        with self._lock:
+            return self._leases.pop(lease_id, None)
+
+    def find_by_item(self, item_id: str) -> Optional[Lease]:
+        with self._lock:
+            for lease in self._leases.values():
+                if lease.item_id == item_id:
+                    return lease
+            return None
+
+    def request_stop(self, item_id: str) -> bool:
+        """Chiede al worker che elabora `item_id` di fermarsi (al prossimo heartbeat)."""
+        lease = self.find_by_item(item_id)
+        if lease is None:
+            return False
+        lease.stop_requested = True
+        return True
+
+    def expire(self) -> List[Lease]:
+        """Rimuove e restituisce i lease scaduti."""
+        now = time.time()
+        with self._lock:
+            expired = [l for l in self._leases.values() if l.expires_at < now]
+            for lease in expired:
+                del self._leases[lease.lease_id]
+        return expired
+
+    def active_workers(self, window: Optional[float] = None) -> List[dict]:
+        """Worker visti negli ultimi `window` secondi (di default 3 TTL) con il numero di lease attivi."""
+        window = window if window is not None else 3 * self._ttl
+        now = time.time()
+        with self._lock:
+            busy: Dict[str, int] = {}
+            for lease in self._leases.values():
+                busy[lease.worker_id] = busy.get(lease.worker_id, 0) + 1
+            return [
+                {"worker_id": w, "leases": busy.get(w, 0), "last_seen": round(now - seen, 1)}
+                for w, seen in self._last_seen.items() if now - seen <= window
+            ]
@@ -0,0 +1,293 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from Setting import *
+
+
+class ModelStore:
+    """
+    Gestisce la cache locale dei modelli faster-whisper.
+    I modelli vengono scaricati una sola volta in `models_dir`, verificati con i checksum
+    pubblicati su Hugging Face e caricati sempre da percorso locale.
+    """
+
+    MANIFEST_NAME: Final[str] = "manifest.json"
+
+    def __init__(self, models_dir: str = MODELS_DIR, offline: bool = False):
+        self._models_dir = models_dir
+        self._offline = offline
+        self._lock = threading.Lock()
+        self._model_locks: Dict[str, threading.Lock] = {}
+
+        os.makedirs(self._models_dir, exist_ok=True)
+
+    #===================================================================================#
+    # PERCORSI E MANIFEST                                                               #
+    #===================================================================================#
+
+    def model_path(self, model_name: str) -> str:
+        return os.path.join(self._models_dir, model_name)
+
+    def _manifest_path(self, model_name: str) -> str:
+        return os.path.join(self.model_path(model_name), self.MANIFEST_NAME)
+
+    def _read_manifest(self, model_name: str) -> Optional[dict]:
+        try:
+            with open(self._manifest_path(model_name), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, model_name: str, manifest: dict):
+        tmp_path = self._manifest_path(model_name) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path(model_name))
+
+    def _get_model_lock(self, model_name: str) -> threading.Lock:
+        with self._lock:
+            if model_name not in self._model_locks:
+                self._model_locks[model_name] = threading.Lock()
+            return self._model_locks[model_name]
+
+    def is_available(self, model_name: str) -> bool:
+        """True se il modello è presente localmente con tutti i file elencati nel manifest."""
+        manifest = self._read_manifest(model_name)
+        if manifest is None:
+            return False
+        base = self.model_path(model_name)
+        return all(os.path.isfile(os.path.join(base, name)) for name in manifest.get("files", {}))
+
+    #===================================================================================#
+    # CHECKSUM                                                                          #
+    #===================================================================================#
+
+    @staticmethod
+    def _file_digest(path: str, algorithm: str) -> str:
+        """Calcola sha256 (file LFS) o lo sha1 git-blob (file normali) di un file."""
+        if algorithm == "sha256":
+            h = hashlib.sha256()
+        else:
+            h = hashlib.sha1()
+            h.update(f"blob {os.path.getsize(path)}\0".encode())
+
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def _remote_checksums(repo_id: str) -> Dict[str, dict]:
+        """Legge da Hugging Face i checksum attesi di ogni file del repository."""
+        from huggingface_hub import HfApi
+
+        info = HfApi().model_info(repo_id, files_metadata=True)
+        checksums = {}
+        for sibling in info.siblings or []:
+            lfs = sibling.lfs
+            sha256 = None
+            if lfs is not None:
+                sha256 = lfs.get("sha256") if isinstance(lfs, dict) else getattr(lfs, "sha256", None)
+
+            if sha256:
+                checksums[sibling.rfilename] = {"algorithm": "sha256", "digest": sha256, "size": sibling.size}
+            elif sibling.blob_id:
+                checksums[sibling.rfilename] = {"algorithm": "git-sha1", "digest": sibling.blob_id, "size": sibling.size}
+        return checksums
+
+    def verify(self, model_name: str) -> bool:
+        """Ricalcola i checksum dei file locali e li confronta con il manifest."""
+        manifest = self._read_manifest(model_name)
+        if manifest is None:
+            return False
+
+        base = self.model_path(model_name)
+        for name, expected in manifest.get("files", {}).items():
+            path = os.path.join(base, name)
+            if not os.path.isfile(path):
+                logger.error(f"[ModelStore] {model_name}: file mancante {name}")
+                return False
+            if self._file_digest(path, expected["algorithm"]) != expected["digest"]:
+                logger.error(f"[ModelStore] {model_name}: checksum non valido per {name}")
+                return False
+        return True
+
+    #===================================================================================#
+    # DOWNLOAD                                                                          #
+    #===================================================================================#
+
+    def fetch(self, model_name: str, force: bool = False) -> str:
+        """
+        Scarica il modello nella cartella locale e ne verifica i checksum.
+        Un download interrotto riprende dai file già presenti; `force` riparte da zero.
+        """
+        from huggingface_hub import snapshot_download
+
+        if self._offline:
+            raise RuntimeError(f"Modello '{model_name}' non presente in cache e modalità offline attiva.")
+
+        repo_id = MODEL_REPOSITORIES.get(model_name, model_name)
+        target = self.model_path(model_name)
+
+        if force and os.path.isdir(target):
+            shutil.rmtree(target)
+
+        logger.info(f"[ModelStore] Download di {repo_id} in {target}...")
+        start = time.time()
+        snapshot_download(repo_id, local_dir=target, allow_patterns=MODEL_FILE_PATTERNS)
+
+        expected = self._remote_checksums(repo_id)
+        files = {}
+        for name in os.listdir(target):
+            path = os.path.join(target, name)
+            if not os.path.isfile(path) or name not in expected:
+                continue
+            if self._file_digest(path, expected[name]["algorithm"]) != expected[name]["digest"]:
+                # Solo il file corrotto viene riscaricato al prossimo tentativo
+                os.remove(path)
+                raise RuntimeError(f"Checksum non valido per {repo_id}/{name}")
+            files[name] = expected[name]
+
+        if "model.bin" not in files:
+            raise RuntimeError(f"Il repository {repo_id} non contiene model.bin")
+
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._write_manifest(model_name, {
+            "repo_id": repo_id,
+            "fetched_at": now,
+            "last_used": now,
+            "files": files
+        })
+        logger.info(f"[ModelStore] {model_name} scaricato e verificato in {time.time() - start:.1f}s")
+        return target
+
+    def ensure(self, model_name: str) -> str:
+        """Restituisce il percorso locale del modello, scaricandolo se necessario."""
+        if os.path.isdir(model_name):
+            return model_name
+
+        with self._get_model_lock(model_name):
+            if not self.is_available(model_name):
+                # Nessun force: i file di un download interrotto vengono ripresi
+                self.fetch(model_name)
+
+            manifest = self._read_manifest(model_name)
+            if manifest is not None:
+                manifest["last_used"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._write_manifest(model_name, manifest)
+
+        return self.model_path(model_name)
+
+    def prefetch_all(self, model_names: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """Scarica tutti i modelli richiesti (di default SUPPORTED_MODELS)."""
+        results = {}
+        for name in (model_names or SUPPORTED_MODELS.keys()):
+            try:
+                self.ensure(name)
+                results[name] = True
+            except Exception as e:
+                logger.error(f"[ModelStore] Prefetch di {name} fallito: {e}")
+                results[name] = False
+        return results
+
+    #===================================================================================#
+    # GESTIONE CACHE                                                                    #
+    #===================================================================================#
+
+    def _dir_size(self, path: str) -> int:
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def report(self) -> List[dict]:
+        """Restituisce nome, dimensione e ultimo utilizzo dei modelli presenti in cache."""
+        entries = []
+        for name in sorted(os.listdir(self._models_dir)):
+            path = os.path.join(self._models_dir, name)
+            if not os.path.isdir(path):
+                continue
+            manifest = self._read_manifest(name) or {}
+            entries.append({
+                "name": name,
+                "size": self._dir_size(path),
+                "complete": self.is_available(name),
+                "supported": name in SUPPORTED_MODELS,
+                "last_used": manifest.get("last_used")
+            })
+        return entries
+
+    def prune(self, keep: Iterable[str], unused_days: Optional[float] = None, dry_run: bool = False) -> List[str]:
+        """
+        Rimuove i modelli non elencati in `keep` e, se `unused_days` è indicato,
+        anche quelli non usati da più di `unused_days` giorni.
+        """
+        keep = set(keep)
+        removed = []
+        now = datetime.now()
+
+        for entry in self.report():
+            name = entry["name"]
+            stale = False
+            if unused_days is not None and entry["last_used"]:
+                last_used = datetime.strptime(entry["last_used"], "%Y-%m-%d %H:%M:%S")
+                stale = (now - last_used).total_seconds() > unused_days * 86400
+
+            if name in keep and not stale:
+                continue
+
+            with self._get_model_lock(name):
+                if not dry_run:
+                    shutil.rmtree(os.path.join(self._models_dir, name), ignore_errors=True)
+                removed.append(name)
+                logger.info(f"[ModelStore] Rimosso modello {name} ({entry['size'] / 1024**2:.1f} MB)")
+        return removed
+
+
+def _format_size(size: int) -> str:
+    return f"{size / 1024**2:.1f} MB" if size < 1024**3 else f"{size / 1024**3:.2f} GB"
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Gestione della cache locale dei modelli faster-whisper.")
+    parser.add_argument("command", choices=["report", "prefetch", "verify", "prune"], help="Operazione da eseguire.")
+    parser.add_argument("--dir", type=str, default=MODELS_DIR, help=f"Cartella dei modelli. Default: {MODELS_DIR}")
+    parser.add_argument("--models", nargs="*", default=None, help="Modelli su cui operare. Default: SUPPORTED_MODELS")
+    parser.add_argument("--unused-days", type=float, default=None, help="prune: rimuove anche i modelli non usati da N giorni.")
+    parser.add_argument("--dry-run", action="store_true", help="prune: mostra cosa verrebbe rimosso senza cancellare.")
+    args = parser.parse_args()
+
+    store = ModelStore(models_dir=args.dir)
+    selected = args.models or list(SUPPORTED_MODELS.keys())
+
+    if args.command == "report":
+        entries = store.report()
+        for e in entries:
+            state = "ok" if e["complete"] else "incompleto"
+            flag = "" if e["supported"] else " (non supportato)"
+            print(f"{e['name']:<12} {_format_size(e['size']):>10}  {state:<10} ultimo uso: {e['last_used'] or '-'}{flag}")
+        print(f"Totale: {_format_size(sum(e['size'] for e in entries))} in {args.dir}")
+
+    elif args.command == "prefetch":
+        for name, ok in store.prefetch_all(selected).items():
+            print(f"{name:<12} {'ok' if ok else 'ERRORE'}")
+
+    elif args.command == "verify":
+        for name in selected:
+            print(f"{name:<12} {'ok' if store.verify(name) else 'NON VALIDO'}")
+
+    elif args.command == "prune":
+        removed = store.prune(keep=selected, unused_days=args.unused_days, dry_run=args.dry_run)
+        print(f"{'Da rimuovere' if args.dry_run else 'Rimossi'}: {', '.join(removed) if removed else 'nessuno'}")
@@ -0,0 +1,248 @@
+"""
+Worker remoto di trascrizione.
+
+Prende in carico gli elementi della coda del server tramite lease HTTP, scarica l'audio,
+esegue la trascrizione in locale e invia i segmenti al server man mano che vengono decodificati.
+Se il worker smette di inviare heartbeat il lease scade e il server riassegna l'elemento.
+
+Esempio:
+    python RemoteWorker.py --server http://localhost:12345 --token segreto --processes 2
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+from dataclasses import fields
+from typing import List, Optional
+
+import requests
+
+from Setting import *
+
+
+class LeaseLostError(Exception):
+    """Sollevata quando il server non riconosce più il lease (scaduto o elemento rimosso)."""
+    pass
+
+
+class RemoteWorker:
+
+    SEGMENT_BATCH_SIZE: Final[int] = 20
+    SEGMENT_FLUSH_SECONDS: Final[float] = 1.0
+
+    def __init__(self, server_url: str, worker_id: str, token: str = "", work_dir: str = "worker_tmp", poll_interval: float = 5.0, models: Optional[List[str]] = None, processes: int = 1):
+        from Transcriber import Transcriber
+        from ThreadTuner import ThreadTuner
+
+        self._server_url = server_url.rstrip("/")
+        self._worker_id = worker_id
+        self._work_dir = work_dir
+        self._poll_interval = poll_interval
+        self._models = models
+        self._session = requests.Session()
+        if token:
+            self._session.headers["X-Worker-Token"] = token
+
+        # I core della macchina sono divisi tra i processi worker avviati insieme
+        self._transcriber = Transcriber(
+            workers=FIXED_NUM_WORKERS,
+            cpu_threads=FIXED_CPU_THREADS,
+            thread_tuner=ThreadTuner(processes=processes) if THREAD_TUNING == "auto" else None
+        )
+        self._lock = threading.Lock()
+        self._pending: List[dict] = []      # segmenti non ancora confermati dal server
+        self._next_index: int = 0           # indice del primo segmento in _pending
+        self._last_flush: float = 0.0
+        self._progress: int = 0
+        self._stop = threading.Event()
+
+        os.makedirs(self._work_dir, exist_ok=True)
+
+    def _url(self, path: str) -> str:
+        return f"{self._server_url}{path}"
+
+    #===================================================================================#
+    # PROTOCOLLO                                                                        #
+    #===================================================================================#
+
+    def _lease(self) -> Optional[dict]:
+        r = self._session.post(self._url("/worker/lease"), json={"worker_id": self._worker_id, "models": self._models}, timeout=30)
+        if r.status_code == 204:
+            return None
+        r.raise_for_status()
+        return r.json()
+
+    def _download_audio(self, lease_id: str, filename: str) -> str:
+        path = os.path.join(self._work_dir, f"{lease_id}{os.path.splitext(filename)[1]}")
+        with self._session.get(self._url(f"/worker/lease/{lease_id}/audio"), stream=True, timeout=60) as r:
+            if r.status_code == 410:
+                raise LeaseLostError(lease_id)
+            r.raise_for_status()
+            with open(path, "wb") as f:
+                shutil.copyfileobj(r.raw, f, length=1024 * 1024)
+        return path
+
+    def _heartbeat_loop(self, lease_id: str, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                r = self._session.post(self._url(f"/worker/lease/{lease_id}/heartbeat"), timeout=10)
+                if r.status_code == 410 or r.json().get("stop"):
+                    logger.info(f"[{self._worker_id}] Stop richiesto dal server per il lease {lease_id}")
+                    self._transcriber.stop_transcription()
+                    return
+            except requests.RequestException as e:
+                # Un heartbeat perso non è fatale: il lease scade solo dopo l'intero ttl
+                logger.warning(f"[{self._worker_id}] Heartbeat fallito: {e}")
+
+    def _flush_segments(self, lease_id: str, force: bool = False):
+        """Invia i segmenti non confermati; il server ignora quelli già ricevuti."""
+        with self._lock:
+            if not self._pending and not force:
+                return
+            batch = list(self._pending)
+            start_index = self._next_index
+            progress = self._progress
+            self._last_flush = time.time()
+
+        try:
+            r = self._session.post(
+                self._url(f"/worker/lease/{lease_id}/segments"),
+                json={"start_index": start_index, "progress": progress, "segments": batch},
+                timeout=30
+            )
+        except requests.RequestException as e:
+            # I segmenti restano in _pending e verranno reinviati al prossimo flush
+            logger.warning(f"[{self._worker_id}] Invio segmenti fallito: {e}")
+            return
+
+        if r.status_code == 410:
+            self._transcriber.stop_transcription()
+            raise LeaseLostError(lease_id)
+
+        data = r.json()
+        with self._lock:
+            acked = data["next_index"] - self._next_index
+            if acked > 0:
+                del self._pending[:acked]
+                self._next_index = data["next_index"]
+
+        if data.get("stop"):
+            self._transcriber.stop_transcription()
+
+    def _process(self, job: dict):
+        from Transcriber import QueueItem
+
+        lease_id = job["lease_id"]
+        names = {f.name for f in fields(QueueItem)}
+        item = QueueItem(**{k: v for k, v in job["item"].items() if k in names})
+
+        with self._lock:
+            self._pending = []
+            self._next_index = 0
+            self._progress = 0
+            self._last_flush = time.time()
+        self._stop.clear()
+
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(lease_id, max(1.0, job["ttl"] / 3)), daemon=True)
+        heartbeat.start()
+
+        audio_path = None
+        try:
+            audio_path = self._download_audio(lease_id, item.filename)
+            item.file_path = audio_path
+
+            def on_segment(start: float, end: float, text: str):
+                with self._lock:
+                    self._pending.append({"start": start, "end": end, "text": text})
+                    self._progress = item.progress
+                    due = len(self._pending) >= self.SEGMENT_BATCH_SIZE or time.time() - self._last_flush >= self.SEGMENT_FLUSH_SECONDS
+                if due:
+                    self._flush_segments(lease_id)
+
+            logger.info(f"[{self._worker_id}] Trascrizione di {item.filename} (lease {lease_id})")
+            transcription = self._transcriber.transcribe(item, None, on_segment)
+
+            with self._lock:
+                self._progress = 100 if transcription is not None else item.progress
+            self._flush_segments(lease_id, force=True)
+
+            if transcription is None:
+                self._session.post(self._url(f"/worker/lease/{lease_id}/fail"), json={"error": "Errore durante la trascrizione"}, timeout=30)
+            elif self._pending:
+                # Segmenti non confermati: meglio lasciare scadere il lease che salvare un testo incompleto
+                logger.error(f"[{self._worker_id}] Impossibile inviare tutti i segmenti di {lease_id}")
+            elif self._transcriber.getCurrentStatus() != "stopped":
+                self._session.post(
+                    self._url(f"/worker/lease/{lease_id}/complete"),
+                    json={"language": transcription.language, "timing": self._transcriber.last_timing, "segments": self._next_index},
+                    timeout=30
+                )
+
+        except LeaseLostError:
+            logger.warning(f"[{self._worker_id}] Lease {lease_id} perso, elemento abbandonato")
+
+        except Exception as e:
+            logger.error(f"[{self._worker_id}] Errore sul lease {lease_id}: {e}")
+            try:
+                self._session.post(self._url(f"/worker/lease/{lease_id}/fail"), json={"error": str(e)}, timeout=30)
+            except requests.RequestException:
+                pass
+
+        finally:
+            self._stop.set()
+            heartbeat.join(timeout=5)
+            if audio_path and os.path.exists(audio_path):
+                os.remove(audio_path)
+
+    def run(self):
+        logger.info(f"[{self._worker_id}] Worker avviato su {self._server_url}")
+        while True:
+            try:
+                job = self._lease()
+            except requests.RequestException as e:
+                logger.warning(f"[{self._worker_id}] Server non raggiungibile: {e}")
+                job = None
+
+            if job is None:
+                time.sleep(self._poll_interval)
+                continue
+            self._process(job)
+
+
+def _run_worker(server_url: str, worker_id: str, token: str, work_dir: str, poll_interval: float, models: Optional[List[str]], processes: int = 1):
+    RemoteWorker(server_url, worker_id, token, work_dir, poll_interval, models, processes).run()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Worker remoto di trascrizione.")
+    parser.add_argument("--server", type=str, default="http://localhost:12345", help="URL del server.")
+    parser.add_argument("--token", type=str, default=WORKER_TOKEN, help="Token condiviso con il server (WHISPER_WORKER_TOKEN).")
+    parser.add_argument("--worker-id", type=str, default=socket.gethostname(), help="Identificativo del worker.")
+    parser.add_argument("--processes", type=int, default=1, help="Numero di worker da avviare su questa macchina.")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Secondi di attesa quando la coda è vuota.")
+    parser.add_argument("--work-dir", type=str, default="worker_tmp", help="Cartella per i file audio scaricati.")
+    parser.add_argument("--models", nargs="*", default=None, help="Modelli accettati dal worker. Default: tutti.")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _run_worker(args.server, args.worker_id, args.token, args.work_dir, args.poll_interval, args.models)
+    else:
+        # Più processi sulla stessa macchina, utile per provare il protocollo in locale
+        ctx = multiprocessing.get_context("spawn")
+        processes = [
+            ctx.Process(
+                target=_run_worker,
+                args=(args.server, f"{args.worker_id}-{i}", args.token, args.work_dir, args.poll_interval, args.models, args.processes),
+                daemon=True
+            )
+            for i in range(args.processes)
+        ]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
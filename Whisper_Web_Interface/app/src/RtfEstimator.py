@@ -0,0 +1,82 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from Setting import *
+from data.database import DatabaseManager
+
+
+@dataclass
+class RtfStat:
+    rtf: float              # secondi di decodifica per secondo di audio
+    load_seconds: float     # secondi di caricamento del modello
+    samples: int = 0        # numero di job misurati
+
+
+class RtfEstimator:
+    """
+    Mantiene una stima rolling (EWMA) del real-time-factor per ogni combinazione
+    (modello, device, compute_type), aggiornata con i job completati.
+    Le stime sono salvate nel database per sopravvivere ai riavvii.
+    """
+
+    def __init__(self, database: Optional[DatabaseManager] = None, alpha: float = RTF_EWMA_ALPHA):
+        self._db = database
+        self._alpha = alpha
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str, str], RtfStat] = {}
+
+        if self._db is not None:
+            for row in self._db.get_rtf_stats():
+                key = (row['model'], row['device'], row['compute_type'])
+                self._stats[key] = RtfStat(rtf=row['rtf'], load_seconds=row['load_seconds'], samples=row['samples'])
+
+    def _default_stat(self, model_name: str, device: str) -> RtfStat:
+        device_defaults = DEFAULT_RTF.get(device, DEFAULT_RTF["cpu"])
+        rtf = device_defaults.get(model_name, max(device_defaults.values()))
+        return RtfStat(rtf=rtf, load_seconds=DEFAULT_MODEL_LOAD_SECONDS)
+
+    def get(self, model_name: Optional[str], device: str, compute_type: str) -> RtfStat:
+        """Restituisce la stima corrente (o quella di default se non ci sono misure)."""
+        model_name = model_name or "small"
+        with self._lock:
+            stat = self._stats.get((model_name, device, compute_type))
+            if stat is None:
+                return self._default_stat(model_name, device)
+            return RtfStat(rtf=stat.rtf, load_seconds=stat.load_seconds, samples=stat.samples)
+
+    def estimate_work(self, model_name: Optional[str], device: str, compute_type: str, audio_seconds: float) -> float:
+        """Secondi di elaborazione stimati per trascrivere `audio_seconds` di audio."""
+        stat = self.get(model_name, device, compute_type)
+        return stat.load_seconds + stat.rtf * max(0.0, audio_seconds)
+
+    def update(self, model_name: str, device: str, compute_type: str, audio_seconds: float, decode_seconds: float, load_seconds: float) -> Optional[RtfStat]:
+        """Aggiorna la stima con le misure di un job completato."""
+        if audio_seconds <= 0 or decode_seconds <= 0:
+            return None
+
+        measured_rtf = decode_seconds / audio_seconds
+        key = (model_name, device, compute_type)
+
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None or stat.samples == 0:
+                # La prima misura reale sostituisce completamente il default
+                stat = RtfStat(rtf=measured_rtf, load_seconds=load_seconds, samples=1)
+            else:
+                stat = RtfStat(
+                    rtf=self._alpha * measured_rtf + (1 - self._alpha) * stat.rtf,
+                    load_seconds=self._alpha * load_seconds + (1 - self._alpha) * stat.load_seconds,
+                    samples=stat.samples + 1
+                )
+            self._stats[key] = stat
+
+        logger.info(f"RTF aggiornato per {key}: misurato={measured_rtf:.3f}, stima={stat.rtf:.3f} ({stat.samples} job)")
+
+        if self._db is not None:
+            self._db.save_rtf_stat(
+                model_name, device, compute_type, stat.rtf, stat.load_seconds, stat.samples,
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            )
+        return stat
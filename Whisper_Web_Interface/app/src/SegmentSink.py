@@ -0,0 +1,83 @@
+import os
+import uuid
+from typing import List, Optional, Tuple
+
+from Setting import *
+from data.database import DatabaseManager
+
+
+class SegmentSink:
+    """
+    Raccoglie i segmenti di una trascrizione con un buffer limitato.
+    Ogni `batch_size` segmenti le righe formattate vengono scritte su un file temporaneo
+    e i segmenti salvati nel database, così la memoria usata non cresce con la durata dell'audio.
+    Il testo completo viene letto una sola volta, al momento del salvataggio finale.
+    """
+
+    def __init__(self, transcription_id: str, database: Optional[DatabaseManager] = None, batch_size: int = SEGMENT_SINK_BATCH_SIZE, sink_dir: str = SEGMENT_SINK_DIR):
+        self._transcription_id = transcription_id
+        self._db = database
+        self._batch_size = batch_size
+        self._buffer: List[Tuple[float, float, str, str]] = []
+        self._count: int = 0            # segmenti già scritti
+        self._content_bytes: int = 0    # byte UTF-8 del testo già scritto (separatori inclusi)
+        self._error: Optional[str] = None
+
+        os.makedirs(sink_dir, exist_ok=True)
+        self._path = os.path.join(sink_dir, f"{transcription_id}-{uuid.uuid4().hex}.txt")
+        self._file = open(self._path, "w", encoding="utf-8", newline="\n")
+
+    def get_count(self) -> int:
+        return self._count + len(self._buffer)
+
+    def get_content_bytes(self) -> int:
+        return self._content_bytes
+
+    def get_error(self) -> Optional[str]:
+        return self._error
+
+    def add(self, start: float, end: float, text: str, line: str):
+        """Aggiunge un segmento con la sua riga di testo formattata."""
+        self._buffer.append((start, end, text, line))
+        if len(self._buffer) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        for i, (_, _, _, line) in enumerate(self._buffer):
+            data = line if self._count == 0 and i == 0 else "\n" + line
+            self._file.write(data)
+            self._content_bytes += len(data.encode("utf-8"))
+
+        if self._db is not None and self._error is None:
+            if not self._db.add_segments(self._transcription_id, self._count, [(s, e, t) for s, e, t, _ in self._buffer]):
+                self._error = "Salvataggio segmenti fallito"
+
+        self._count += len(self._buffer)
+        self._buffer.clear()
+
+    def read_content(self) -> str:
+        """Chiude il sink e restituisce il testo completo."""
+        self.flush()
+        if not self._file.closed:
+            self._file.close()
+        with open(self._path, "r", encoding="utf-8", newline="\n") as f:
+            return f.read()
+
+    def close(self):
+        """Elimina il file temporaneo (i segmenti nel database restano)."""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+    def discard(self):
+        """Elimina il file temporaneo e i segmenti già salvati (trascrizione non salvata)."""
+        self._buffer.clear()
+        self.close()
+        if self._db is not None and self._count > 0:
+            self._db.delete_segments(self._transcription_id)
@@ -1,6 +1,7 @@
 import logging
 from typing_extensions import Final
 import os
+import tempfile
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -38,4 +39,100 @@ SUPPORTED_MODELS: Final[dict] = {
     "small": "Small (buona accuratezza)",
     "medium": "Medium (molto accurato)",
     "large-v3": "Large-v3 (massima accuratezza)"
-}
\ No newline at end of file
+}
+
+# Admission control: lavoro massimo stimato (secondi di elaborazione) accettato in coda
+MAX_QUEUE_WORK_SECONDS: Final[float] = float(os.environ.get("WHISPER_MAX_QUEUE_WORK_SECONDS", 4 * 3600))
+
+# Peso dell'ultimo job nella media mobile esponenziale del real-time-factor
+RTF_EWMA_ALPHA: Final[float] = 0.3
+
+# Real-time-factor iniziale (secondi di decodifica per secondo di audio) prima di avere misure reali
+DEFAULT_RTF: Final[dict] = {
+    "cpu": {
+        "tiny": 0.08,
+        "base": 0.15,
+        "small": 0.4,
+        "medium": 1.0,
+        "large-v3": 2.0
+    },
+    "cuda": {
+        "tiny": 0.02,
+        "base": 0.03,
+        "small": 0.05,
+        "medium": 0.1,
+        "large-v3": 0.2
+    }
+}
+
+# Tempo iniziale stimato per il caricamento del modello (secondi)
+DEFAULT_MODEL_LOAD_SECONDS: Final[float] = 5.0
+
+# Cartella locale dei modelli faster-whisper (pre-scaricati, utilizzabili offline)
+MODELS_DIR: Final[str] = os.environ.get("WHISPER_MODELS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+
+# Modelli da scaricare all'avvio del server: elenco separato da virgole, "all" per tutti
+# quelli di SUPPORTED_MODELS. Di default nessuno (large-v3 pesa circa 3 GB)
+_PREFETCH_ENV = os.environ.get("WHISPER_PREFETCH_MODELS", "").strip()
+PREFETCH_MODELS: Final[list] = list(SUPPORTED_MODELS.keys()) if _PREFETCH_ENV == "all" else [m.strip() for m in _PREFETCH_ENV.split(",") if m.strip()]
+
+# Repository Hugging Face dei modelli CTranslate2 usati da faster-whisper
+MODEL_REPOSITORIES: Final[dict] = {
+    "tiny": "Systran/faster-whisper-tiny",
+    "base": "Systran/faster-whisper-base",
+    "small": "Systran/faster-whisper-small",
+    "medium": "Systran/faster-whisper-medium",
+    "large-v3": "Systran/faster-whisper-large-v3",
+    "turbo": "mobiuslabsgmbh/faster-whisper-large-v3-turbo"
+}
+
+# File necessari per caricare un modello
+MODEL_FILE_PATTERNS: Final[list] = ["config.json", "preprocessor_config.json", "model.bin", "tokenizer.json", "vocabulary.*"]
+
+# Rilevamento lingua veloce (una volta per hash audio) con un modello piccolo
+LANGUAGE_DETECTION_MODEL: Final[str] = os.environ.get("WHISPER_LANGUAGE_DETECTION_MODEL", "tiny")
+LANGUAGE_DETECTION_SECONDS: Final[float] = 30.0
+# Sotto questa probabilità la lingua non viene imposta al decoder principale
+LANGUAGE_DETECTION_MIN_PROBABILITY: Final[float] = 0.5
+
+# Spool dei file caricati (nomi content-addressed, quota totale e spazio libero minimo)
+SPOOL_DIR: Final[str] = os.environ.get("WHISPER_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "whisper_spool"))
+SPOOL_MAX_BYTES: Final[int] = int(os.environ.get("WHISPER_SPOOL_MAX_BYTES", 10 * 1024**3))
+SPOOL_MIN_FREE_BYTES: Final[int] = int(os.environ.get("WHISPER_SPOOL_MIN_FREE_BYTES", 2 * 1024**3))
+
+# Modalità di servizio: "dev" (server Werkzeug con debugger) o "gevent" (produzione, I/O asincrono)
+SERVE_MODE: Final[str] = os.environ.get("WHISPER_SERVE_MODE", "dev")
+# Connessioni HTTP/WebSocket contemporanee gestite dal server gevent
+SERVER_MAX_CONNECTIONS: Final[int] = int(os.environ.get("WHISPER_SERVER_MAX_CONNECTIONS", 1000))
+# Thread nativi per il lavoro bloccante delle richieste (durata audio, rilevamento lingua)
+BLOCKING_POOL_SIZE: Final[int] = int(os.environ.get("WHISPER_BLOCKING_POOL_SIZE", 4))
+# Parametri Socket.IO
+SOCKETIO_PING_INTERVAL: Final[int] = int(os.environ.get("WHISPER_SOCKETIO_PING_INTERVAL", 25))
+SOCKETIO_PING_TIMEOUT: Final[int] = int(os.environ.get("WHISPER_SOCKETIO_PING_TIMEOUT", 20))
+SOCKETIO_MAX_HTTP_BUFFER_SIZE: Final[int] = int(os.environ.get("WHISPER_SOCKETIO_MAX_HTTP_BUFFER_SIZE", 1024 * 1024))
+
+# Worker remoti: durata di un lease senza heartbeat e token condiviso (vuoto = nessuna autenticazione)
+WORKER_LEASE_TTL_SECONDS: Final[float] = float(os.environ.get("WHISPER_WORKER_LEASE_TTL", 30))
+WORKER_TOKEN: Final[str] = os.environ.get("WHISPER_WORKER_TOKEN", "")
+# Elaborazione nel processo del server (disattivabile quando si usano solo worker remoti)
+LOCAL_WORKER_ENABLED: Final[bool] = os.environ.get("WHISPER_LOCAL_WORKER", "1") == "1"
+
+# Finestra di segmenti restituita da /transcription/<id>/segments
+SEGMENT_WINDOW_DEFAULT: Final[int] = 200
+SEGMENT_WINDOW_MAX: Final[int] = 1000
+
+# Segmenti accumulati in memoria prima di essere scritti su file temporaneo e database
+SEGMENT_SINK_BATCH_SIZE: Final[int] = 100
+SEGMENT_SINK_DIR: Final[str] = os.environ.get("WHISPER_SEGMENT_SINK_DIR", os.path.join(tempfile.gettempdir(), "whisper_segments"))
+
+# Pre-analisi VAD: intervalli di parlato più vicini di questa soglia vengono decodificati insieme
+VAD_CLIP_MERGE_GAP_SECONDS: Final[float] = 2.0
+# Thread dedicati alla pre-analisi VAD dei file in coda
+VAD_WORKERS: Final[int] = int(os.environ.get("WHISPER_VAD_WORKERS", 1))
+
+# Scelta di cpu_threads/num_workers: "auto" (core disponibili e calibrazione) o "fixed" (valori sotto)
+THREAD_TUNING: Final[str] = os.environ.get("WHISPER_THREAD_TUNING", "auto")
+FIXED_CPU_THREADS: Final[int] = int(os.environ.get("WHISPER_CPU_THREADS", 4))
+FIXED_NUM_WORKERS: Final[int] = int(os.environ.get("WHISPER_NUM_WORKERS", 1))
+# Risultato del comando "python benchmark.py calibrate"
+THREAD_CALIBRATION_FILE: Final[str] = os.environ.get("WHISPER_THREAD_CALIBRATION_FILE", os.path.join(MODELS_DIR, "thread_calibration.json"))
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+from Setting import *
+
+
+class SpoolFullError(Exception):
+    """Sollevata quando un upload supera la quota dello spool o lo spazio libero minimo."""
+    pass
+
+
+class SpoolManager:
+    """
+    Gestisce la cartella dei file audio caricati.
+    I file sono salvati con nome content-addressed (sha256 del contenuto), quindi upload
+    identici condividono lo stesso file tramite un contatore di riferimenti.
+    """
+
+    CHUNK_SIZE: Final[int] = 1024 * 1024
+    PART_PREFIX: Final[str] = ".incoming-"
+
+    def __init__(self, spool_dir: str = SPOOL_DIR, max_bytes: int = SPOOL_MAX_BYTES, min_free_bytes: int = SPOOL_MIN_FREE_BYTES):
+        self._spool_dir = spool_dir
+        self._max_bytes = max_bytes
+        self._min_free_bytes = min_free_bytes
+        self._lock = threading.Lock()
+        self._refs: Dict[str, int] = {}     # nome file -> numero di elementi in coda che lo usano
+        self._reserved: int = 0             # byte in scrittura non ancora confermati
+
+        os.makedirs(self._spool_dir, exist_ok=True)
+
+    def get_spool_dir(self) -> str:
+        return self._spool_dir
+
+    #===================================================================================#
+    # QUOTA E SPAZIO LIBERO                                                             #
+    #===================================================================================#
+
+    def _usage_unsafe(self) -> int:
+        total = 0
+        for name in os.listdir(self._spool_dir):
+            # Gli upload in corso sono già conteggiati nella prenotazione
+            if name.startswith(self.PART_PREFIX):
+                continue
+            try:
+                total += os.path.getsize(os.path.join(self._spool_dir, name))
+            except OSError:
+                pass
+        return total
+
+    def usage(self) -> int:
+        """Byte attualmente occupati nello spool."""
+        with self._lock:
+            return self._usage_unsafe()
+
+    def _check_capacity_unsafe(self, incoming_bytes: int) -> Optional[str]:
+        used = self._usage_unsafe() + self._reserved
+        if used + incoming_bytes > self._max_bytes:
+            return f"Quota spool superata: {used / 1024**2:.0f} MB in uso, {incoming_bytes / 1024**2:.0f} MB richiesti, massimo {self._max_bytes / 1024**2:.0f} MB."
+
+        free = shutil.disk_usage(self._spool_dir).free
+        if free - incoming_bytes < self._min_free_bytes:
+            return f"Spazio su disco insufficiente: {free / 1024**2:.0f} MB liberi."
+        return None
+
+    def check_capacity(self, incoming_bytes: int) -> Optional[str]:
+        """Restituisce un messaggio di errore se `incoming_bytes` non possono essere accettati."""
+        with self._lock:
+            return self._check_capacity_unsafe(incoming_bytes)
+
+    #===================================================================================#
+    # SALVATAGGIO E RILASCIO                                                            #
+    #===================================================================================#
+
+    def store(self, stream: BinaryIO, extension: str, expected_size: int = 0) -> Tuple[str, str]:
+        """
+        Salva lo stream nello spool calcolando lo sha256 durante la scrittura.
+        Restituisce (percorso, sha256). Solleva SpoolFullError se la quota viene superata.
+        """
+        reservation = max(0, expected_size)
+        with self._lock:
+            error = self._check_capacity_unsafe(reservation)
+            if error:
+                raise SpoolFullError(error)
+            self._reserved += reservation
+
+        part_path = os.path.join(self._spool_dir, f"{self.PART_PREFIX}{uuid.uuid4().hex}.part")
+        h = hashlib.sha256()
+        written = 0
+
+        try:
+            with open(part_path, "wb") as f:
+                for chunk in iter(lambda: stream.read(self.CHUNK_SIZE), b""):
+                    written += len(chunk)
+                    
+                    # La dimensione dichiarata può essere assente o errata: estendo la prenotazione a blocchi
+                    if written > reservation:
+                        grow = max(written - reservation, 64 * self.CHUNK_SIZE)
+                        with self._lock:
+                            error = self._check_capacity_unsafe(grow)
+                            if error:
+                                raise SpoolFullError(error)
+                            self._reserved += grow
+                        reservation += grow
+                        
+                    h.update(chunk)
+                    f.write(chunk)
+
+            digest = h.hexdigest()
+            name = f"{digest}.{extension.lower().lstrip('.')}"
+            final_path = os.path.join(self._spool_dir, name)
+
+            with self._lock:
+                if os.path.exists(final_path):
+                    # Contenuto già presente: riuso il file esistente
+                    os.remove(part_path)
+                else:
+                    os.replace(part_path, final_path)
+                self._refs[name] = self._refs.get(name, 0) + 1
+                
+        except BaseException:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            raise
+        
+        finally:
+            with self._lock:
+                self._reserved -= reservation
+
+        return final_path, digest
+
+    def release(self, path: str):
+        """Rilascia un riferimento al file e lo elimina quando non è più usato."""
+        name = os.path.basename(path)
+        with self._lock:
+            refs = self._refs.get(name, 0) - 1
+            if refs > 0:
+                self._refs[name] = refs
+                return
+            self._refs.pop(name, None)
+            try:
+                os.remove(os.path.join(self._spool_dir, name))
+            except OSError:
+                pass
+
+    def reconcile(self, active_paths: Iterable[str] = ()) -> int:
+        """
+        Elimina i file orfani (non referenziati da `active_paths`) e gli upload interrotti.
+        Da chiamare all'avvio. Restituisce il numero di file rimossi.
+        """
+        active = {os.path.basename(p) for p in active_paths}
+        removed = 0
+        with self._lock:
+            for name in os.listdir(self._spool_dir):
+                if name in active:
+                    self._refs.setdefault(name, 1)
+                    continue
+                try:
+                    os.remove(os.path.join(self._spool_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"[Spool] Rimossi {removed} file orfani da {self._spool_dir}")
+        return removed
@@ -0,0 +1,126 @@
+import json
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from Setting import *
+
+
+class ThreadTuner:
+    """
+    Sceglie `cpu_threads` e `num_workers` di faster-whisper per ogni job in base ai core
+    disponibili (affinity e quota cgroup), ai processi che condividono la macchina e ai job
+    in esecuzione. Se esiste un file di calibrazione usa i valori misurati per il modello.
+    """
+
+    def __init__(self, calibration_file: str = THREAD_CALIBRATION_FILE, processes: int = 1):
+        self._calibration_file = calibration_file
+        self._processes = max(1, processes)
+        self._lock = threading.Lock()
+        self._active_jobs: int = 0
+        self._calibration: Dict[str, Dict[str, dict]] = self._load_calibration()
+
+    #===================================================================================#
+    # CORE DISPONIBILI                                                                  #
+    #===================================================================================#
+
+    @staticmethod
+    def _cgroup_cpu_limit() -> Optional[float]:
+        """Quota CPU del container (cgroup v2 o v1), None se non limitata."""
+        try:
+            with open("/sys/fs/cgroup/cpu.max", "r") as f:
+                quota, period = f.read().split()
+                if quota != "max":
+                    return int(quota) / int(period)
+                return None
+        except (OSError, ValueError):
+            pass
+
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as f:
+                quota = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as f:
+                period = int(f.read())
+            if quota > 0 and period > 0:
+                return quota / period
+        except (OSError, ValueError):
+            pass
+        return None
+
+    @classmethod
+    def available_cpus(cls) -> int:
+        """Core utilizzabili dal processo: affinity limitata dalla quota cgroup."""
+        try:
+            cpus = len(os.sched_getaffinity(0))
+        except AttributeError:
+            cpus = os.cpu_count() or 1
+
+        quota = cls._cgroup_cpu_limit()
+        if quota is not None:
+            cpus = min(cpus, max(1, math.ceil(quota)))
+        return cpus
+
+    #===================================================================================#
+    # CALIBRAZIONE                                                                      #
+    #===================================================================================#
+
+    def _load_calibration(self) -> Dict[str, Dict[str, dict]]:
+        try:
+            with open(self._calibration_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        # Una calibrazione fatta con un numero di core diverso non è affidabile
+        if data.get("cpus") != self.available_cpus():
+            logger.warning(f"[ThreadTuner] Calibrazione in {self._calibration_file} eseguita con {data.get('cpus')} core, ignorata.")
+            return {}
+        return data.get("models", {})
+
+    def save_calibration(self, results: Dict[str, Dict[str, dict]]):
+        """Salva i migliori parametri misurati per modello e device."""
+        data = {
+            "cpus": self.available_cpus(),
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "models": results
+        }
+        tmp_path = self._calibration_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self._calibration_file)
+        self._calibration = results
+
+    #===================================================================================#
+    # TUNING                                                                            #
+    #===================================================================================#
+
+    def begin_job(self):
+        """Registra l'inizio di una trascrizione (i job contemporanei si dividono i core)."""
+        with self._lock:
+            self._active_jobs += 1
+
+    def end_job(self):
+        with self._lock:
+            self._active_jobs = max(0, self._active_jobs - 1)
+
+    def tune(self, model_name: str, device: str) -> Tuple[int, int]:
+        """Restituisce (cpu_threads, num_workers) per il job appena registrato con begin_job()."""
+        with self._lock:
+            concurrency = max(1, self._active_jobs)
+
+        # I core vengono divisi tra i processi sulla macchina e i job di questo processo
+        budget = max(1, self.available_cpus() // (self._processes * concurrency))
+
+        calibrated = self._calibration.get(model_name, {}).get(device)
+        if calibrated is not None:
+            # cpu_threads * num_workers non deve superare il budget del job
+            cpu_threads = min(calibrated["cpu_threads"], budget)
+            num_workers = max(1, min(calibrated.get("num_workers", 1), budget // cpu_threads))
+            return cpu_threads, num_workers
+
+        if device == "cuda":
+            # Su GPU i thread CPU servono solo per decodifica audio e beam search
+            return min(4, budget), 1
+        return budget, 1
@@ -10,6 +10,10 @@ import whisper
 from Setting import *
 from dataclasses import asdict, dataclass
 from data.database import Transcription
+from RtfEstimator import RtfEstimator
+from ModelStore import ModelStore
+from SegmentSink import SegmentSink
+from ThreadTuner import ThreadTuner
 
 
 @dataclass
@@ -31,6 +35,17 @@ class QueueItem:
     status: str = "pending"  # pending, processing, completed, error
     progress: int = 0
     created_at: Optional[str]  = None
+    duration: float = 0.0           # durata audio in secondi
+    estimated_work: float = 0.0     # secondi di elaborazione stimati
+    eta: Optional[float] = None     # secondi stimati al completamento
+    audio_hash: Optional[str] = None
+    detected_language: Optional[str] = None
+    language_probability: Optional[float] = None
+    worker: Optional[str] = None    # worker che sta elaborando l'elemento ("local" o id remoto)
+    prepared: bool = False          # pre-analisi (VAD) completata, l'elemento può essere assegnato
+    speech_seconds: Optional[float] = None
+    speech_ratio: Optional[float] = None
+    clip_timestamps: Optional[List[float]] = None  # intervalli di parlato da decodificare
     
     def __post_init__(self):
         if self.vad_parameters is None:
@@ -43,7 +58,7 @@ class QueueItem:
 
 
 class Transcriber:
-    def __init__(self, callback: Optional[Callable] = None, workers: int = 1, cpu_threads: int = 4):
+    def __init__(self, callback: Optional[Callable] = None, workers: int = 1, cpu_threads: int = 4, rtf_estimator: Optional[RtfEstimator] = None, model_store: Optional[ModelStore] = None, thread_tuner: Optional[ThreadTuner] = None):
         
         self.__current_status: str = "idle"
         self.__current_file: str = ""
@@ -53,11 +68,24 @@ class Transcriber:
         self._current_device: Optional[str] = None
         self.__workers: int = workers
         self.__cpu_threads: int = cpu_threads
+        self._rtf_estimator: Optional[RtfEstimator] = rtf_estimator
+        self._compute_type: str = "default"
+        self._model_store: ModelStore = model_store if model_store is not None else ModelStore()
+        # Se presente, cpu_threads e num_workers vengono scelti a ogni job
+        self._thread_tuner: Optional[ThreadTuner] = thread_tuner
+        self.last_timing: Optional[dict] = None
         
         torch.set_float32_matmul_precision("high")
         self._device = "cuda" if torch.cuda.is_available() else "cpu"
         self._torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
         
+    def get_device(self) -> str:
+        """Restituisce il device su cui verranno eseguite le trascrizioni."""
+        return self._device
+    
+    def get_compute_type(self) -> str:
+        return self._compute_type
+        
     def getCurrentFile(self) -> str:
         return self.__current_file
     
@@ -76,14 +104,42 @@ class Transcriber:
             return None 
         return self._current_device
        
-    def __format_time(self, seconds) -> str:
+    @staticmethod
+    def format_time(seconds) -> str:
         hours = int(seconds // 3600)
         minutes = int((seconds % 3600) // 60)
         seconds = int(seconds % 60)
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"    
     
+    @staticmethod
+    def format_line(item: QueueItem, start: float, end: float, text: str, total_duration: float) -> str:
+        """Riga di testo della trascrizione per un segmento (con timestamp se add_info)."""
+        if not item.add_info:
+            return text
+        
+        progress_percent = (end / total_duration) * 100 if total_duration > 0 else 0
+        segmentrange = f"[{Transcriber.format_time(start)} -> {Transcriber.format_time(end)}]"
+        progress_info = f"[Progress: {progress_percent:.3f}%]"
+        data = f"{segmentrange} {progress_info} "
+        fixed_data = f"{data:<45}"
+        return f"{fixed_data}: {text}"
+    
     
-    def transcribe(self, item: QueueItem, updateFunc: Callable) -> Optional[Transcription]:
+    @staticmethod
+    def _decode_language(item: QueueItem) -> Optional[str]:
+        """Lingua da imporre al decoder: quella scelta dall'utente o quella rilevata in anticipo."""
+        if item.language and item.language != "auto":
+            return item.language
+        if item.detected_language and (item.language_probability or 0) >= LANGUAGE_DETECTION_MIN_PROBABILITY:
+            return item.detected_language
+        return None
+    
+    def transcribe(self, item: QueueItem, updateFunc: Callable, segmentFunc: Optional[Callable] = None, sink: Optional[SegmentSink] = None) -> Optional[Transcription]:
+        """
+        Trascrive l'elemento. `segmentFunc(start, end, text)`, se indicata, riceve ogni
+        segmento appena decodificato (usata dai worker remoti per lo streaming).
+        I segmenti vengono raccolti in `sink`; se non indicato si usa un sink temporaneo su file.
+        """
         
         # Resetta il flag di stop all'inizio della trascrizione
         with self._lock:
@@ -91,41 +147,67 @@ class Transcriber:
             self._current_device = "cuda" if torch.cuda.is_available() else "cpu"
             self.__current_file = item.filename
         
-        total_duration = librosa.get_duration(path=item.file_path)
-        text_segments: List[str] = []   
+        total_duration = item.duration if item.duration > 0 else librosa.get_duration(path=item.file_path)
+        own_sink = sink is None
+        if own_sink:
+            sink = SegmentSink(item.id)
         
-        logger.info(f"Audio duration: {self.__format_time(total_duration)}") 
+        logger.info(f"Audio duration: {self.format_time(total_duration)}") 
         logger.info(f"Current transcription: {item.filename}")
 
         
+        if self._thread_tuner is not None:
+            self._thread_tuner.begin_job()
+        
         try:     
             item.status = "processing"
             self.__current_status = "processing"
                 
             
+            start_time = time.time()
+            
+            cpu_threads, num_workers = self.__cpu_threads, self.__workers
+            if self._thread_tuner is not None:
+                cpu_threads, num_workers = self._thread_tuner.tune(item.model_name, self._current_device)
+                logger.info(f"Thread per {item.model_name} su {self._current_device}: cpu_threads={cpu_threads}, num_workers={num_workers}")
+            
             #https://developer.nvidia.com/rdp/cudnn-archive
+            # Il modello viene sempre caricato dalla cache locale (scaricato solo se assente)
+            model_path = self._model_store.ensure(item.model_name)
+            
             model = WhisperModel(
-                model_size_or_path=item.model_name,
+                model_size_or_path=model_path,
                 device=self._current_device,
                 device_index=0,
                 #compute_type="float16" if torch.cuda.is_available() else "default",
-                cpu_threads=self.__cpu_threads,
-                num_workers=self.__workers
+                compute_type=self._compute_type,
+                cpu_threads=cpu_threads,
+                num_workers=num_workers
             )
+            load_seconds = time.time() - start_time
             
-            segments, info = model.transcribe(
-                item.file_path,
-                language=item.language if item.language and item.language != "auto" else None,
-                task="transcribe",
-                beam_size=item.beam_size,
-                vad_filter=item.vad_filter,
-                vad_parameters=item.vad_parameters,
-                temperature=[item.temperature],
-                # best_of=item.best_of,
-                compression_ratio_threshold=item.compression_ratio_threshold,
-                no_repeat_ngram_size=item.no_repeat_ngram_size,
-                # patience=item.patience if item.patience is not None else 1,
-            )
+            # Con la mappa del parlato pre-calcolata si decodificano solo gli intervalli di parlato
+            use_clips = item.clip_timestamps is not None
+            audio_seconds = item.speech_seconds if use_clips and item.speech_seconds is not None else total_duration
+            
+            if use_clips and not item.clip_timestamps:
+                logger.info(f"Nessun parlato rilevato in {item.filename}")
+                segments, info = [], None
+            else:
+                segments, info = model.transcribe(
+                    item.file_path,
+                    language=self._decode_language(item),
+                    task="transcribe",
+                    beam_size=item.beam_size,
+                    vad_filter=item.vad_filter and not use_clips,
+                    vad_parameters=item.vad_parameters,
+                    clip_timestamps=item.clip_timestamps if use_clips else "0",
+                    temperature=[item.temperature],
+                    # best_of=item.best_of,
+                    compression_ratio_threshold=item.compression_ratio_threshold,
+                    no_repeat_ngram_size=item.no_repeat_ngram_size,
+                    # patience=item.patience if item.patience is not None else 1,
+                )
             #print(f"Detected language '{info.language}' with probability {info.language_probability:.2f}")
 
             last_int_progress_percent = -1
@@ -147,16 +229,10 @@ class Transcriber:
                 #logger.info(f"[{item.filename}] Segment {segment.start:.2f}s to {segment.end:.2f}s: {segment.text} (Progress: {progress_percent:.3f}%)")
                 
                 # scrivi testo
-                if item.add_info:
-                    segmentrange = f"[{self.__format_time(segment.start)} -> {self.__format_time(segment.end)}]"
-                    progress_info = f"[Progress: {progress_percent:.3f}%]"
-                    data = f"{segmentrange} {progress_info} "
-                    fixed_data = f"{data:<45}"
-                    line = f"{fixed_data}: {segment.text}"
-                else:
-                    line = segment.text
-                    
-                text_segments.append(line)
+                sink.add(segment.start, segment.end, segment.text, self.format_line(item, segment.start, segment.end, segment.text, total_duration))
+                
+                if segmentFunc:
+                    segmentFunc(segment.start, segment.end, segment.text)
                 
                 if int_progress_percent > last_int_progress_percent and (time.time() - last_update_time >= dt):
                     with self._lock:
@@ -170,6 +246,25 @@ class Transcriber:
             # Costruzione oggetto finale
             final_status = "completed" if not self._stop_flag else "stopped"
             
+            self.last_timing = {
+                "device": self._current_device,
+                "compute_type": self._compute_type,
+                "cpu_threads": cpu_threads,
+                "num_workers": num_workers,
+                "audio_seconds": audio_seconds,
+                "load_seconds": load_seconds,
+                "decode_seconds": time.time() - start_time - load_seconds
+            }
+            
+            # Aggiorna la stima del real-time-factor solo con job completati
+            if final_status == "completed" and self._rtf_estimator is not None:
+                self._rtf_estimator.update(
+                    item.model_name, self._current_device, self._compute_type,
+                    audio_seconds=audio_seconds,
+                    decode_seconds=self.last_timing["decode_seconds"],
+                    load_seconds=load_seconds
+                )
+            
             return Transcription(
                 id=item.id,
                 display_name=item.filename,
@@ -179,7 +274,7 @@ class Transcriber:
                 temperature=item.temperature,
                 created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 status="completed",
-                content="\n".join(text_segments) # Uniamo tutto in una stringa
+                content=sink.read_content() # Unica copia completa del testo
             )
 
         except Exception as e:
@@ -188,6 +283,10 @@ class Transcriber:
             return None
         
         finally:
+            if own_sink:
+                sink.close()
+            if self._thread_tuner is not None:
+                self._thread_tuner.end_job()
             with self._lock:
                 self.__current_file = ""
                 if self.__current_status == "processing":
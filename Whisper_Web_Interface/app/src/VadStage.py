@@ -0,0 +1,108 @@
+import json
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from faster_whisper.audio import decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from Setting import *
+from data.database import DatabaseManager
+
+
+@dataclass
+class SpeechMap:
+    duration: float                         # durata totale dell'audio in secondi
+    speech_seconds: float                   # secondi di parlato
+    timestamps: List[Tuple[float, float]]   # intervalli di parlato (start, end) in secondi
+    cached: bool = False
+
+    @property
+    def ratio(self) -> float:
+        return self.speech_seconds / self.duration if self.duration > 0 else 0.0
+
+    def clip_timestamps(self, merge_gap: float = VAD_CLIP_MERGE_GAP_SECONDS) -> List[float]:
+        """
+        Intervalli nel formato `clip_timestamps` di faster-whisper ([start, end, start, end, ...]).
+        Gli intervalli separati da meno di `merge_gap` secondi vengono uniti per non
+        spezzare le frasi e non decodificare finestre quasi vuote.
+        """
+        merged: List[List[float]] = []
+        for start, end in self.timestamps:
+            if merged and start - merged[-1][1] < merge_gap:
+                merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        return [round(t, 3) for clip in merged for t in clip]
+
+
+class VadStage:
+    """
+    Pre-analisi VAD eseguita una sola volta per hash audio e parametri.
+    La mappa del parlato viene salvata nel database e passata al decoder come `clip_timestamps`,
+    così le parti silenziose non vengono decodificate e l'ETA si basa sui secondi di parlato.
+    """
+
+    SAMPLING_RATE: Final[int] = 16000
+
+    def __init__(self, database: Optional[DatabaseManager] = None):
+        self._db = database
+        self._lock = threading.Lock()
+        self._memory_cache: Dict[Tuple[str, str], SpeechMap] = {}
+
+    @staticmethod
+    def _params_key(vad_parameters: Optional[dict]) -> str:
+        return json.dumps(vad_parameters or {}, sort_keys=True)
+
+    def get_cached(self, audio_hash: str, vad_parameters: Optional[dict]) -> Optional[SpeechMap]:
+        key = (audio_hash, self._params_key(vad_parameters))
+        if key in self._memory_cache:
+            return self._memory_cache[key]
+
+        if self._db is not None:
+            row = self._db.get_cached_vad(audio_hash, key[1])
+            if row is not None:
+                result = SpeechMap(
+                    duration=row['duration'],
+                    speech_seconds=row['speech_seconds'],
+                    timestamps=[tuple(t) for t in json.loads(row['timestamps'])],
+                    cached=True
+                )
+                self._memory_cache[key] = result
+                return result
+        return None
+
+    def analyze(self, file_path: str, audio_hash: str, vad_parameters: Optional[dict] = None) -> Optional[SpeechMap]:
+        """Restituisce la mappa del parlato del file (dalla cache se già calcolata)."""
+        cached = self.get_cached(audio_hash, vad_parameters)
+        if cached is not None:
+            return cached
+
+        try:
+            with self._lock:
+                audio = decode_audio(file_path, sampling_rate=self.SAMPLING_RATE)
+                chunks = get_speech_timestamps(audio, VadOptions(**(vad_parameters or {})))
+                duration = len(audio) / self.SAMPLING_RATE
+                del audio
+        except Exception as e:
+            logger.error(f"Errore analisi VAD per {file_path}: {e}")
+            return None
+
+        timestamps = [(c["start"] / self.SAMPLING_RATE, c["end"] / self.SAMPLING_RATE) for c in chunks]
+        result = SpeechMap(
+            duration=duration,
+            speech_seconds=sum(end - start for start, end in timestamps),
+            timestamps=timestamps
+        )
+        params_key = self._params_key(vad_parameters)
+        self._memory_cache[(audio_hash, params_key)] = result
+        logger.info(f"VAD per {audio_hash[:12]}: {result.speech_seconds:.0f}s di parlato su {result.duration:.0f}s ({result.ratio:.0%})")
+
+        if self._db is not None:
+            self._db.save_cached_vad(
+                audio_hash, params_key, result.duration, result.speech_seconds,
+                json.dumps([[round(s, 3), round(e, 3)] for s, e in timestamps]),
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            )
+        return result
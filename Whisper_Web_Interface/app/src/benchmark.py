@@ -0,0 +1,203 @@
+"""
+Benchmark delle trascrizioni.
+
+Comandi:
+    segments    confronta la memoria di picco dell'accumulo dei segmenti in lista con il SegmentSink
+    transcribe  trascrive un file e riporta tempo, real-time-factor e memoria di picco del job
+    calibrate   prova i valori di cpu_threads sul corpus e salva i migliori
+
+Esempi:
+    python benchmark.py segments --count 10000
+    python benchmark.py transcribe audio.mp3 --model small
+    python benchmark.py calibrate corpus/ --models small medium --threads 2,4,8
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Dict, List
+
+from Setting import *
+from data.database import DatabaseManager, Transcription
+from SegmentSink import SegmentSink
+
+
+def _fake_segment(i: int):
+    start = i * 2.5
+    text = f" Segmento numero {i} di una registrazione molto lunga, con un testo di lunghezza realistica."
+    return start, start + 2.5, text
+
+
+def _fake_line(start: float, end: float, text: str) -> str:
+    return f"[{start:.2f} -> {end:.2f}] : {text}"
+
+
+def _make_transcription(trans_id: str, content: str) -> Transcription:
+    return Transcription(
+        id=trans_id, display_name="benchmark", original_filename="benchmark.wav", language="it",
+        model="small", temperature=0.0, created_at="now", status="completed", content=content
+    )
+
+
+def _peak_mb(func) -> float:
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024**2
+
+
+def bench_segments(count: int, db_path: str):
+    database = DatabaseManager(db_path)
+
+    def list_join():
+        # Accumulo precedente: lista di righe, join e nuova codifica per il controllo dimensione
+        lines = []
+        for i in range(count):
+            start, end, text = _fake_segment(i)
+            lines.append(_fake_line(start, end, text))
+        content = "\n".join(lines)
+        database.add_transcription(_make_transcription(str(uuid.uuid4()), content))
+
+    def sink():
+        trans_id = str(uuid.uuid4())
+        s = SegmentSink(trans_id, database)
+        for i in range(count):
+            start, end, text = _fake_segment(i)
+            s.add(start, end, text, _fake_line(start, end, text))
+        content = s.read_content()
+        database.add_transcription(_make_transcription(trans_id, content), content_bytes=s.get_content_bytes())
+        s.close()
+
+    for name, func in (("lista + join", list_join), ("SegmentSink", sink)):
+        start = time.perf_counter()
+        peak = _peak_mb(func)
+        print(f"{name:<14} picco {peak:>8.1f} MB   tempo {time.perf_counter() - start:>6.2f}s")
+
+
+def bench_transcribe(file_path: str, model_name: str, db_path: str):
+    from Transcriber import QueueItem, Transcriber
+
+    database = DatabaseManager(db_path)
+    transcriber = Transcriber()
+    item = QueueItem(id=str(uuid.uuid4()), filename=os.path.basename(file_path), file_path=file_path, language="auto", model_name=model_name)
+
+    sink = SegmentSink(item.id, database)
+    tracemalloc.start()
+    start = time.perf_counter()
+    transcription = transcriber.transcribe(item, None, sink=sink)
+    if transcription is not None:
+        database.add_transcription(transcription, content_bytes=sink.get_content_bytes())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    sink.close()
+
+    timing = transcriber.last_timing or {}
+    audio_seconds = timing.get("audio_seconds", 0)
+    print(f"File:             {file_path}")
+    print(f"Modello:          {model_name} ({timing.get('device')}, {timing.get('compute_type')})")
+    print(f"Durata audio:     {audio_seconds:.1f}s")
+    print(f"Tempo totale:     {elapsed:.1f}s (caricamento {timing.get('load_seconds', 0):.1f}s)")
+    if audio_seconds:
+        print(f"RTF:              {timing.get('decode_seconds', 0) / audio_seconds:.3f}")
+    print(f"Segmenti:         {sink.get_count()} ({sink.get_content_bytes() / 1024:.0f} KB di testo)")
+    print(f"Picco Python:     {peak / 1024**2:.1f} MB (tracemalloc)")
+    print(f"Picco processo:   {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB (ru_maxrss)")
+
+
+def _corpus_files(paths: List[str]) -> List[str]:
+    """File audio indicati o contenuti nelle cartelle indicate."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.rsplit('.', 1)[-1].lower() in ALLOWED_EXTENSIONS
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def bench_calibrate(corpus: List[str], models: List[str], threads: List[int], output: str):
+    from ThreadTuner import ThreadTuner
+    from Transcriber import QueueItem, Transcriber
+
+    files = _corpus_files(corpus)
+    if not files:
+        print("Nessun file audio nel corpus.")
+        return
+
+    tuner = ThreadTuner(calibration_file=output)
+    results: Dict[str, Dict[str, dict]] = {}
+
+    for model_name in models:
+        best = None
+        for cpu_threads in threads:
+            # I file vengono trascritti uno alla volta: num_workers > 1 non avrebbe effetto sulla
+            # misura, quindi si calibra solo cpu_threads con un solo worker
+            transcriber = Transcriber(workers=1, cpu_threads=cpu_threads)
+            audio_seconds = decode_seconds = 0.0
+            for file_path in files:
+                item = QueueItem(id=str(uuid.uuid4()), filename=os.path.basename(file_path), file_path=file_path, language="auto", model_name=model_name)
+                if transcriber.transcribe(item, None) is None or not transcriber.last_timing:
+                    continue
+                audio_seconds += transcriber.last_timing["audio_seconds"]
+                decode_seconds += transcriber.last_timing["decode_seconds"]
+
+            if audio_seconds <= 0:
+                continue
+            rtf = decode_seconds / audio_seconds
+            device = transcriber.get_device()
+            print(f"{model_name:<10} {device:<5} cpu_threads={cpu_threads:<3} RTF {rtf:.3f}")
+            if best is None or rtf < best[2]["rtf"]:
+                best = (model_name, device, {"cpu_threads": cpu_threads, "num_workers": 1, "rtf": round(rtf, 4)})
+
+        if best is not None:
+            results.setdefault(best[0], {})[best[1]] = best[2]
+            print(f"-> migliore per {best[0]} su {best[1]}: {best[2]}")
+
+    tuner.save_calibration(results)
+    print(f"Calibrazione salvata in {output} ({ThreadTuner.available_cpus()} core disponibili)")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark delle trascrizioni.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seg_parser = subparsers.add_parser("segments", help="Memoria di picco dell'accumulo dei segmenti.")
+    seg_parser.add_argument("--count", type=int, default=10000, help="Numero di segmenti simulati (il testo resta sotto il limite di 2MB).")
+
+    tr_parser = subparsers.add_parser("transcribe", help="Tempo e memoria di picco di un job reale.")
+    tr_parser.add_argument("file", type=str, help="File audio da trascrivere.")
+    tr_parser.add_argument("--model", type=str, default="small", help="Modello da usare.")
+
+    cal_parser = subparsers.add_parser("calibrate", help="Calibrazione di cpu_threads.")
+    cal_parser.add_argument("corpus", nargs="+", help="File audio o cartelle del corpus di benchmark.")
+    cal_parser.add_argument("--models", nargs="+", default=["small"], help="Modelli da calibrare.")
+    cal_parser.add_argument("--threads", type=str, default="1,2,4,8", help="Valori di cpu_threads da provare (separati da virgola).")
+    cal_parser.add_argument("--output", type=str, default=THREAD_CALIBRATION_FILE, help=f"File di calibrazione. Default: {THREAD_CALIBRATION_FILE}")
+
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.gettempdir(), f"benchmark_{uuid.uuid4().hex}.db")
+    try:
+        if args.command == "segments":
+            bench_segments(args.count, db_path)
+        elif args.command == "transcribe":
+            bench_transcribe(args.file, args.model, db_path)
+        elif args.command == "calibrate":
+            bench_calibrate(
+                args.corpus, args.models,
+                [int(t) for t in args.threads.split(",")],
+                args.output
+            )
+    finally:
+        if os.path.exists(db_path):
+            os.remove(db_path)
@@ -1,7 +1,7 @@
 import sqlite3
 import logging
 import threading
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import asdict, dataclass
 
 logger = logging.getLogger(__name__)
@@ -78,20 +78,68 @@ class DatabaseManager:
                         )
                     ''')
                     cursor.execute('CREATE INDEX IF NOT EXISTS idx_created_at ON transcriptions(created_at)')
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS rtf_stats (
+                            model TEXT,
+                            device TEXT,
+                            compute_type TEXT,
+                            rtf REAL,
+                            load_seconds REAL,
+                            samples INTEGER,
+                            updated_at TEXT,
+                            PRIMARY KEY (model, device, compute_type)
+                        )
+                    ''')
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS language_cache (
+                            audio_hash TEXT PRIMARY KEY,
+                            language TEXT,
+                            probability REAL,
+                            model TEXT,
+                            created_at TEXT
+                        )
+                    ''')
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS segments (
+                            transcription_id TEXT,
+                            idx INTEGER,
+                            start REAL,
+                            end REAL,
+                            text TEXT,
+                            PRIMARY KEY (transcription_id, idx)
+                        )
+                    ''')
+                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_segments_start ON segments(transcription_id, start)')
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS vad_cache (
+                            audio_hash TEXT,
+                            params TEXT,
+                            duration REAL,
+                            speech_seconds REAL,
+                            timestamps TEXT,
+                            created_at TEXT,
+                            PRIMARY KEY (audio_hash, params)
+                        )
+                    ''')
                     conn.commit()
                 logger.info(f"Database inizializzato correttamente: {self.db_path}")
             except Exception as e:
                 logger.error(f"Errore inizializzazione database: {str(e)}")
 
-    def _check_size_limit(self, content: str) -> bool:
-        """Verifica se il contenuto rispetta il limite di 2MB."""
-        if content and len(content.encode('utf-8')) > 2 * 1024 * 1024: # 2MB in bytes
+    def _check_size_limit(self, content: str, content_bytes: Optional[int] = None) -> bool:
+        """Verifica se il contenuto rispetta il limite di 2MB (content_bytes evita di ricodificare il testo)."""
+        if content_bytes is None:
+            content_bytes = len(content.encode('utf-8')) if content else 0
+        if content_bytes > 2 * 1024 * 1024: # 2MB in bytes
             return False
         return True
 
-    def add_transcription(self, t: Transcription) -> bool:
-        """Riceve un oggetto Transcription e lo salva in modo thread-safe."""
-        if not self._check_size_limit(t.content):
+    def add_transcription(self, t: Transcription, content_bytes: Optional[int] = None) -> bool:
+        """
+        Riceve un oggetto Transcription e lo salva in modo thread-safe.
+        I segmenti vengono scritti a blocchi con add_segments() durante la trascrizione.
+        """
+        if not self._check_size_limit(t.content, content_bytes):
             logger.error(f"Trascrizione {t.id} supera il limite di 2MB.")
             return False
 
@@ -112,14 +160,15 @@ class DatabaseManager:
                 return False
             
 
-    def get_transcription(self, id: str) -> Optional[Transcription]:
-        """Recupera una trascrizione e restituisce un oggetto Transcription."""
+    def get_transcription(self, id: str, with_content: bool = True) -> Optional[Transcription]:
+        """Recupera una trascrizione e restituisce un oggetto Transcription (senza testo se with_content è False)."""
+        columns = '*' if with_content else 'id, display_name, original_filename, language, model, temperature, created_at, status'
         with self._lock:
             try:
                 with self._conn as conn:
                     conn.row_factory = sqlite3.Row
                     cursor = conn.cursor()
-                    cursor.execute('SELECT * FROM transcriptions WHERE id = ?', (id,))
+                    cursor.execute(f'SELECT {columns} FROM transcriptions WHERE id = ?', (id,))
                     row = cursor.fetchone()
                     return Transcription.from_db_row(row) if row else None
             except Exception as e:
@@ -195,8 +244,173 @@ class DatabaseManager:
                 with self._conn as conn:
                     cursor = conn.cursor()
                     cursor.execute('DELETE FROM transcriptions WHERE id = ?', (id,))
+                    deleted = cursor.rowcount > 0
+                    cursor.execute('DELETE FROM segments WHERE transcription_id = ?', (id,))
                     conn.commit()
-                    return cursor.rowcount > 0
+                    return deleted
             except Exception as e:
                 logger.error(f"Errore delete DB: {str(e)}")
-                return False
\ No newline at end of file
+                return False
+
+    def add_segments(self, transcription_id: str, start_index: int, segments: List[Tuple[float, float, str]]) -> bool:
+        """Salva un blocco di segmenti (start, end, text) a partire dall'indice `start_index`."""
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany(
+                        'INSERT OR REPLACE INTO segments (transcription_id, idx, start, end, text) VALUES (?, ?, ?, ?, ?)',
+                        ((transcription_id, start_index + i, start, end, text) for i, (start, end, text) in enumerate(segments))
+                    )
+                    conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Errore salvataggio segmenti: {str(e)}")
+                return False
+
+    def delete_segments(self, transcription_id: str) -> bool:
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('DELETE FROM segments WHERE transcription_id = ?', (transcription_id,))
+                    conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Errore delete segmenti: {str(e)}")
+                return False
+
+    def get_segments_info(self, transcription_id: str) -> Dict[str, Any]:
+        """Numero di segmenti salvati e durata coperta dalla trascrizione."""
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT COUNT(*), MAX(end) FROM segments WHERE transcription_id = ?', (transcription_id,))
+                    count, duration = cursor.fetchone()
+                    return {'count': count, 'duration': duration or 0.0}
+            except Exception as e:
+                logger.error(f"Errore lettura segmenti: {str(e)}")
+                return {'count': 0, 'duration': 0.0}
+
+    def get_segments(self, transcription_id: str, start_index: int, count: int) -> List[Dict[str, Any]]:
+        """Restituisce `count` segmenti a partire dall'indice `start_index`."""
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    conn.row_factory = sqlite3.Row
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT idx AS "index", start, end, text FROM segments
+                        WHERE transcription_id = ? AND idx >= ?
+                        ORDER BY idx LIMIT ?
+                    ''', (transcription_id, start_index, count))
+                    return [dict(row) for row in cursor.fetchall()]
+            except Exception as e:
+                logger.error(f"Errore lettura segmenti: {str(e)}")
+                return []
+
+    def find_segment_index(self, transcription_id: str, time_seconds: float) -> int:
+        """Indice dell'ultimo segmento che inizia entro `time_seconds` (0 se nessuno)."""
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        SELECT idx FROM segments
+                        WHERE transcription_id = ? AND start <= ?
+                        ORDER BY start DESC LIMIT 1
+                    ''', (transcription_id, time_seconds))
+                    row = cursor.fetchone()
+                    return row[0] if row else 0
+            except Exception as e:
+                logger.error(f"Errore ricerca segmento: {str(e)}")
+                return 0
+
+    def get_rtf_stats(self) -> List[Dict[str, Any]]:
+        """Restituisce le stime di real-time-factor salvate per (model, device, compute_type)."""
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    conn.row_factory = sqlite3.Row
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT model, device, compute_type, rtf, load_seconds, samples FROM rtf_stats')
+                    return [dict(row) for row in cursor.fetchall()]
+            except Exception as e:
+                logger.error(f"Errore lettura rtf_stats: {str(e)}")
+                return []
+
+    def save_rtf_stat(self, model: str, device: str, compute_type: str, rtf: float, load_seconds: float, samples: int, updated_at: str) -> bool:
+        """Inserisce o aggiorna la stima di real-time-factor di una combinazione modello/device."""
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO rtf_stats
+                        (model, device, compute_type, rtf, load_seconds, samples, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (model, device, compute_type, rtf, load_seconds, samples, updated_at))
+                    conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Errore salvataggio rtf_stats: {str(e)}")
+                return False
+
+    def get_cached_language(self, audio_hash: str) -> Optional[Dict[str, Any]]:
+        """Restituisce la lingua rilevata in precedenza per un file audio (per hash del contenuto)."""
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    conn.row_factory = sqlite3.Row
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT language, probability, model FROM language_cache WHERE audio_hash = ?', (audio_hash,))
+                    row = cursor.fetchone()
+                    return dict(row) if row else None
+            except Exception as e:
+                logger.error(f"Errore lettura language_cache: {str(e)}")
+                return None
+
+    def save_cached_language(self, audio_hash: str, language: str, probability: float, model: str, created_at: str) -> bool:
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO language_cache (audio_hash, language, probability, model, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (audio_hash, language, probability, model, created_at))
+                    conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Errore salvataggio language_cache: {str(e)}")
+                return False
+
+    def get_cached_vad(self, audio_hash: str, params: str) -> Optional[Dict[str, Any]]:
+        """Restituisce la mappa del parlato calcolata in precedenza per (hash audio, parametri VAD)."""
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    conn.row_factory = sqlite3.Row
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT duration, speech_seconds, timestamps FROM vad_cache WHERE audio_hash = ? AND params = ?', (audio_hash, params))
+                    row = cursor.fetchone()
+                    return dict(row) if row else None
+            except Exception as e:
+                logger.error(f"Errore lettura vad_cache: {str(e)}")
+                return None
+
+    def save_cached_vad(self, audio_hash: str, params: str, duration: float, speech_seconds: float, timestamps: str, created_at: str) -> bool:
+        with self._lock:
+            try:
+                with self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO vad_cache (audio_hash, params, duration, speech_seconds, timestamps, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (audio_hash, params, duration, speech_seconds, timestamps, created_at))
+                    conn.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Errore salvataggio vad_cache: {str(e)}")
+                return False
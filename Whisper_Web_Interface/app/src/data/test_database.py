@@ -110,5 +110,74 @@ class TestDatabaseIntegrity(unittest.TestCase):
         self.assertEqual(count, num_threads)
         print(f" OK: Tutti i {count} thread hanno scritto correttamente senza deadlock.")
 
+    def test_4_rtf_stats_upsert(self):
+        print("--- Test 4: Persistenza stime Real-Time-Factor ---")
+        self.assertTrue(self.db_manager.save_rtf_stat("small", "cpu", "default", 0.5, 4.0, 1, "now"))
+        self.assertTrue(self.db_manager.save_rtf_stat("small", "cpu", "default", 0.4, 3.0, 2, "now"))
+        self.assertTrue(self.db_manager.save_rtf_stat("small", "cuda", "default", 0.05, 2.0, 1, "now"))
+
+        stats = {(r['model'], r['device'], r['compute_type']): r for r in self.db_manager.get_rtf_stats()}
+        self.assertEqual(len(stats), 2)
+        self.assertAlmostEqual(stats[("small", "cpu", "default")]['rtf'], 0.4)
+        self.assertEqual(stats[("small", "cpu", "default")]['samples'], 2)
+        print(" OK: Le stime vengono aggiornate per (model, device, compute_type).")
+
+    def test_5_language_cache(self):
+        print("--- Test 5: Cache lingua per hash audio ---")
+        self.assertIsNone(self.db_manager.get_cached_language("abc123"))
+        self.assertTrue(self.db_manager.save_cached_language("abc123", "it", 0.97, "tiny", "now"))
+
+        cached = self.db_manager.get_cached_language("abc123")
+        self.assertIsNotNone(cached)
+        assert cached is not None
+        self.assertEqual(cached['language'], "it")
+        self.assertAlmostEqual(cached['probability'], 0.97)
+        print(" OK: Lingua recuperata dalla cache.")
+
+    def test_6_segments_window(self):
+        print("--- Test 6: Finestre di segmenti per tempo e per indice ---")
+        data = Transcription(
+            id="long_01", display_name="Lunga", original_filename="lunga.wav", language="it",
+            model="small", temperature=0.0, created_at="now", status="completed", content="..."
+        )
+        # 1000 segmenti da 2 secondi ciascuno, scritti a blocchi come fa il SegmentSink
+        segments = [(i * 2.0, i * 2.0 + 2.0, f"segmento {i}") for i in range(1000)]
+        for start in range(0, len(segments), 200):
+            self.assertTrue(self.db_manager.add_segments("long_01", start, segments[start:start + 200]))
+        self.assertTrue(self.db_manager.add_transcription(data))
+
+        info = self.db_manager.get_segments_info("long_01")
+        self.assertEqual(info['count'], 1000)
+        self.assertAlmostEqual(info['duration'], 2000.0)
+
+        window = self.db_manager.get_segments("long_01", 100, 50)
+        self.assertEqual(len(window), 50)
+        self.assertEqual(window[0]['index'], 100)
+        self.assertEqual(window[0]['text'], "segmento 100")
+
+        self.assertEqual(self.db_manager.find_segment_index("long_01", 501.0), 250)
+        self.assertEqual(self.db_manager.find_segment_index("long_01", -1.0), 0)
+
+        print(" -> Eliminazione trascrizione e segmenti...")
+        self.assertTrue(self.db_manager.delete_transcription("long_01"))
+        self.assertEqual(self.db_manager.get_segments_info("long_01")['count'], 0)
+        print(" OK: Segmenti indicizzati e rimossi con la trascrizione.")
+
+    def test_7_vad_cache(self):
+        print("--- Test 7: Cache VAD per hash audio e parametri ---")
+        params = '{"min_silence_duration_ms": 1000}'
+        self.assertIsNone(self.db_manager.get_cached_vad("abc123", params))
+        self.assertTrue(self.db_manager.save_cached_vad("abc123", params, 3600.0, 420.5, "[[10.0, 12.5]]", "now"))
+
+        cached = self.db_manager.get_cached_vad("abc123", params)
+        self.assertIsNotNone(cached)
+        assert cached is not None
+        self.assertAlmostEqual(cached['speech_seconds'], 420.5)
+        self.assertEqual(cached['timestamps'], "[[10.0, 12.5]]")
+
+        # Parametri VAD diversi richiedono una nuova analisi
+        self.assertIsNone(self.db_manager.get_cached_vad("abc123", '{"min_silence_duration_ms": 500}'))
+        print(" OK: Mappa del parlato recuperata solo con gli stessi parametri.")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
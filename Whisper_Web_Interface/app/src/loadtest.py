@@ -0,0 +1,204 @@
+"""
+Load test del web server di trascrizione.
+
+Simula `viewers` client Socket.IO che richiedono continuamente lo stato della coda e
+`uploaders` client che caricano un breve file audio (rimuovendolo subito dalla coda),
+per ogni livello di carico indicato. Per ogni livello stampa latenze ed errori e indica
+se il carico è stato sostenuto (p95 e tasso di errori sotto le soglie).
+
+Esempio:
+    python loadtest.py --url http://localhost:12345 --viewers 50,200,500 --uploaders 2,5,10 --duration 30
+"""
+
+import argparse
+import io
+import math
+import struct
+import threading
+import time
+import wave
+from dataclasses import dataclass, field
+from typing import List
+
+import requests
+import socketio
+
+
+@dataclass
+class Stats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    requests: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, latency: float, ok: bool):
+        with self.lock:
+            self.requests += 1
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        with self.lock:
+            if not self.latencies:
+                return float("nan")
+            data = sorted(self.latencies)
+        return data[min(len(data) - 1, int(len(data) * p))]
+
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+
+def make_wav(seconds: float = 2.0, rate: int = 16000) -> bytes:
+    """Genera un file WAV (sinusoide a 440 Hz) da usare come upload."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        frames = b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / rate)))
+            for i in range(int(seconds * rate))
+        )
+        w.writeframes(frames)
+    return buffer.getvalue()
+
+
+def viewer(url: str, stop: threading.Event, stats: Stats, interval: float):
+    client = socketio.Client(reconnection=False)
+    received = threading.Event()
+    pending = {"id": None}
+
+    def on_status(data):
+        # Solo la risposta alla propria richiesta conta (gli aggiornamenti broadcast no)
+        if data.get("request_id") is not None and data.get("request_id") == pending["id"]:
+            received.set()
+
+    client.on("queue_status", on_status)
+
+    try:
+        client.connect(url, wait_timeout=10)
+    except Exception:
+        stats.record(0, False)
+        return
+
+    try:
+        request_id = 0
+        while not stop.is_set():
+            request_id += 1
+            pending["id"] = request_id
+            received.clear()
+            start = time.perf_counter()
+            client.emit("get_queue_status", {"request_id": request_id})
+            ok = received.wait(timeout=10)
+            stats.record(time.perf_counter() - start, ok)
+            stop.wait(interval)
+    finally:
+        client.disconnect()
+
+
+def uploader(url: str, stop: threading.Event, stats: Stats, audio: bytes, interval: float):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            r = session.post(
+                f"{url}/transcribe",
+                files={"files": ("loadtest.wav", audio, "audio/wav")},
+                data={"language": "en", "model": "tiny"},
+                timeout=60
+            )
+            ok = r.status_code == 200
+            stats.record(time.perf_counter() - start, ok)
+
+            # Rimuove subito l'elemento per non riempire la coda durante il test
+            if ok:
+                for result in r.json().get("results", []):
+                    if "id" in result:
+                        session.delete(f"{url}/queue/{result['id']}", timeout=10)
+        except Exception:
+            stats.record(time.perf_counter() - start, False)
+        stop.wait(interval)
+
+
+def run_level(url: str, viewers: int, uploaders: int, duration: float, audio: bytes, args) -> dict:
+    stop = threading.Event()
+    viewer_stats, upload_stats = Stats(), Stats()
+
+    threads = [threading.Thread(target=viewer, args=(url, stop, viewer_stats, args.viewer_interval), daemon=True) for _ in range(viewers)]
+    threads += [threading.Thread(target=uploader, args=(url, stop, upload_stats, audio, args.upload_interval), daemon=True) for _ in range(uploaders)]
+
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=15)
+
+    def within(value: float, limit: float) -> bool:
+        # Nessuna misura (es. 0 uploader) non invalida il livello
+        return math.isnan(value) or value <= limit
+
+    sustained = (
+        within(viewer_stats.percentile(0.95), args.max_p95)
+        and within(upload_stats.percentile(0.95), args.max_upload_p95)
+        and viewer_stats.error_rate() <= args.max_error_rate
+        and upload_stats.error_rate() <= args.max_error_rate
+    )
+    return {
+        "viewers": viewers,
+        "uploaders": uploaders,
+        "status_p50": viewer_stats.percentile(0.5),
+        "status_p95": viewer_stats.percentile(0.95),
+        "status_err": viewer_stats.error_rate(),
+        "upload_p50": upload_stats.percentile(0.5),
+        "upload_p95": upload_stats.percentile(0.95),
+        "upload_err": upload_stats.error_rate(),
+        "uploads": upload_stats.requests,
+        "sustained": sustained
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Load test del web server di trascrizione.")
+    parser.add_argument("--url", type=str, default="http://localhost:12345", help="URL del server.")
+    parser.add_argument("--viewers", type=str, default="10,50,100", help="Livelli di client Socket.IO (separati da virgola).")
+    parser.add_argument("--uploaders", type=str, default="1,2,5", help="Livelli di client che caricano file (separati da virgola).")
+    parser.add_argument("--duration", type=float, default=30, help="Durata di ogni livello in secondi.")
+    parser.add_argument("--viewer-interval", type=float, default=1.0, help="Secondi tra due richieste di stato per client.")
+    parser.add_argument("--upload-interval", type=float, default=2.0, help="Secondi tra due upload per client.")
+    parser.add_argument("--max-p95", type=float, default=1.0, help="Latenza p95 massima dello stato coda (s).")
+    parser.add_argument("--max-upload-p95", type=float, default=5.0, help="Latenza p95 massima degli upload (s).")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Tasso di errori massimo.")
+    args = parser.parse_args()
+
+    viewer_levels = [int(v) for v in args.viewers.split(",")]
+    uploader_levels = [int(u) for u in args.uploaders.split(",")]
+    if len(uploader_levels) == 1:
+        uploader_levels *= len(viewer_levels)
+    assert len(viewer_levels) == len(uploader_levels), "viewers e uploaders devono avere lo stesso numero di livelli"
+
+    audio = make_wav()
+    results = []
+    for v, u in zip(viewer_levels, uploader_levels):
+        print(f"Livello: {v} viewer, {u} uploader per {args.duration:.0f}s...")
+        results.append(run_level(args.url, v, u, args.duration, audio, args))
+
+    print()
+    print(f"{'viewer':>7} {'upload':>7} | {'stato p50':>9} {'p95':>7} {'err':>6} | {'upload p50':>10} {'p95':>7} {'err':>6} {'n':>5} | sostenuto")
+    for r in results:
+        print(
+            f"{r['viewers']:>7} {r['uploaders']:>7} | "
+            f"{r['status_p50']:>9.3f} {r['status_p95']:>7.3f} {r['status_err']:>6.1%} | "
+            f"{r['upload_p50']:>10.3f} {r['upload_p95']:>7.3f} {r['upload_err']:>6.1%} {r['uploads']:>5} | "
+            f"{'si' if r['sustained'] else 'NO'}"
+        )
+
+    sustained = [r for r in results if r["sustained"]]
+    if sustained:
+        best = max(sustained, key=lambda r: (r["viewers"], r["uploaders"]))
+        print(f"\nCarico massimo sostenuto: {best['viewers']} viewer e {best['uploaders']} uploader contemporanei.")
+    else:
+        print("\nNessun livello sostenuto con le soglie indicate.")
@@ -1,3 +1,11 @@
+from Setting import SERVE_MODE
+
+# In produzione il patch di gevent deve precedere ogni altro import di rete.
+# I thread restano nativi: la trascrizione gira fuori dall'event loop.
+if SERVE_MODE == "gevent":
+    from gevent import monkey
+    monkey.patch_all(thread=False)
+
 import os
 import sys
 import tempfile
@@ -13,6 +21,7 @@ from concurrent.futures import ThreadPoolExecutor
 import logging
 
 from data.database import DatabaseManager
+from ModelStore import ModelStore
 from Setting import *
 from server import WebServer
 
@@ -26,7 +35,13 @@ logger.info(f"torch backends cudnn version: {torch.backends.cudnn.version()}")
 def main():
     
     database = DatabaseManager('transcriptions.db')
-    wb = WebServer(database = database)
+    model_store = ModelStore()
+    
+    # Pre-scarica i modelli in background per non bloccare l'avvio del server
+    if PREFETCH_MODELS:
+        threading.Thread(target=model_store.prefetch_all, args=(PREFETCH_MODELS,), daemon=True).start()
+    
+    wb = WebServer(database = database, model_store = model_store)
 
 
 if __name__ == "__main__":
@@ -5,40 +5,94 @@ import threading
 import time
 from typing import Callable, List, Optional
 import uuid
+from datetime import datetime
 from flask import Flask, request, jsonify, render_template, send_file, redirect, url_for
 from flask_socketio import SocketIO, emit
 import torch
+import librosa
 from werkzeug.utils import secure_filename
 from concurrent.futures import ThreadPoolExecutor
 import logging
 from Transcriber import QueueItem, Transcriber
+from RtfEstimator import RtfEstimator
+from ModelStore import ModelStore
+from LanguageDetector import LanguageDetector
+from SpoolManager import SpoolManager, SpoolFullError
+from LeaseManager import LeaseManager
+from SegmentSink import SegmentSink
+from VadStage import VadStage
+from ThreadTuner import ThreadTuner
 from Setting import *
 from data.database import Transcription, DatabaseManager
 
 class WebServer:
-    def __init__(self, host:str ='0.0.0.0', port: int=12345, database: Optional[DatabaseManager] = None):
+    def __init__(self, host:str ='0.0.0.0', port: int=12345, database: Optional[DatabaseManager] = None, model_store: Optional[ModelStore] = None, serve_mode: str = SERVE_MODE):
         assert database is not None
+        assert serve_mode in ("dev", "gevent")
         
         self._db = database
+        self._model_store = model_store if model_store is not None else ModelStore()
         self._modelName = 'small'
         self._items_per_page = 10
         
+        # In modalità gevent l'hub gestisce l'I/O delle richieste; il lavoro bloccante va sui thread nativi
+        self._serve_mode = serve_mode
+        self._hub = None
+        if self._serve_mode == "gevent":
+            import gevent
+            self._hub = gevent.get_hub()
+            self._hub.threadpool.maxsize = BLOCKING_POOL_SIZE
+            self._hub_thread = threading.current_thread()
+        
         #queue per l'elaborazione in background
         self._queueLock = threading.Lock()
         self._queue: List[QueueItem] = []
-        self._maxQueue = 20
-        
-        # Avvia il thread di elaborazione
-        self._processing_thread = threading.Thread(target=self._process_queue, daemon=True)
-        self._processing_thread.start()
-        
-        self._Transcriber = Transcriber()
+        self._maxQueueWork: float = MAX_QUEUE_WORK_SECONDS
+        
+        # Stima del real-time-factor per ETA e admission control
+        self._rtf = RtfEstimator(self._db)
+        
+        # Rilevamento lingua anticipato (cache per hash audio)
+        self._language_detector = LanguageDetector(self._model_store, self._db)
+        
+        # Pre-analisi VAD in background (cache per hash audio e parametri)
+        self._vad = VadStage(self._db)
+        self._prep_executor = ThreadPoolExecutor(max_workers=VAD_WORKERS)
+        
+        # Lease dei worker remoti e thread che riassegna gli elementi dei worker morti
+        self._leases = LeaseManager()
+        self._lease_reaper_thread = threading.Thread(target=self._expire_leases_loop, daemon=True)
+        self._lease_reaper_thread.start()
+        
+        # Avvia il thread di elaborazione locale
+        if LOCAL_WORKER_ENABLED:
+            self._processing_thread = threading.Thread(target=self._process_queue, daemon=True)
+            self._processing_thread.start()
+        
+        self._Transcriber = Transcriber(
+            workers=FIXED_NUM_WORKERS,
+            cpu_threads=FIXED_CPU_THREADS,
+            rtf_estimator=self._rtf,
+            model_store=self._model_store,
+            thread_tuner=ThreadTuner() if THREAD_TUNING == "auto" else None
+        )
         
       
         
         self._app: Flask = Flask(__name__)
-        self._app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
-        self._socketio = SocketIO(self._app, cors_allowed_origins="*")
+        
+        # Spool dei file caricati: all'avvio la coda è vuota, quindi ogni file presente è orfano
+        self._spool = SpoolManager()
+        self._spool.reconcile()
+        self._app.config['UPLOAD_FOLDER'] = self._spool.get_spool_dir()
+        self._socketio = SocketIO(
+            self._app, 
+            cors_allowed_origins="*",
+            async_mode="gevent" if self._serve_mode == "gevent" else "threading",
+            ping_interval=SOCKETIO_PING_INTERVAL,
+            ping_timeout=SOCKETIO_PING_TIMEOUT,
+            max_http_buffer_size=SOCKETIO_MAX_HTTP_BUFFER_SIZE
+        )
         
         self._app.route('/', methods=['GET'])(self.index)
         self._app.route('/transcribe', methods=['POST'])(self.transcribe)
@@ -47,19 +101,63 @@ class WebServer:
         self._app.route('/transcription/<trans_id>', methods=['PUT'])(self.rename_transcription)
         self._app.route('/transcription/<trans_id>', methods=['DELETE'])(self.delete_transcription)
         self._app.route('/transcription/<trans_id>/download', methods=['GET'])(self.download_transcription)
+        self._app.route('/transcription/<trans_id>/segments', methods=['GET'])(self.get_transcription_segments)
         self._app.route('/health', methods=['GET'])(self.health_check)
         self._app.route('/queue/<item_id>', methods=['DELETE'])(self.remove_from_queue)
         self._app.route('/queue/<item_id>/stop', methods=['DELETE'])(self.stop_and_remove_from_queue)
         
+        # Protocollo worker remoti
+        self._app.route('/worker/lease', methods=['POST'])(self.worker_lease)
+        self._app.route('/worker/lease/<lease_id>/audio', methods=['GET'])(self.worker_audio)
+        self._app.route('/worker/lease/<lease_id>/heartbeat', methods=['POST'])(self.worker_heartbeat)
+        self._app.route('/worker/lease/<lease_id>/segments', methods=['POST'])(self.worker_segments)
+        self._app.route('/worker/lease/<lease_id>/complete', methods=['POST'])(self.worker_complete)
+        self._app.route('/worker/lease/<lease_id>/fail', methods=['POST'])(self.worker_fail)
+        
         # Eventi SocketIO
         self._socketio.on('connect')(self._handle_connect)
         self._socketio.on('disconnect')(self._handle_disconnect)
-        self._socketio.on('get_queue_status')(self._send_queue_status)
+        self._socketio.on('get_queue_status')(self._handle_get_queue_status)
         #self._socketio.on('get_transcriptions')(self._send_transcriptions)
         self._socketio.on('get_transcriptions')(self.handle_get_transcriptions)
         
-        self._socketio.run(self._app, host=host, port=port, debug=True, allow_unsafe_werkzeug=True)
         logger.info("Server pronto con backend SQLite.")
+        self._run(host, port)
+        
+    def _run(self, host: str, port: int):
+        if self._serve_mode == "gevent":
+            from gevent import pywsgi
+            from gevent.pool import Pool
+            from geventwebsocket.handler import WebSocketHandler
+            
+            # Il pool limita le connessioni contemporanee: oltre il limite l'accept attende
+            server = pywsgi.WSGIServer(
+                (host, port), 
+                self._app, 
+                spawn=Pool(SERVER_MAX_CONNECTIONS), 
+                handler_class=WebSocketHandler
+            )
+            logger.info(f"Server gevent in ascolto su {host}:{port} (max {SERVER_MAX_CONNECTIONS} connessioni)")
+            server.serve_forever()
+        else:
+            self._socketio.run(self._app, host=host, port=port, debug=True, allow_unsafe_werkzeug=True)
+    
+    def _emit(self, event: str, data, to: Optional[str] = None):
+        """
+        Emette un evento Socket.IO a tutti i client o solo a `to` (sid);
+        dai thread nativi l'invio viene delegato all'hub gevent.
+        """
+        if self._hub is not None and threading.current_thread() is not self._hub_thread:
+            import gevent
+            self._hub.loop.run_callback_threadsafe(gevent.spawn, lambda: self._socketio.emit(event, data, to=to))
+        else:
+            self._socketio.emit(event, data, to=to)
+    
+    def _run_blocking(self, func: Callable, *args, **kwargs):
+        """Esegue lavoro CPU/disco bloccante fuori dall'event loop (in modalità gevent)."""
+        if self._hub is not None and threading.current_thread() is self._hub_thread:
+            return self._hub.threadpool.apply(func, args, kwargs)
+        return func(*args, **kwargs)
         
     def index(self):
         return render_template(
@@ -81,8 +179,9 @@ class WebServer:
     
     def _handle_connect(self):
         logger.info("Client connesso")
-        self._send_queue_status()
-        self._send_transcriptions()
+        # Lo stato iniziale serve solo al client appena connesso
+        self._send_queue_status(to=request.sid)
+        self._emit('transcriptions_update', self._get_paginated_transcriptions(), to=request.sid)
         
         
     def _handle_disconnect(self):
@@ -92,22 +191,60 @@ class WebServer:
     # QUEUE MOTHODS                                                                     #
     #===================================================================================#
     
-    def _send_queue_status(self):
+    def _queued_work_unsafe(self) -> float:
+        """Secondi di elaborazione stimati ancora da svolgere (da chiamare con _queueLock acquisito)."""
+        total = 0.0
+        for q in self._queue:
+            if q.status == 'pending':
+                total += q.estimated_work
+            elif q.status == 'processing':
+                total += q.estimated_work * (1 - q.progress / 100)
+        return total
+    
+    def _update_etas_unsafe(self):
+        """Aggiorna l'ETA degli elementi in coda in ordine di elaborazione (da chiamare con _queueLock acquisito)."""
+        elapsed = 0.0
+        for q in self._queue:
+            if q.status == 'processing':
+                elapsed += q.estimated_work * (1 - q.progress / 100)
+                q.eta = round(elapsed, 1)
+        for q in self._queue:
+            if q.status == 'pending':
+                elapsed += q.estimated_work
+                q.eta = round(elapsed, 1)
+            elif q.status != 'processing':
+                q.eta = None
+    
+    def _handle_get_queue_status(self, data=None):
+        """Risponde solo al client che ha chiesto lo stato, riportando l'eventuale `request_id`."""
+        request_id = data.get('request_id') if isinstance(data, dict) else None
+        self._send_queue_status(to=request.sid, request_id=request_id)
+
+    def _send_queue_status(self, to: Optional[str] = None, request_id=None):
         with self._queueLock:
+            self._update_etas_unsafe()
             queue_status = [item.to_dict() for item in self._queue]
         
+        # La mappa del parlato serve solo ai worker, non al frontend
+        for entry in queue_status:
+            entry.pop('clip_timestamps', None)
+        
         # Ottieni informazioni sul device corrente
         current_device = self._Transcriber.get_current_device()
         if current_device is None:
             current_device = "None"
         
-        self._socketio.emit('queue_status', {
+        status = {
             'queue': queue_status,
             'transcriber_status': self._Transcriber.getCurrentStatus(),
             'current_file': self._Transcriber.getCurrentFile(),
             'current_device': current_device,
-            'gpu_available': torch.cuda.is_available()
-        })
+            'gpu_available': torch.cuda.is_available(),
+            'workers': self._leases.active_workers()
+        }
+        if request_id is not None:
+            status['request_id'] = request_id
+        self._emit('queue_status', status, to=to)
     
     def remove_from_queue(self, item_id):
         logger.info(f"removing item {item_id} from queue")
@@ -120,10 +257,7 @@ class WebServer:
                     
                     found = True
                     self._queue.pop(i)
-                    try:  
-                        os.remove(item.file_path) 
-                    except:
-                        pass
+                    self._spool.release(item.file_path)
 
         if found:            
             # Notifica i client
@@ -147,15 +281,26 @@ class WebServer:
             
         if item_to_stop:
             # Ferma l'elaborazione
-            self._Transcriber.stop_transcription()
-            
-            # Rimuovi il file temporaneo se esiste
-            with self._queueLock:
-                self._queue.pop(item_index)
-                try:
-                    os.remove(item_to_stop.file_path)
-                except:
-                    pass
+            if item_to_stop.worker == "local":
+                self._Transcriber.stop_transcription()
+                
+                # Il file viene rilasciato dal thread di elaborazione
+                with self._queueLock:
+                    self._queue.pop(item_index)
+            else:
+                # Il worker remoto riceve lo stop con il prossimo heartbeat
+                self._leases.request_stop(item_id)
+                lease = self._leases.find_by_item(item_id)
+                if lease is not None:
+                    # Un blocco di segmenti in corso termina prima della chiusura del sink
+                    with lease.lock:
+                        self._leases.release(lease.lease_id)
+                        lease.closed = True
+                        lease.sink.discard()
+                
+                with self._queueLock:
+                    self._queue.pop(item_index)
+                self._spool.release(item_to_stop.file_path)
             
             self._send_queue_status()
             return jsonify({"success": True})
@@ -192,7 +337,8 @@ class WebServer:
             sort_order = data.get('sort_order', 'desc')
             
         result = self._get_paginated_transcriptions(page, sort_by, sort_order)
-        self._socketio.emit('transcriptions_update', result)
+        # Pagina e ordinamento sono del client che li ha chiesti
+        self._emit('transcriptions_update', result, to=request.sid)
     
     
     def _send_transcriptions(self):
@@ -205,7 +351,7 @@ class WebServer:
         # Qui inviamo un evento generico per notificare che la lista è cambiata.
         # Per semplicità, inviamo la pagina 1 default.
         result = self._get_paginated_transcriptions()
-        self._socketio.emit('transcriptions_update', result)
+        self._emit('transcriptions_update', result)
        
             
     
@@ -225,7 +371,9 @@ class WebServer:
     # serve al frontend per il pulsante "Visualizza"
     def get_transcription(self, trans_id):
         
-        trans_obj = self._db.get_transcription(trans_id)
+        # Con ?content=0 il testo non viene letto: il frontend carica i segmenti a finestre
+        with_content = request.args.get('content', '1') != '0'
+        trans_obj = self._db.get_transcription(trans_id, with_content=with_content)
 
         if trans_obj:
             # Usiamo il metodo to_dict() che abbiamo creato nella classe DB_Transcription
@@ -233,12 +381,45 @@ class WebServer:
             data = trans_obj.to_dict()
             data['text'] = data.pop('content') # Rinomina per compatibilità frontend
             
-            print(data)
+            info = self._db.get_segments_info(trans_id)
+            data['segment_count'] = info['count']
+            data['duration'] = info['duration']
             return jsonify(data)
         
         return jsonify({"error": "Trascrizione non trovata"}), 404
 
 
+    def get_transcription_segments(self, trans_id):
+        """
+        Restituisce una finestra di segmenti della trascrizione.
+        Query Params: start_index e count, oppure time (secondi) e before (segmenti prima di time).
+        """
+        try:
+            count = min(int(request.args.get('count', SEGMENT_WINDOW_DEFAULT)), SEGMENT_WINDOW_MAX)
+            anchor_index = None
+            if 'time' in request.args:
+                anchor_index = self._db.find_segment_index(trans_id, float(request.args['time']))
+                before = int(request.args.get('before', count // 2))
+                start_index = max(0, anchor_index - before)
+            else:
+                start_index = max(0, int(request.args.get('start_index', 0)))
+        except ValueError:
+            return jsonify({"error": "Parametri non validi"}), 400
+        
+        info = self._db.get_segments_info(trans_id)
+        if info['count'] == 0 and self._db.get_transcription(trans_id, with_content=False) is None:
+            return jsonify({"error": "Trascrizione non trovata"}), 404
+        
+        return jsonify({
+            "id": trans_id,
+            "total": info['count'],
+            "duration": info['duration'],
+            "start_index": start_index,
+            "anchor_index": anchor_index,
+            "segments": self._db.get_segments(trans_id, start_index, max(0, count))
+        })
+
+
     def rename_transcription(self, trans_id):
     
         data = request.get_json()
@@ -284,6 +465,219 @@ class WebServer:
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS   
 
     
+    #===================================================================================#
+    # REMOTE WORKER MOTHODS                                                             #
+    #===================================================================================#
+    
+    def _check_worker_token(self):
+        if WORKER_TOKEN and request.headers.get('X-Worker-Token') != WORKER_TOKEN:
+            return jsonify({"error": "Token worker non valido"}), 401
+        return None
+    
+    def _get_lease_item(self, lease_id: str):
+        """Restituisce (lease, item) per un lease valido, altrimenti (None, None)."""
+        lease = self._leases.get(lease_id)
+        if lease is None:
+            return None, None
+        with self._queueLock:
+            item = self._find_item_unsafe(lease.item_id)
+        if item is None:
+            # Elemento rimosso dall'utente nel frattempo
+            self._leases.release(lease_id)
+            return None, None
+        return lease, item
+    
+    def worker_lease(self):
+        """Assegna a un worker remoto il prossimo elemento in attesa."""
+        error = self._check_worker_token()
+        if error:
+            return error
+        
+        data = request.get_json(silent=True) or {}
+        worker_id = data.get('worker_id')
+        if not worker_id:
+            return jsonify({"error": "worker_id mancante"}), 400
+        
+        with self._queueLock:
+            item = self._claim_next_item_unsafe(worker_id, data.get('models'))
+            if item is None:
+                self._leases.touch_worker(worker_id)
+                return '', 204
+            lease = self._leases.acquire(item.id, worker_id)
+            lease.sink = SegmentSink(item.id, self._db)
+            item_data = item.to_dict()
+        
+        logger.info(f"Lease {lease.lease_id} assegnato a {worker_id} per {item.filename}")
+        self._send_queue_status()
+        return jsonify({"lease_id": lease.lease_id, "ttl": self._leases.get_ttl(), "item": item_data})
+    
+    def worker_audio(self, lease_id):
+        error = self._check_worker_token()
+        if error:
+            return error
+        
+        lease, item = self._get_lease_item(lease_id)
+        if lease is None:
+            return jsonify({"error": "Lease non valido o scaduto"}), 410
+        return send_file(item.file_path, as_attachment=True, download_name=item.filename)
+    
+    def worker_heartbeat(self, lease_id):
+        error = self._check_worker_token()
+        if error:
+            return error
+        
+        lease = self._leases.heartbeat(lease_id)
+        if lease is None:
+            return jsonify({"error": "Lease non valido o scaduto", "stop": True}), 410
+        return jsonify({"stop": lease.stop_requested})
+    
+    def worker_segments(self, lease_id):
+        """Riceve un blocco di segmenti e il progresso; i blocchi duplicati vengono ignorati."""
+        error = self._check_worker_token()
+        if error:
+            return error
+        
+        lease, item = self._get_lease_item(lease_id)
+        if lease is None or self._leases.heartbeat(lease_id) is None:
+            return jsonify({"error": "Lease non valido o scaduto", "stop": True}), 410
+        
+        data = request.get_json(silent=True) or {}
+        start_index = int(data.get('start_index', 0))
+        segments = data.get('segments', [])
+        
+        # Un POST ritentato e il blocco successivo possono arrivare insieme: controllo e scrittura sono atomici
+        with lease.lock:
+            if lease.closed or self._leases.get(lease_id) is not lease:
+                # Lease scaduto (sink già scartato) mentre la richiesta era in corso
+                return jsonify({"error": "Lease non valido o scaduto", "stop": True}), 410
+            
+            if start_index > lease.next_segment:
+                # Manca un blocco precedente: il worker deve reinviare da next_index
+                return jsonify({"error": "Segmenti mancanti", "next_index": lease.next_segment, "stop": lease.stop_requested}), 409
+            
+            for seg in segments[lease.next_segment - start_index:]:
+                line = Transcriber.format_line(item, seg['start'], seg['end'], seg['text'], item.duration)
+                lease.sink.add(seg['start'], seg['end'], seg['text'], line)
+                lease.next_segment += 1
+            next_index = lease.next_segment
+        
+        with self._queueLock:
+            item.progress = int(data.get('progress', item.progress))
+        self._send_queue_status()
+        
+        return jsonify({"next_index": next_index, "stop": lease.stop_requested})
+    
+    def worker_complete(self, lease_id):
+        error = self._check_worker_token()
+        if error:
+            return error
+        
+        lease, item = self._get_lease_item(lease_id)
+        if lease is None:
+            return jsonify({"error": "Lease non valido o scaduto"}), 410
+        
+        data = request.get_json(silent=True) or {}
+        timing = data.get('timing')
+        
+        with lease.lock:
+            if lease.closed or self._leases.get(lease_id) is not lease:
+                return jsonify({"error": "Lease non valido o scaduto"}), 410
+            
+            # Il testo salvato deve contenere tutti i segmenti che il worker dichiara di aver inviato
+            reported = data.get('segments')
+            if reported is not None and int(reported) > lease.next_segment:
+                return jsonify({"error": "Segmenti mancanti", "next_index": lease.next_segment}), 409
+            
+            self._leases.release(lease_id)
+            lease.closed = True
+        
+        transcription_obj = Transcription(
+            id=item.id,
+            display_name=item.filename,
+            original_filename=item.filename,
+            language=data.get('language') or item.language,
+            model=item.model_name,
+            temperature=item.temperature,
+            created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            status="completed",
+            content=lease.sink.read_content()
+        )
+        success = self._db.add_transcription(transcription_obj, content_bytes=lease.sink.get_content_bytes())
+        if success:
+            lease.sink.close()
+        else:
+            lease.sink.discard()
+        
+        # Le misure del worker aggiornano la stima RTF del suo device
+        if success and timing and data.get('status', 'completed') == 'completed':
+            self._rtf.update(
+                item.model_name, timing['device'], timing['compute_type'],
+                audio_seconds=timing['audio_seconds'],
+                decode_seconds=timing['decode_seconds'],
+                load_seconds=timing['load_seconds']
+            )
+        
+        with self._queueLock:
+            item.status = "completed" if success else "error"
+            item.progress = 100
+        
+        logger.info(f"Worker {lease.worker_id} ha completato {item.filename}")
+        self._spool.release(item.file_path)
+        self._send_transcriptions()
+        self._send_queue_status()
+        threading.Thread(target=self.delayed_item_removal, args=(item, 60), daemon=True).start()
+        
+        return jsonify({"success": success})
+    
+    def worker_fail(self, lease_id):
+        error = self._check_worker_token()
+        if error:
+            return error
+        
+        lease, item = self._get_lease_item(lease_id)
+        if lease is None:
+            return jsonify({"error": "Lease non valido o scaduto"}), 410
+        with lease.lock:
+            self._leases.release(lease_id)
+            lease.closed = True
+            lease.sink.discard()
+        
+        data = request.get_json(silent=True) or {}
+        logger.error(f"Worker {lease.worker_id} ha fallito {item.filename}: {data.get('error')}")
+        
+        with self._queueLock:
+            item.status = "error"
+        
+        self._spool.release(item.file_path)
+        self._send_queue_status()
+        threading.Thread(target=self.delayed_item_removal, args=(item, 60), daemon=True).start()
+        
+        return jsonify({"success": True})
+    
+    def _expire_leases_loop(self):
+        """Rimette in coda gli elementi dei worker che hanno smesso di inviare heartbeat."""
+        while True:
+            time.sleep(max(1.0, self._leases.get_ttl() / 3))
+            
+            expired = self._leases.expire()
+            if not expired:
+                continue
+            
+            with self._queueLock:
+                for lease in expired:
+                    with lease.lock:
+                        lease.closed = True
+                        lease.sink.discard()
+                    item = self._find_item_unsafe(lease.item_id)
+                    if item is not None and item.status == "processing" and item.worker == lease.worker_id:
+                        logger.warning(f"Lease di {lease.worker_id} scaduto: {item.filename} torna in coda")
+                        item.status = "pending"
+                        item.progress = 0
+                        item.worker = None
+            
+            self._send_queue_status()
+    
+    
     #===================================================================================#
     # PROCESSING MOTHODS                                                                #
     #===================================================================================#
@@ -296,21 +690,16 @@ class WebServer:
             time.sleep(2)
             
             with self._queueLock:
-                if self._queue:
-                    item = self._queue[0]
-                    
-                    if item.status == "completed" or item.status == "error":
-                        self._queue.pop(0)
-                        self._queue.append(item)
-                        continue
-                    
-                    item.status = "processing"
-                else:
+                item = self._claim_next_item_unsafe("local")
+                if item is None:
                     continue
             
             self._send_queue_status()
             
             if item is not None and isinstance(item, QueueItem):
+                # I segmenti vengono scritti su disco e database a blocchi durante la trascrizione
+                sink = SegmentSink(item.id, self._db)
+                success = False
                 try:
                     # Processa il file
                     
@@ -318,11 +707,14 @@ class WebServer:
                     #     self._queueLock, item, updateFunc=lambda: self._send_queue_status()
                     # )
                     transcription_obj = self._Transcriber.transcribe(
-                        item, updateFunc=lambda: self._send_queue_status()
+                        item, updateFunc=lambda: self._send_queue_status(), sink=sink
                     )
                     
                     if transcription_obj is not None:
-                        success = self._db.add_transcription(transcription_obj)
+                        success = self._db.add_transcription(transcription_obj, content_bytes=sink.get_content_bytes())
+                        transcription_obj = None    # libera subito il testo completo
+                        if sink.get_error():
+                            logger.warning(f"Trascrizione {item.id} salvata con segmenti incompleti: {sink.get_error()}")
 
                         if not success:
                              logger.error(f"Impossibile salvare la trascrizione {item.id} nel DB (superamento limiti?)")
@@ -347,11 +739,12 @@ class WebServer:
                     self._send_queue_status()
                 
                 finally:
-                    # Rimuovi il file temporaneo
-                    try:
-                        os.remove(item.file_path)
-                    except:
-                        pass
+                    # Rilascia il file nello spool
+                    self._spool.release(item.file_path)
+                    if success:
+                        sink.close()
+                    else:
+                        sink.discard()
                 
          
                 self._send_queue_status()
@@ -365,6 +758,51 @@ class WebServer:
                 
 
 
+    def _claim_next_item_unsafe(self, worker_id: str, models: Optional[List[str]] = None) -> Optional[QueueItem]:
+        """Assegna al worker il primo elemento in attesa (da chiamare con _queueLock acquisito)."""
+        for item in self._queue:
+            if item.status != "pending" or not item.prepared:
+                continue
+            if models and item.model_name not in models:
+                continue
+            item.status = "processing"
+            item.worker = worker_id
+            return item
+        return None
+    
+    def _prepare_item(self, item: QueueItem):
+        """Calcola (o legge dalla cache) la mappa del parlato e aggiorna lavoro stimato ed ETA."""
+        with self._queueLock:
+            if item not in self._queue:
+                return
+        
+        try:
+            speech = self._vad.analyze(item.file_path, item.audio_hash, item.vad_parameters)
+            
+            with self._queueLock:
+                if speech is not None:
+                    item.speech_seconds = round(speech.speech_seconds, 1)
+                    item.speech_ratio = round(speech.ratio, 3)
+                    item.clip_timestamps = speech.clip_timestamps()
+                    item.estimated_work = self._rtf.estimate_work(
+                        item.model_name, self._Transcriber.get_device(), self._Transcriber.get_compute_type(), speech.speech_seconds
+                    )
+        except Exception as e:
+            logger.error(f"Pre-analisi di {item.filename} non riuscita: {e}")
+        finally:
+            # Anche se la pre-analisi fallisce l'elemento deve poter essere assegnato:
+            # senza mappa del parlato si decodifica con il vad_filter del decoder
+            with self._queueLock:
+                item.prepared = True
+        
+        self._send_queue_status()
+    
+    def _find_item_unsafe(self, item_id: str) -> Optional[QueueItem]:
+        for item in self._queue:
+            if item.id == item_id:
+                return item
+        return None
+
     def delayed_item_removal(self, item: QueueItem, delay: int = 5):
         time.sleep(delay)
         with self._queueLock:
@@ -373,7 +811,28 @@ class WebServer:
         self._send_queue_status()
 
 
+    @staticmethod
+    def _upload_size(file) -> int:
+        """Dimensione del file caricato, se determinabile senza leggerlo."""
+        if file.content_length:
+            return file.content_length
+        try:
+            pos = file.stream.tell()
+            file.stream.seek(0, os.SEEK_END)
+            size = file.stream.tell()
+            file.stream.seek(pos)
+            return size
+        except Exception:
+            return 0
+
     def transcribe(self):
+        # Backpressure: rifiuta l'upload prima di leggerlo se lo spool o il disco sono pieni
+        if request.content_length:
+            capacity_error = self._spool.check_capacity(request.content_length)
+            if capacity_error:
+                logger.error(capacity_error)
+                return jsonify({"success": False, "error": capacity_error}), 507
+        
         # Verifica presenza file
         if 'files' not in request.files:
             return jsonify({"error": "Nessun file fornito"}), 400
@@ -408,84 +867,130 @@ class WebServer:
         vad_parameters = {"min_silence_duration_ms": vad_min_silence}
         
         results = []
-      
+        saved_files = []
 
-        # Processa i file in parallelo
+        for file in files:
+            if file and self.allowed_file(file.filename) and file.filename is not None:
+                filename = secure_filename(file.filename)
+                
+                try:
+                    # Nome content-addressed nello spool: nessun conflitto tra upload con lo stesso nome
+                    temp_path, audio_hash = self._run_blocking(
+                        self._spool.store,
+                        file.stream, 
+                        extension=filename.rsplit('.', 1)[1], 
+                        expected_size=self._upload_size(file)
+                    )
+                    logger.info(f"File salvato temporaneamente in {temp_path}")
+                    saved_files.append((filename, temp_path, audio_hash))
+                
+                except SpoolFullError as e:
+                    logger.error(f"Spool pieno durante il salvataggio di {filename}: {str(e)}")
+                    for _, path, _ in saved_files:
+                        self._spool.release(path)
+                    return jsonify({"success": False, "error": str(e)}), 507
+                    
+                except Exception as e:
+                    logger.error(f"Errore salvataggio file {filename}: {str(e)}")
+                    results.append({
+                        "filename": filename,
+                        "success": False,
+                        "error": f"Errore salvataggio: {str(e)}"
+                    })
+
+        # Durata e lavoro stimato (fuori dal lock: la lettura dei file può richiedere tempo)
+        device = self._Transcriber.get_device()
+        compute_type = self._Transcriber.get_compute_type()
+        prepared = []
+        
+        for filename, temp_path, audio_hash in saved_files:
+            try:
+                duration = self._run_blocking(librosa.get_duration, path=temp_path)
+            except Exception as e:
+                logger.error(f"Impossibile leggere la durata di {filename}: {str(e)}")
+                results.append({
+                    "filename": filename,
+                    "success": False,
+                    "error": f"File audio non valido: {str(e)}"
+                })
+                self._spool.release(temp_path)
+                continue
+            
+            work = self._rtf.estimate_work(model_name, device, compute_type, duration)
+            
+            # Lingua rilevata prima della decodifica, così il client la vede subito
+            detected = None
+            if not language or language == "auto":
+                detected = self._run_blocking(self._language_detector.detect, temp_path, audio_hash)
+                
+            prepared.append((filename, temp_path, duration, work, audio_hash, detected))
+        
         with self._queueLock:
             
-            total = 0
-            for q in self._queue:
-                if q.status in ['pending', 'processing']:
-                    total += 1
+            queued_work = self._queued_work_unsafe()
+            new_work = sum(p[3] for p in prepared)
                     
-            if total + len(files) > self._maxQueue:
-                logger.error(f"Coda piena.")
+            # Con la coda vuota si accetta sempre: un file più lungo del limite non resta escluso per sempre
+            if prepared and queued_work > 0 and queued_work + new_work > self._maxQueueWork:
+                logger.error(f"Coda piena: lavoro stimato {queued_work + new_work:.0f}s oltre il limite di {self._maxQueueWork:.0f}s.")
+                for _, temp_path, *_ in prepared:
+                    self._spool.release(temp_path)
                 return jsonify({
                     "success": False,
-                    "error": f"Coda piena. Massimo {self._maxQueue} file contemporaneamente."
+                    "error": f"Coda piena. Lavoro stimato in coda {queued_work / 60:.0f} min, nuovi file {new_work / 60:.0f} min, massimo {self._maxQueueWork / 60:.0f} min.",
+                    "queued_work_seconds": round(queued_work, 1),
+                    "requested_work_seconds": round(new_work, 1)
                 }), 429
+            
+            for filename, temp_path, duration, work, audio_hash, detected in prepared:
+                # Aggiungi alla coda
+                item_id = str(uuid.uuid4())
+                item = QueueItem(
+                    id=item_id,
+                    filename=filename,
+                    file_path=temp_path,
+                    language=language,
+                    model_name=model_name,
+                    add_info=add_info,
+                    vad_filter=vad_filter,
+                    beam_size=beam_size,
+                    temperature=temperature,
+                    best_of=best_of,
+                    compression_ratio_threshold=compression_ratio_threshold,
+                    no_repeat_ngram_size=no_repeat_ngram_size,
+                    vad_parameters=vad_parameters,
+                    patience=patience,
+                    duration=duration,
+                    estimated_work=work,
+                    audio_hash=audio_hash,
+                    detected_language=detected.language if detected else None,
+                    language_probability=detected.probability if detected else None
+                )
+                
+                logger.info(f"\n{'='*80}\nAggiunto alla coda:\n {item}\n{'='*80}")
                 
+                self._queue.append(item)
+                if vad_filter:
+                    self._prep_executor.submit(self._prepare_item, item)
+                else:
+                    item.prepared = True
+                results.append({
+                    "id": item_id,
+                    "filename": filename,
+                    "success": True,
+                    "duration": round(duration, 1),
+                    "estimated_work": round(work, 1),
+                    "detected_language": detected.language if detected else None,
+                    "language_probability": round(detected.probability, 3) if detected else None,
+                    "language_cached": detected.cached if detected else False
+                })
             
-            for file in files:
-                if file and self.allowed_file(file.filename) and file.filename is not None:
-                    filename = secure_filename(file.filename)
-                    counter = 1
-                    
-                    temp_path = os.path.join(self._app.config['UPLOAD_FOLDER'], filename)
-
-                    if os.path.exists(temp_path):
-                        while True:
-                            name, ext = os.path.splitext(filename)
-                            new_filename = f"{name}({counter}){ext}"
-                            temp_path = os.path.join(self._app.config['UPLOAD_FOLDER'], new_filename)
-                            counter += 1
-                            if not os.path.exists(temp_path):
-                                filename = new_filename
-                                break
-                            
-                        temp_path = os.path.join(self._app.config['UPLOAD_FOLDER'], filename)
-                    
-
-                    try:
-                        file.save(temp_path)
-                        logger.info(f"File salvato temporaneamente in {temp_path}")
-                        #self._queue.append(temp_path)
-                        
-                        # Aggiungi alla coda
-                        item_id = str(uuid.uuid4())
-                        item = QueueItem(
-                            id=item_id,
-                            filename=filename,
-                            file_path=temp_path,
-                            language=language,
-                            model_name=model_name,
-                            add_info=add_info,
-                            vad_filter=vad_filter,
-                            beam_size=beam_size,
-                            temperature=temperature,
-                            best_of=best_of,
-                            compression_ratio_threshold=compression_ratio_threshold,
-                            no_repeat_ngram_size=no_repeat_ngram_size,
-                            vad_parameters=vad_parameters,
-                            patience=patience
-                        )
-                        
-                        logger.info(f"\n{'='*80}\nAggiunto alla coda:\n {item}\n{'='*80}")
-                        
-                        self._queue.append(item)
-                        results.append({
-                            "id": item_id,
-                            "filename": filename,
-                            "success": True
-                        })
-                        
-                    except Exception as e:
-                        logger.error(f"Errore salvataggio file {filename}: {str(e)}")
-                        results.append({
-                            "filename": filename,
-                            "success": False,
-                            "error": f"Errore salvataggio: {str(e)}"
-                        })
+            self._update_etas_unsafe()
+            etas = {q.id: q.eta for q in self._queue}
+        
+        for r in results:
+            if "id" in r:
+                r["eta"] = etas.get(r["id"])
                 
         # Notifica i client
         self._send_queue_status()  
@@ -0,0 +1,144 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from data.database import DatabaseManager
+from LeaseManager import LeaseManager
+from ModelStore import ModelStore
+from SpoolManager import SpoolManager
+
+try:
+    import server
+    from Transcriber import QueueItem
+except ImportError:
+    # Flask, torch e faster-whisper servono solo al test del protocollo HTTP
+    server = None
+
+
+class TestLeaseManager(unittest.TestCase):
+
+    def test_1_heartbeat_extends_lease(self):
+        print("--- Test 1: Heartbeat rinnova il lease ---")
+        manager = LeaseManager(ttl=0.3)
+        lease = manager.acquire("item-1", "worker-a")
+
+        time.sleep(0.2)
+        self.assertIsNotNone(manager.heartbeat(lease.lease_id))
+        time.sleep(0.2)
+        self.assertIsNotNone(manager.get(lease.lease_id))
+        self.assertEqual(manager.expire(), [])
+        print(" OK: Il lease resta valido finché arrivano heartbeat.")
+
+    def test_2_dead_worker_lease_expires(self):
+        print("--- Test 2: Scadenza lease di un worker morto ---")
+        manager = LeaseManager(ttl=0.1)
+        lease = manager.acquire("item-1", "worker-a")
+
+        time.sleep(0.2)
+        self.assertIsNone(manager.heartbeat(lease.lease_id))
+        expired = manager.expire()
+        self.assertEqual([l.item_id for l in expired], ["item-1"])
+        self.assertIsNone(manager.find_by_item("item-1"))
+        print(" OK: Il lease scaduto viene rimosso e l'elemento può essere riassegnato.")
+
+    def _start_server(self, item_ids):
+        """WebServer con le sole route Flask (nessun worker locale né server in ascolto) e `item_ids` in coda."""
+        test_db = f"test_lease_{int(time.time() * 1000)}.db"
+        db_manager = DatabaseManager(test_db)
+        spool_dir = tempfile.mkdtemp()
+
+        def cleanup():
+            db_manager._conn.close()
+            if os.path.exists(test_db):
+                os.remove(test_db)
+        self.addCleanup(cleanup)
+
+        with mock.patch.object(server.WebServer, "_run"), \
+             mock.patch.object(server, "LOCAL_WORKER_ENABLED", False), \
+             mock.patch.object(server, "WORKER_TOKEN", ""), \
+             mock.patch.object(server, "SpoolManager", lambda: SpoolManager(spool_dir=spool_dir)):
+            web = server.WebServer(database=db_manager, model_store=ModelStore(models_dir=tempfile.mkdtemp(), offline=True))
+
+        with web._queueLock:
+            for item_id in item_ids:
+                web._queue.append(QueueItem(id=item_id, filename=f"{item_id}.wav", file_path=os.devnull, language="en", model_name="tiny", prepared=True))
+        return web
+
+    @unittest.skipIf(server is None, "dipendenze del server non installate")
+    def test_3_concurrent_workers(self):
+        print("--- Test 3: Worker concorrenti su /worker/lease ---")
+        item_ids = [f"item-{i}" for i in range(40)]
+        web = self._start_server(item_ids)
+
+        taken = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(4)
+
+        def worker(worker_id):
+            client = web._app.test_client()
+            start.wait()
+            while True:
+                r = client.post("/worker/lease", json={"worker_id": worker_id})
+                if r.status_code == 204:
+                    return
+                with lock:
+                    if r.status_code != 200:
+                        errors.append(r.status_code)
+                        return
+                    taken.append(r.get_json()["item"]["id"])
+
+        threads = [threading.Thread(target=worker, args=(f"worker-{i}",)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(taken), len(set(taken)))
+        self.assertEqual(sorted(taken), sorted(item_ids))
+        self.assertTrue(all(item.status == "processing" for item in web._queue))
+        self.assertEqual(len(web._leases.active_workers()), 4)
+        print(" OK: Ogni elemento è stato assegnato una sola volta.")
+
+    def test_4_stop_request(self):
+        print("--- Test 4: Richiesta di stop ---")
+        manager = LeaseManager(ttl=5)
+        lease = manager.acquire("item-1", "worker-a")
+        self.assertTrue(manager.request_stop("item-1"))
+        self.assertTrue(manager.heartbeat(lease.lease_id).stop_requested)
+        self.assertFalse(manager.request_stop("item-2"))
+        print(" OK: Lo stop viene consegnato con l'heartbeat.")
+
+    @unittest.skipIf(server is None, "dipendenze del server non installate")
+    def test_5_segments_and_complete(self):
+        print("--- Test 5: Segmenti duplicati, completamento incompleto e lease scaduto ---")
+        web = self._start_server(["item-1"])
+        client = web._app.test_client()
+        lease_id = client.post("/worker/lease", json={"worker_id": "worker-a"}).get_json()["lease_id"]
+
+        batch = {"start_index": 0, "segments": [{"start": float(i), "end": i + 1.0, "text": f"testo {i}"} for i in range(3)], "progress": 10}
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.post(f"/worker/lease/{lease_id}/segments", json=batch).get_json())) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([r["next_index"] for r in results], [3] * 4)
+
+        # Il worker dichiara più segmenti di quelli ricevuti: nessun salvataggio
+        r = client.post(f"/worker/lease/{lease_id}/complete", json={"segments": 5})
+        self.assertEqual(r.status_code, 409)
+        self.assertEqual(r.get_json()["next_index"], 3)
+
+        # Dopo la scadenza un blocco in ritardo riceve 410, non un errore interno
+        web._leases.get(lease_id).expires_at = 0
+        r = client.post(f"/worker/lease/{lease_id}/segments", json={"start_index": 3, "segments": []})
+        self.assertEqual(r.status_code, 410)
+        print(" OK: Ogni segmento è stato scritto una sola volta.")
+
+if __name__ == "__main__":
+    unittest.main()
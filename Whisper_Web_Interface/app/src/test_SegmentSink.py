@@ -0,0 +1,55 @@
+import os
+import tempfile
+import time
+import unittest
+
+from data.database import DatabaseManager
+from SegmentSink import SegmentSink
+
+
+class TestSegmentSink(unittest.TestCase):
+
+    def setUp(self):
+        self.test_db = f"test_sink_{int(time.time())}.db"
+        self.sink_dir = tempfile.mkdtemp()
+        self.db_manager = DatabaseManager(self.test_db)
+
+    def tearDown(self):
+        self.db_manager._conn.close()
+        if os.path.exists(self.test_db):
+            os.remove(self.test_db)
+
+    def test_1_batches_written_to_db_and_file(self):
+        print("--- Test 1: Segmenti scritti a blocchi ---")
+        sink = SegmentSink("t1", self.db_manager, batch_size=10, sink_dir=self.sink_dir)
+        for i in range(25):
+            sink.add(float(i), i + 1.0, f"testo {i}", f"riga {i}")
+
+            # Il buffer in memoria non supera mai batch_size
+            self.assertLess(len(sink._buffer), 10)
+
+        self.assertEqual(self.db_manager.get_segments_info("t1")['count'], 20)
+
+        content = sink.read_content()
+        self.assertEqual(content, "\n".join(f"riga {i}" for i in range(25)))
+        self.assertEqual(sink.get_content_bytes(), len(content.encode("utf-8")))
+        self.assertEqual(self.db_manager.get_segments_info("t1")['count'], 25)
+
+        sink.close()
+        self.assertEqual(os.listdir(self.sink_dir), [])
+        print(" OK: Testo e segmenti completi, file temporaneo rimosso.")
+
+    def test_2_discard_removes_segments(self):
+        print("--- Test 2: Scarto di una trascrizione non salvata ---")
+        sink = SegmentSink("t2", self.db_manager, batch_size=5, sink_dir=self.sink_dir)
+        for i in range(12):
+            sink.add(float(i), i + 1.0, "è", "è")
+
+        sink.discard()
+        self.assertEqual(self.db_manager.get_segments_info("t2")['count'], 0)
+        self.assertEqual(os.listdir(self.sink_dir), [])
+        print(" OK: Segmenti e file temporaneo eliminati.")
+
+
+if __name__ == "__main__":
+    unittest.main()